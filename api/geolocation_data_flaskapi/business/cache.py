@@ -0,0 +1,627 @@
+"""
+@author:     Fyzel@users.noreply.github.com
+
+@copyright:  2017 Englesh.org. All rights reserved.
+
+@license:    https://github.com/Fyzel/geolocation-data-flaskapi/blob/master/LICENSE
+
+@contact:    Fyzel@users.noreply.github.com
+@deffield    updated: 2026-10-17
+"""
+
+import base64
+import json
+import os
+import sqlite3
+import stat
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime
+from threading import Lock
+
+
+class LRUCache(object):
+    """
+    A thread-safe, size-bounded least recently used cache whose entries also expire after a time to live.
+
+    Deleting a key advances the cache version. A reader that captured the version before loading a value passes it
+    to set, and the value is dropped if a delete happened in between, so a read racing a write cannot put a stale
+    value back into the cache.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 300.0):
+        """
+        LRUCache constructor.
+
+        :param maxsize: The maximum number of entries.
+        :type maxsize: int
+        :param ttl: The number of seconds an entry stays valid.
+        :type ttl: float
+        """
+        self._lock = Lock()
+        self._entries = OrderedDict()
+        self._maxsize = maxsize
+        self._ttl = ttl
+        self._version = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def configure(self, maxsize: int, ttl: float):
+        """
+        Change the size bound and time to live, and empty the cache.
+
+        :param maxsize: The maximum number of entries.
+        :type maxsize: int
+        :param ttl: The number of seconds an entry stays valid.
+        :type ttl: float
+        :return: None
+        """
+        with self._lock:
+            self._maxsize = maxsize
+            self._ttl = ttl
+            self._entries.clear()
+            self._version += 1
+
+    @property
+    def version(self) -> int:
+        """
+        The number of deletes so far.
+        """
+        return self._version
+
+    def get(self, key):
+        """
+        Returns a cached value.
+
+        :param key: The key.
+        :return: The value, else None when the key is missing or expired.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+
+            if entry is None:
+                self.misses += 1
+                return None
+
+            value, expires = entry
+
+            if expires < time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, version: int = None):
+        """
+        Cache a value, evicting the least recently used entries beyond the size bound.
+
+        :param key: The key.
+        :param value: The value.
+        :param version: The cache version captured before the value was loaded, or None to always cache it.
+        :type version: int
+        :return: None
+        """
+        with self._lock:
+            if self._maxsize < 1 or (version is not None and version != self._version):
+                return
+
+            self._entries[key] = (value, time.monotonic() + self._ttl)
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self._maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        """
+        Remove a key from the cache.
+
+        :param key: The key.
+        :return: None
+        """
+        with self._lock:
+            self._entries.pop(key, None)
+            self._version += 1
+
+    def clear(self):
+        """
+        Remove every key from the cache.
+
+        :return: None
+        """
+        with self._lock:
+            self._entries.clear()
+            self._version += 1
+
+    def stats(self) -> dict:
+        """
+        Returns the cache counters.
+
+        :return: A dictionary of size, maxsize, ttl, hits, misses, evictions and expirations.
+        """
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'maxsize': self._maxsize,
+                'ttl': self._ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+            }
+
+
+class LatencyStats(object):
+    """
+    A thread-safe count, total and maximum of the durations of an operation in this process.
+    """
+
+    def __init__(self):
+        """
+        LatencyStats constructor.
+        """
+        self._lock = Lock()
+        self.count = 0
+        self.total = 0.0
+        self.maximum = 0.0
+
+    def record(self, seconds: float):
+        """
+        Record the duration of one operation.
+
+        :param seconds: The duration in seconds.
+        :type seconds: float
+        :return: None
+        """
+        with self._lock:
+            self.count += 1
+            self.total += seconds
+            self.maximum = max(self.maximum, seconds)
+
+    def stats(self) -> dict:
+        """
+        Returns the latency counters in milliseconds.
+
+        :return: A dictionary of count, mean_ms and max_ms.
+        """
+        with self._lock:
+            return {
+                'count': self.count,
+                'mean_ms': 1000.0 * self.total / self.count if self.count else 0.0,
+                'max_ms': 1000.0 * self.maximum,
+            }
+
+
+def _encode_object(value):
+    if isinstance(value, bytes):
+        return {'__bytes__': base64.b64encode(value).decode('ascii')}
+
+    if isinstance(value, datetime):
+        return {'__datetime__': value.isoformat()}
+
+    raise TypeError('Cannot cache a value of type {type}'.format(type=type(value).__name__))
+
+
+def _tag_tuples(value):
+    if isinstance(value, tuple):
+        return {'__tuple__': [_tag_tuples(item) for item in value]}
+
+    if isinstance(value, list):
+        return [_tag_tuples(item) for item in value]
+
+    if isinstance(value, dict):
+        return dict((key, _tag_tuples(item)) for key, item in value.items())
+
+    return value
+
+
+def _decode_object(value: dict):
+    if '__tuple__' in value:
+        return tuple(value['__tuple__'])
+
+    if '__bytes__' in value:
+        return base64.b64decode(value['__bytes__'])
+
+    if '__datetime__' in value:
+        return datetime.fromisoformat(value['__datetime__'])
+
+    return value
+
+
+def encode_value(value) -> bytes:
+    """
+    Encode a cached value as JSON for a cache file.
+
+    Unlike pickle, decoding JSON never runs code, so a value read back from the file can only be data. Tuples,
+    bytes and datetimes are tagged so they are decoded as they were cached.
+
+    :param value: The value, made of None, booleans, numbers, strings, bytes, datetimes, tuples, lists and
+        dictionaries with string keys.
+    :return: The encoded value.
+    """
+    return json.dumps(_tag_tuples(value), default=_encode_object, separators=(',', ':')).encode('utf-8')
+
+
+def decode_value(data: bytes):
+    """
+    Decode a cached value encoded by encode_value.
+
+    :param data: The encoded value.
+    :type data: bytes
+    :return: The value.
+    """
+    return json.loads(data, object_hook=_decode_object)
+
+
+class SQLiteStore(object):
+    """
+    A cache file shared by every worker process on a host.
+
+    Each thread of each process opens its own connection to the file in WAL mode, so readers never block each other
+    and a write by one worker is visible to the others as soon as it commits. Connections opened before a fork are
+    not reused by the child. A new file is only readable and writable by its owner, as are the WAL and shared
+    memory files SQLite creates beside it.
+    """
+
+    def __init__(self, path: str, timeout: float = 5.0):
+        """
+        SQLiteStore constructor.
+
+        :param path: The cache file path.
+        :type path: str
+        :param timeout: The number of seconds to wait for a write lock.
+        :type timeout: float
+        """
+        self._path = path
+        self._timeout = timeout
+        self._local = threading.local()
+
+        os.close(os.open(path, os.O_RDWR | os.O_CREAT, 0o600))
+
+        with self.transaction() as connection:
+            connection.execute('CREATE TABLE IF NOT EXISTS cache_entry ('
+                               'namespace TEXT NOT NULL, '
+                               'key TEXT NOT NULL, '
+                               'value BLOB NOT NULL, '
+                               'expires REAL NOT NULL, '
+                               'PRIMARY KEY (namespace, key))')
+            connection.execute('CREATE INDEX IF NOT EXISTS cache_entry_expires_index '
+                               'ON cache_entry (namespace, expires)')
+            connection.execute('CREATE TABLE IF NOT EXISTS cache_counter ('
+                               'name TEXT NOT NULL PRIMARY KEY, '
+                               'value INTEGER NOT NULL)')
+
+    @property
+    def path(self) -> str:
+        """
+        The cache file path.
+        """
+        return self._path
+
+    def connection(self) -> sqlite3.Connection:
+        """
+        Returns the connection of the calling thread, opening it on first use in this process.
+
+        :return: sqlite3.Connection
+        """
+        connection = getattr(self._local, 'connection', None)
+
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self._path, timeout=self._timeout, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+
+        return connection
+
+    @contextmanager
+    def transaction(self):
+        """
+        Run the enclosed statements in one write transaction.
+
+        :return: A context manager yielding the connection.
+        """
+        connection = self.connection()
+        connection.execute('BEGIN IMMEDIATE')
+
+        try:
+            yield connection
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+
+        connection.execute('COMMIT')
+
+    def counter(self, name: str) -> int:
+        """
+        Returns the value of a counter.
+
+        :param name: The counter name.
+        :type name: str
+        :return: The counter value, zero when it was never incremented.
+        """
+        row = self.connection().execute('SELECT value FROM cache_counter WHERE name = ?', (name,)).fetchone()
+        return 0 if row is None else row[0]
+
+    def incr(self, *names):
+        """
+        Increment counters in one transaction.
+
+        :param names: The counter names.
+        :return: None
+        """
+        with self.transaction() as connection:
+            for name in set(names):
+                connection.execute('INSERT INTO cache_counter (name, value) VALUES (?, 1) '
+                                   'ON CONFLICT (name) DO UPDATE SET value = value + 1', (name,))
+
+    def setdefault_counter(self, name: str, value: int) -> int:
+        """
+        Initialize a counter unless it exists.
+
+        :param name: The counter name.
+        :type name: str
+        :param value: The initial value.
+        :type value: int
+        :return: The counter value.
+        """
+        with self.transaction() as connection:
+            connection.execute('INSERT OR IGNORE INTO cache_counter (name, value) VALUES (?, ?)', (name, value))
+
+        return self.counter(name)
+
+
+class SQLiteCache(object):
+    """
+    A size-bounded cache with a time to live whose entries live in a SQLiteStore shared by every worker.
+
+    It has the same interface as LRUCache. When the namespace grows beyond its size bound, the entries closest to
+    expiry, which are the oldest, are evicted first. Deletes advance a version shared by every worker.
+    """
+
+    # Number of sets between two passes that prune expired and excess entries
+    PRUNE_INTERVAL = 100
+
+    def __init__(self, store: SQLiteStore, namespace: str, maxsize: int = 1024, ttl: float = 300.0):
+        """
+        SQLiteCache constructor.
+
+        :param store: The shared cache file.
+        :type store: SQLiteStore
+        :param namespace: The name separating this cache from the others in the store.
+        :type namespace: str
+        :param maxsize: The maximum number of entries.
+        :type maxsize: int
+        :param ttl: The number of seconds an entry stays valid.
+        :type ttl: float
+        """
+        self._store = store
+        self._namespace = namespace
+        self._version_counter = 'version:{namespace}'.format(namespace=namespace)
+        self._maxsize = maxsize
+        self._ttl = ttl
+        self._sets = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @staticmethod
+    def _key(key) -> str:
+        return json.dumps(key, separators=(',', ':'))
+
+    def configure(self, maxsize: int, ttl: float):
+        """
+        Change the size bound and time to live, and empty the cache.
+
+        :param maxsize: The maximum number of entries.
+        :type maxsize: int
+        :param ttl: The number of seconds an entry stays valid.
+        :type ttl: float
+        :return: None
+        """
+        self._maxsize = maxsize
+        self._ttl = ttl
+        self.clear()
+
+    @property
+    def version(self) -> int:
+        """
+        The number of deletes so far, across every worker.
+        """
+        return self._store.counter(self._version_counter)
+
+    def get(self, key):
+        """
+        Returns a cached value.
+
+        :param key: The key.
+        :return: The value, else None when the key is missing or expired.
+        """
+        row = self._store.connection().execute(
+            'SELECT value, expires FROM cache_entry WHERE namespace = ? AND key = ?',
+            (self._namespace, self._key(key))).fetchone()
+
+        if row is None:
+            self.misses += 1
+            return None
+
+        if row[1] < time.time():
+            self.expirations += 1
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return decode_value(row[0])
+
+    def set(self, key, value, version: int = None):
+        """
+        Cache a value.
+
+        :param key: The key.
+        :param value: The value.
+        :param version: The cache version captured before the value was loaded, or None to always cache it.
+        :type version: int
+        :return: None
+        """
+        if self._maxsize < 1:
+            return
+
+        with self._store.transaction() as connection:
+            if version is not None:
+                row = connection.execute('SELECT value FROM cache_counter WHERE name = ?',
+                                         (self._version_counter,)).fetchone()
+
+                if (0 if row is None else row[0]) != version:
+                    return
+
+            connection.execute('INSERT OR REPLACE INTO cache_entry (namespace, key, value, expires) '
+                               'VALUES (?, ?, ?, ?)',
+                               (self._namespace, self._key(key), encode_value(value), time.time() + self._ttl))
+
+        self._sets += 1
+        if self._sets % self.PRUNE_INTERVAL == 0:
+            self.prune()
+
+    def prune(self):
+        """
+        Remove the expired entries and the oldest entries beyond the size bound.
+
+        :return: None
+        """
+        with self._store.transaction() as connection:
+            connection.execute('DELETE FROM cache_entry WHERE namespace = ? AND expires < ?',
+                               (self._namespace, time.time()))
+            size = connection.execute('SELECT COUNT(*) FROM cache_entry WHERE namespace = ?',
+                                      (self._namespace,)).fetchone()[0]
+
+            if size > self._maxsize:
+                connection.execute('DELETE FROM cache_entry WHERE namespace = ? AND key IN ('
+                                   'SELECT key FROM cache_entry WHERE namespace = ? ORDER BY expires LIMIT ?)',
+                                   (self._namespace, self._namespace, size - self._maxsize))
+                self.evictions += size - self._maxsize
+
+    def delete(self, key):
+        """
+        Remove a key from the cache in every worker.
+
+        :param key: The key.
+        :return: None
+        """
+        with self._store.transaction() as connection:
+            connection.execute('DELETE FROM cache_entry WHERE namespace = ? AND key = ?',
+                               (self._namespace, self._key(key)))
+            connection.execute('INSERT INTO cache_counter (name, value) VALUES (?, 1) '
+                               'ON CONFLICT (name) DO UPDATE SET value = value + 1', (self._version_counter,))
+
+    def clear(self):
+        """
+        Remove every key from the cache in every worker.
+
+        :return: None
+        """
+        with self._store.transaction() as connection:
+            connection.execute('DELETE FROM cache_entry WHERE namespace = ?', (self._namespace,))
+            connection.execute('INSERT INTO cache_counter (name, value) VALUES (?, 1) '
+                               'ON CONFLICT (name) DO UPDATE SET value = value + 1', (self._version_counter,))
+
+    def stats(self) -> dict:
+        """
+        Returns the cache counters. The size is shared; the other counters are those of this worker.
+
+        :return: A dictionary of size, maxsize, ttl, hits, misses, evictions and expirations.
+        """
+        size = self._store.connection().execute('SELECT COUNT(*) FROM cache_entry WHERE namespace = ?',
+                                                (self._namespace,)).fetchone()[0]
+        return {
+            'size': size,
+            'maxsize': self._maxsize,
+            'ttl': self._ttl,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+        }
+
+
+CACHE_BACKEND_MEMORY = 'memory'
+CACHE_BACKEND_SQLITE = 'sqlite'
+
+_sqlite_stores = {}
+
+
+def get_default_cache_path() -> str:
+    """
+    Returns the path of the cache file in a directory of the temporary directory private to the user running the
+    API, creating the directory on first use.
+
+    :return: The cache file path.
+    """
+    directory = os.path.join(tempfile.gettempdir(), 'geolocation_data_flaskapi-{uid}'.format(uid=os.getuid()))
+
+    try:
+        os.mkdir(directory, 0o700)
+    except FileExistsError:
+        pass
+
+    # Another user may have created the directory first, or a link in its place
+    status = os.lstat(directory)
+
+    if not stat.S_ISDIR(status.st_mode) or status.st_uid != os.getuid() or status.st_mode & 0o077:
+        raise PermissionError('Cache directory {directory} is not private to this user'.format(directory=directory))
+
+    return os.path.join(directory, 'cache.sqlite')
+
+
+def get_cache_store(config):
+    """
+    Returns the store shared by the workers of this host, or None for the in-process backend.
+
+    :param config: The application config.
+    :return: SQLiteStore, None
+    """
+    backend = config.get('CACHE_BACKEND', CACHE_BACKEND_MEMORY)
+
+    if backend == CACHE_BACKEND_MEMORY:
+        return None
+
+    if backend != CACHE_BACKEND_SQLITE:
+        raise ValueError('Unknown cache backend {backend}'.format(backend=backend))
+
+    path = config.get('CACHE_SQLITE_PATH') or get_default_cache_path()
+
+    if path not in _sqlite_stores:
+        _sqlite_stores[path] = SQLiteStore(path)
+
+    return _sqlite_stores[path]
+
+
+def create_cache(config, namespace: str, maxsize: int, ttl: float):
+    """
+    Create a cache on the backend selected by CACHE_BACKEND.
+
+    :param config: The application config.
+    :param namespace: The name separating the cache from the others in a shared store.
+    :type namespace: str
+    :param maxsize: The maximum number of entries.
+    :type maxsize: int
+    :param ttl: The number of seconds an entry stays valid.
+    :type ttl: float
+    :return: LRUCache, SQLiteCache
+    """
+    store = get_cache_store(config)
+
+    if store is None:
+        return LRUCache(maxsize=maxsize, ttl=ttl)
+
+    return SQLiteCache(store, namespace, maxsize=maxsize, ttl=ttl)
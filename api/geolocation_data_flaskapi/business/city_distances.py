@@ -0,0 +1,89 @@
+"""
+@author:     Fyzel@users.noreply.github.com
+
+@copyright:  2017 Englesh.org. All rights reserved.
+
+@license:    https://github.com/Fyzel/geolocation-data-flaskapi/blob/master/LICENSE
+
+@contact:    Fyzel@users.noreply.github.com
+@deffield    updated: 2026-10-17
+"""
+
+import json
+
+import numpy as np
+
+from api.geolocation_data_flaskapi.business.city_spatial import city_spatial_index
+from api.geolocation_data_flaskapi.business.geodesy import haversine_km
+
+MATRIX_MIMETYPE = 'application/octet-stream'
+
+# Matrix rows computed and yielded per chunk, bounding the memory of a response
+DISTANCE_BLOCK_ROWS = 256
+
+
+def get_city_coordinates(city_ids) -> tuple:
+    """
+    Returns the coordinates of city records from the city spatial index.
+
+    :param city_ids: The city record identifiers.
+    :return: The latitudes and longitudes in degrees as arrays, and the list of the ids of the cities that do not
+        exist or have no coordinates.
+    """
+    latitudes, longitudes = city_spatial_index.coordinates(city_ids)
+    missing = [city_ids[position] for position in np.flatnonzero(np.isnan(latitudes)).tolist()]
+
+    return latitudes, longitudes, missing
+
+
+def _distance_blocks(origin_latitudes, origin_longitudes, destination_latitudes, destination_longitudes):
+    for start in range(0, origin_latitudes.size, DISTANCE_BLOCK_ROWS):
+        yield haversine_km(origin_latitudes[start:start + DISTANCE_BLOCK_ROWS, np.newaxis],
+                           origin_longitudes[start:start + DISTANCE_BLOCK_ROWS, np.newaxis],
+                           destination_latitudes[np.newaxis, :],
+                           destination_longitudes[np.newaxis, :])
+
+
+def encode_distance_matrix(origins: tuple, destinations: tuple):
+    """
+    Encode the great-circle distances between two sets of coordinates incrementally as a float32 matrix.
+
+    The matrix has a row per origin and a column per destination, in kilometres, as little-endian float32 values in
+    row-major order.
+
+    :param origins: The latitudes and longitudes of the origins in degrees, as arrays.
+    :type origins: tuple
+    :param destinations: The latitudes and longitudes of the destinations in degrees, as arrays.
+    :type destinations: tuple
+    :return: A generator of encoded chunks of whole rows.
+    """
+    for block in _distance_blocks(*origins, *destinations):
+        yield block.astype('<f4').tobytes()
+
+
+def encode_distance_matrix_json(origin_ids, destination_ids, origins: tuple, destinations: tuple):
+    """
+    Encode the great-circle distances between two sets of cities incrementally as one JSON object.
+
+    The object lists the origin and destination ids and the distances in kilometres, rounded to the metre, as one
+    array per origin.
+
+    :param origin_ids: The city record identifiers of the origins.
+    :param destination_ids: The city record identifiers of the destinations.
+    :param origins: The latitudes and longitudes of the origins in degrees, as arrays.
+    :type origins: tuple
+    :param destinations: The latitudes and longitudes of the destinations in degrees, as arrays.
+    :type destinations: tuple
+    :return: A generator of encoded chunks.
+    """
+    yield '{{"origins":{origins},"destinations":{destinations},"distances":['.format(
+        origins=json.dumps(list(origin_ids), separators=(',', ':')),
+        destinations=json.dumps(list(destination_ids), separators=(',', ':'))).encode('utf-8')
+
+    first = True
+    for block in _distance_blocks(*origins, *destinations):
+        chunk = json.dumps(np.round(block, 3).tolist(), separators=(',', ':'))[1:-1].encode('utf-8')
+        yield chunk if first else b',' + chunk
+        first = False
+
+    yield b']}'
@@ -0,0 +1,380 @@
+"""
+@author:     Fyzel@users.noreply.github.com
+
+@copyright:  2017 Englesh.org. All rights reserved.
+
+@license:    https://github.com/Fyzel/geolocation-data-flaskapi/blob/master/LICENSE
+
+@contact:    Fyzel@users.noreply.github.com
+@deffield    updated: 2026-10-17
+"""
+
+import logging
+import time
+from threading import Lock
+
+import numpy as np
+
+from api.geolocation_data_flaskapi.business.city_stream import select_cities
+from api.geolocation_data_flaskapi.business.generations import ALL_CITIES, get_city_generation
+from api.geolocation_data_flaskapi.business.reference_data import get_subdivision_index
+from database import db
+from database.models import City
+from database.routing import read_from_primary
+
+log = logging.getLogger(__name__)
+
+# City records read per round trip when building an index
+BUILD_BATCH_SIZE = 10000
+
+# Fraction of removed slots that triggers a compaction
+COMPACT_DEAD_FRACTION = 0.25
+
+
+class CityIndex(object):
+    """
+    An in-memory index of the city records, kept current with the city generations.
+
+    Each indexed city is a slot in parallel arrays. A write through this process removes the slot of the city and
+    adds a new one; a compaction drops the removed slots once they are a large part of the index. Subdivisions whose
+    city generation moved past the generation they were indexed at, by writes through other worker processes or
+    bulk loads, are read again before a query.
+
+    Subclasses add their own slot arrays to SLOT_ARRAYS, index new slots in _index_slots and renumber their
+    structures in _compact_index.
+    """
+
+    SLOT_ARRAYS = ('_ids', '_subdivisions', '_countries', '_latitudes', '_longitudes', '_alive')
+
+    def __init__(self):
+        """
+        CityIndex constructor.
+        """
+        self._lock = Lock()
+        self._reset()
+
+    def _reset(self):
+        self._size = 0
+        self._ids = np.zeros(0, dtype=np.int64)
+        self._subdivisions = np.zeros(0, dtype=np.int32)
+        self._countries = np.zeros(0, dtype=np.int32)
+        self._latitudes = np.zeros(0, dtype=np.float64)
+        self._longitudes = np.zeros(0, dtype=np.float64)
+        self._alive = np.zeros(0, dtype=bool)
+        self._names = []
+        self._slots = {}
+        self._dead = 0
+        self._subdivision_numbers = {}
+        self._subdivision_codes = []
+        self._country_numbers = {}
+        self._country_subdivisions = {}
+        self._generations = {}
+        self._country_generations = {}
+        self._all_generation = None
+        self._reset_index()
+
+    def _reset_index(self):
+        pass
+
+    def _accepts(self, row) -> bool:
+        """
+        Checks if a city row belongs in the index.
+
+        :param row: The (id, name, subdivision, latitude, longitude) row.
+        :return: True to index the row, else False.
+        """
+        return True
+
+    def _index_slots(self, start: int, rows, built: bool):
+        """
+        Index new slots. Called with the lock.
+
+        :param start: The slot of the first row.
+        :type start: int
+        :param rows: The (id, name, subdivision, latitude, longitude) rows of the new slots.
+        :param built: True when the slots are the whole index, just built.
+        :type built: bool
+        :return: None
+        """
+        pass
+
+    def _needs_compaction(self) -> bool:
+        return False
+
+    def _compact_index(self, alive, renumber):
+        """
+        Renumber the structures of the index after the slot arrays were compacted. Called with the lock.
+
+        :param alive: The slots kept, as a mask over the slots before the compaction.
+        :param renumber: The slot after the compaction of each kept slot.
+        :return: None
+        """
+        pass
+
+    @property
+    def count(self) -> int:
+        """
+        The number of city records in the index.
+        """
+        return len(self._slots)
+
+    def _subdivision_number(self, code: str) -> int:
+        number = self._subdivision_numbers.get(code)
+
+        if number is None:
+            number = self._subdivision_numbers[code] = len(self._subdivision_codes)
+            self._subdivision_codes.append(code)
+            self._country_numbers.setdefault(code[:2], len(self._country_numbers))
+            self._country_subdivisions.setdefault(code[:2], set()).add(code)
+
+        return number
+
+    def _get_country_subdivisions(self, country_alpha2: str) -> set:
+        return set(get_subdivision_index().get_codes(country_alpha2) or ()) | \
+            self._country_subdivisions.get(country_alpha2, set())
+
+    def _reserve(self, count: int):
+        capacity = self._ids.shape[0]
+
+        if self._size + count <= capacity:
+            return
+
+        capacity = max(2 * capacity, self._size + count, 1024)
+
+        for name in self.SLOT_ARRAYS:
+            current = getattr(self, name)
+            grown = np.zeros((capacity,) + current.shape[1:], dtype=current.dtype)
+            grown[:self._size] = current[:self._size]
+            setattr(self, name, grown)
+
+    def _append(self, rows) -> int:
+        """
+        Give each row a new slot, removing the previous slot of the city. Called with the lock.
+
+        :param rows: The (id, name, subdivision, latitude, longitude) rows.
+        :return: The slot of the first row.
+        """
+        start = self._size
+        self._reserve(len(rows))
+
+        for slot, (city_id, name, subdivision, latitude, longitude) in enumerate(rows, start):
+            code = subdivision.upper()
+            self._ids[slot] = city_id
+            self._subdivisions[slot] = self._subdivision_number(code)
+            self._countries[slot] = self._country_numbers[code[:2]]
+            self._latitudes[slot] = np.nan if latitude is None else latitude
+            self._longitudes[slot] = np.nan if longitude is None else longitude
+            self._names.append(name)
+
+            previous = self._slots.get(city_id)
+            if previous is not None:
+                self._remove_slot(previous)
+
+            self._slots[city_id] = slot
+
+        self._alive[start:start + len(rows)] = True
+        self._size += len(rows)
+
+        return start
+
+    def _remove_slot(self, slot: int):
+        if self._alive[slot]:
+            self._alive[slot] = False
+            self._dead += 1
+
+    def _row(self, slot: int) -> tuple:
+        """
+        Returns the city row of a slot.
+
+        :param slot: The slot.
+        :type slot: int
+        :return: The (id, name, subdivision, latitude, longitude) row.
+        """
+        latitude = float(self._latitudes[slot])
+        longitude = float(self._longitudes[slot])
+
+        return (int(self._ids[slot]), self._names[slot], self._subdivision_codes[self._subdivisions[slot]],
+                None if latitude != latitude else latitude, None if longitude != longitude else longitude)
+
+    def coordinates(self, city_ids) -> tuple:
+        """
+        Returns the coordinates of city records by id.
+
+        :param city_ids: The city record identifiers.
+        :return: The latitudes and longitudes in degrees as float64 arrays, NaN for cities not in the index or
+            without coordinates.
+        """
+        self.refresh()
+
+        with self._lock:
+            slots = np.array([self._slots.get(city_id, -1) for city_id in city_ids], dtype=np.int64)
+            found = slots >= 0
+            latitudes = np.full(slots.size, np.nan)
+            longitudes = np.full(slots.size, np.nan)
+            latitudes[found] = self._latitudes[slots[found]]
+            longitudes[found] = self._longitudes[slots[found]]
+
+        return latitudes, longitudes
+
+    def build(self):
+        """
+        Read every city record and index it.
+
+        :return: None
+        """
+        started = time.perf_counter()
+        subdivision_index = get_subdivision_index()
+
+        # Generations are read before the records, so a write racing the build leaves its subdivision stale
+        all_generation = get_city_generation(ALL_CITIES)
+        country_generations = dict((code[:2], get_city_generation(code[:2])) for code in subdivision_index.codes)
+        generations = dict((code, get_city_generation(code)) for code in subdivision_index.codes)
+
+        rows = []
+        with read_from_primary():
+            result = db.session.execute(select_cities().execution_options(yield_per=BUILD_BATCH_SIZE))
+
+            for partition in result.partitions():
+                rows.extend(tuple(row) for row in partition if self._accepts(row))
+
+        with self._lock:
+            self._reset()
+            self._index_slots(self._append(rows), rows, True)
+            self._generations = generations
+            self._country_generations = country_generations
+            self._all_generation = all_generation
+
+        log.info('Built {index} with {count} records in {seconds:.1f} seconds'.format(
+            index=type(self).__name__, count=self.count, seconds=time.perf_counter() - started))
+
+    def refresh(self, country_alpha2: str = None):
+        """
+        Read again the city records of the subdivisions whose generation moved past the one they were indexed at.
+
+        :param country_alpha2: The country whose subdivisions to check, or None for every country.
+        :type country_alpha2: str
+        :return: None
+        """
+        all_generation = get_city_generation(ALL_CITIES)
+
+        if country_alpha2 is None:
+            if self._all_generation == all_generation:
+                return
+
+            countries = {code[:2] for code in get_subdivision_index().codes} | set(self._country_numbers)
+        else:
+            countries = {country_alpha2}
+
+        country_generations = dict((country, get_city_generation(country)) for country in countries)
+        generations = {}
+
+        for country in countries:
+            if self._country_generations.get(country) == country_generations[country]:
+                continue
+
+            for code in self._get_country_subdivisions(country):
+                generation = get_city_generation(code)
+
+                if self._generations.get(code) != generation:
+                    generations[code] = generation
+
+        if generations:
+            with read_from_primary():
+                rows = [tuple(row) for row in
+                        db.session.execute(select_cities(City.subdivision.in_(list(generations)))).all()]
+
+            self._replace(generations, rows)
+
+        with self._lock:
+            self._country_generations.update(country_generations)
+
+            if country_alpha2 is None:
+                self._all_generation = all_generation
+
+    def _replace(self, generations: dict, rows):
+        with self._lock:
+            # Keep subdivisions a write through this process already moved to a later generation
+            codes = {code for code, generation in generations.items()
+                     if self._generations.get(code, -1) <= generation}
+            rows = [row for row in rows if row[2].upper() in codes and self._accepts(row)]
+            numbers = [self._subdivision_numbers[code] for code in codes if code in self._subdivision_numbers]
+
+            if numbers:
+                removed = np.flatnonzero(self._alive[:self._size] &
+                                         np.isin(self._subdivisions[:self._size], numbers))
+                self._alive[removed] = False
+                self._dead += removed.size
+
+                for city_id in self._ids[removed].tolist():
+                    self._slots.pop(city_id, None)
+
+            self._index_slots(self._append(rows), rows, False)
+
+            for code in codes:
+                self._generations[code] = generations[code]
+
+            self._compact_if_needed()
+
+        log.debug('Read {count} city records of {subdivisions} subdivisions into the {index}'.format(
+            count=len(rows), subdivisions=len(codes), index=type(self).__name__))
+
+    def apply(self, subdivision: str, generation: int, removed=None, added=None):
+        """
+        Record a write to a subdivision whose generation was just advanced from generation.
+
+        The write is applied when the subdivision was indexed at that generation and no other write advanced the
+        generation since; otherwise the subdivision is left stale and read again before the next query.
+
+        :param subdivision: The subdivision code (e.g. CA-AB).
+        :type subdivision: str
+        :param generation: The generation of the subdivision before the write was recorded.
+        :type generation: int
+        :param removed: The (id, name, subdivision, latitude, longitude) row of the removed city, or None.
+        :type removed: tuple
+        :param added: The (id, name, subdivision, latitude, longitude) row of the added city, or None.
+        :type added: tuple
+        :return: None
+        """
+        code = subdivision.upper()
+
+        with self._lock:
+            if self._generations.get(code) != generation or get_city_generation(code) != generation + 1:
+                return
+
+            if removed is not None:
+                slot = self._slots.get(removed[0])
+
+                if slot is not None and self._subdivision_codes[self._subdivisions[slot]] == code:
+                    self._remove_slot(slot)
+                    del self._slots[removed[0]]
+
+            if added is not None and self._accepts(added):
+                self._index_slots(self._append([added]), [added], False)
+
+            self._generations[code] = generation + 1
+            self._compact_if_needed()
+
+    def _compact_if_needed(self):
+        if self._dead > COMPACT_DEAD_FRACTION * max(self._size, 1) or self._needs_compaction():
+            self._compact()
+
+    def _compact(self):
+        """
+        Drop removed slots and renumber the others. Called with the lock.
+
+        :return: None
+        """
+        alive = self._alive[:self._size].copy()
+        renumber = (np.cumsum(alive) - 1).astype(np.int32)
+        kept = np.flatnonzero(alive)
+
+        for name in self.SLOT_ARRAYS:
+            setattr(self, name, getattr(self, name)[kept])
+
+        self._names = [self._names[slot] for slot in kept.tolist()]
+        self._slots = dict(zip(self._ids.tolist(), range(kept.size)))
+        self._size = kept.size
+        self._dead = 0
+        self._compact_index(alive, renumber)
+
+        log.debug('Compacted {index} to {count} records'.format(index=type(self).__name__, count=self._size))
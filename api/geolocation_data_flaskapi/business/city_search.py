@@ -0,0 +1,276 @@
+"""
+@author:     Fyzel@users.noreply.github.com
+
+@copyright:  2017 Englesh.org. All rights reserved.
+
+@license:    https://github.com/Fyzel/geolocation-data-flaskapi/blob/master/LICENSE
+
+@contact:    Fyzel@users.noreply.github.com
+@deffield    updated: 2026-10-17
+"""
+
+import bisect
+import heapq
+import unicodedata
+from itertools import islice
+from threading import Lock
+
+from api.geolocation_data_flaskapi.business.city_stream import select_cities
+from api.geolocation_data_flaskapi.business.generations import get_city_generation
+from database import db
+from database.models import City
+from database.routing import read_from_primary
+
+
+def normalize_name(name: str) -> str:
+    """
+    Returns the search key of a city name: accents stripped and case folded, so 'Québec' and 'QUEBEC' both match the
+    prefix 'que'.
+
+    :param name: The city name.
+    :type name: str
+    :return: The search key.
+    """
+    if name.isascii():
+        return name.casefold()
+
+    decomposed = unicodedata.normalize('NFKD', name)
+    return ''.join(character for character in decomposed if not unicodedata.combining(character)).casefold()
+
+
+def name_key(row) -> tuple:
+    """
+    Returns the sort key of a city row in a name index.
+
+    :param row: The (id, name, subdivision, latitude, longitude) row.
+    :return: The (search key, name, id, latitude, longitude) tuple.
+    """
+    city_id, name, subdivision, latitude, longitude = row
+    return normalize_name(name), name, city_id, latitude, longitude
+
+
+class SubdivisionNameIndex(object):
+    """
+    The cities of one subdivision as a sorted list of (search key, name, id, latitude, longitude), searched by name
+    prefix with bisect.
+
+    An index is never changed once built; changes build a new index, so searches need no lock.
+    """
+
+    __slots__ = ('subdivision', 'generation', 'keys')
+
+    def __init__(self, subdivision: str, generation: int, keys: list):
+        """
+        SubdivisionNameIndex constructor.
+
+        :param subdivision: The subdivision code (e.g. CA-AB).
+        :type subdivision: str
+        :param generation: The city generation of the subdivision the names were read at.
+        :type generation: int
+        :param keys: The sorted (search key, name, id, latitude, longitude) tuples.
+        :type keys: list
+        """
+        self.subdivision = subdivision
+        self.generation = generation
+        self.keys = keys
+
+    @classmethod
+    def build(cls, subdivision: str, generation: int, cities):
+        """
+        Build the index of a subdivision.
+
+        :param subdivision: The subdivision code (e.g. CA-AB).
+        :type subdivision: str
+        :param generation: The city generation of the subdivision the cities were read at.
+        :type generation: int
+        :param cities: The (id, name, subdivision, latitude, longitude) rows of the subdivision.
+        :return: SubdivisionNameIndex
+        """
+        return cls(subdivision, generation, sorted(name_key(row) for row in cities))
+
+    def changed(self, removed=None, added=None):
+        """
+        Returns the index of the next generation with a city removed and/or added.
+
+        :param removed: The (id, name, subdivision, latitude, longitude) row of the removed city, or None.
+        :type removed: tuple
+        :param added: The (id, name, subdivision, latitude, longitude) row of the added city, or None.
+        :type added: tuple
+        :return: SubdivisionNameIndex
+        """
+        keys = list(self.keys)
+
+        if removed is not None:
+            key = name_key(removed)
+            position = bisect.bisect_left(keys, key)
+
+            if position < len(keys) and keys[position] == key:
+                del keys[position]
+
+        if added is not None:
+            key = name_key(added)
+            position = bisect.bisect_left(keys, key)
+
+            if position == len(keys) or keys[position] != key:
+                keys.insert(position, key)
+
+        return SubdivisionNameIndex(self.subdivision, self.generation + 1, keys)
+
+    def search(self, prefix: str, limit: int):
+        """
+        Yield the keys whose search key starts with a normalized prefix, in order.
+
+        :param prefix: The normalized prefix.
+        :type prefix: str
+        :param limit: The maximum number of keys.
+        :type limit: int
+        :return: A generator of (search key, name, id, latitude, longitude) tuples.
+        """
+        position = bisect.bisect_left(self.keys, (prefix,))
+
+        for key in self.keys[position:position + limit]:
+            if not key[0].startswith(prefix):
+                return
+
+            yield key
+
+
+class CityNameIndex(object):
+    """
+    Prefix indexes of the city names of every subdivision searched so far.
+
+    An index is loaded on first search and reloaded when the city generation of its subdivision moved past the
+    generation it was read at, which also catches writes made through other worker processes when the generations
+    are shared. Writes through this process update the index in place of a reload.
+    """
+
+    def __init__(self):
+        """
+        CityNameIndex constructor.
+        """
+        self._lock = Lock()
+        self._indexes = {}
+        self._country_generations = {}
+
+    def clear(self):
+        """
+        Drop every index.
+
+        :return: None
+        """
+        with self._lock:
+            self._indexes.clear()
+            self._country_generations.clear()
+
+    def _load(self, codes):
+        generations = {code: get_city_generation(code) for code in codes}
+        cities = {code: [] for code in codes}
+
+        with read_from_primary():
+            for row in db.session.execute(select_cities(City.subdivision.in_(codes))):
+                cities[row.subdivision.upper()].append(row)
+
+        indexes = {code: SubdivisionNameIndex.build(code, generations[code], cities[code]) for code in codes}
+
+        with self._lock:
+            for code, index in indexes.items():
+                current = self._indexes.get(code)
+
+                # Keep an index a write through this process already moved to a later generation
+                if current is None or current.generation <= index.generation:
+                    self._indexes[code] = index
+
+        return indexes
+
+    def get_indexes(self, codes, country_alpha2: str = None) -> list:
+        """
+        Returns the current indexes of subdivisions, loading the missing and stale ones in one query.
+
+        :param codes: The upper case subdivision codes.
+        :param country_alpha2: The country of the subdivisions when they are all its subdivisions. Its generation,
+            which every write to one of them advances, spares checking each subdivision when nothing changed.
+        :type country_alpha2: str
+        :return: The SubdivisionNameIndex of each subdivision, in order.
+        """
+        country_generation = None
+
+        if country_alpha2 is not None:
+            country_generation = get_city_generation(country_alpha2)
+
+            if self._country_generations.get(country_alpha2) == country_generation:
+                indexes = [self._indexes.get(code) for code in codes]
+
+                if None not in indexes:
+                    return indexes
+
+        indexes = {}
+        stale = []
+
+        for code in codes:
+            index = self._indexes.get(code)
+
+            if index is None or index.generation != get_city_generation(code):
+                stale.append(code)
+            else:
+                indexes[code] = index
+
+        if stale:
+            indexes.update(self._load(stale))
+
+        if country_generation is not None:
+            with self._lock:
+                self._country_generations[country_alpha2] = country_generation
+
+        return [indexes[code] for code in codes]
+
+    def search(self, codes, prefix: str, limit: int, country_alpha2: str = None) -> list:
+        """
+        Returns the cities of subdivisions whose name starts with a prefix, ordered by search key.
+
+        :param codes: The subdivision codes.
+        :param prefix: The name prefix; accents and case are ignored.
+        :type prefix: str
+        :param limit: The maximum number of cities.
+        :type limit: int
+        :param country_alpha2: The country of the subdivisions when they are all its subdivisions.
+        :type country_alpha2: str
+        :return: The (id, name, subdivision, latitude, longitude) rows.
+        """
+        prefix = normalize_name(prefix)
+        indexes = self.get_indexes([code.upper() for code in codes],
+                                   country_alpha2=country_alpha2.upper() if country_alpha2 else None)
+        matches = [[key + (index.subdivision,) for key in index.search(prefix, limit)] for index in indexes]
+
+        return [(city_id, name, subdivision, latitude, longitude)
+                for normalized, name, city_id, latitude, longitude, subdivision
+                in islice(heapq.merge(*matches), limit)]
+
+    def apply(self, subdivision: str, generation: int, removed=None, added=None):
+        """
+        Record a write to a subdivision whose generation was just advanced from generation.
+
+        The loaded index is updated when it was read at that generation and no other write advanced the generation
+        since; otherwise it is left stale and the next search reloads it.
+
+        :param subdivision: The subdivision code (e.g. CA-AB).
+        :type subdivision: str
+        :param generation: The generation of the subdivision before the write was recorded.
+        :type generation: int
+        :param removed: The (id, name, subdivision, latitude, longitude) row of the removed city, or None.
+        :type removed: tuple
+        :param added: The (id, name, subdivision, latitude, longitude) row of the added city, or None.
+        :type added: tuple
+        :return: None
+        """
+        code = subdivision.upper()
+
+        with self._lock:
+            index = self._indexes.get(code)
+
+            if index is None or index.generation != generation or get_city_generation(code) != generation + 1:
+                return
+
+            self._indexes[code] = index.changed(removed=removed, added=added)
+
+
+city_name_index = CityNameIndex()
@@ -0,0 +1,188 @@
+"""
+@author:     Fyzel@users.noreply.github.com
+
+@copyright:  2017 Englesh.org. All rights reserved.
+
+@license:    https://github.com/Fyzel/geolocation-data-flaskapi/blob/master/LICENSE
+
+@contact:    Fyzel@users.noreply.github.com
+@deffield    updated: 2026-10-17
+"""
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+from api.geolocation_data_flaskapi.business.city_index import CityIndex
+from api.geolocation_data_flaskapi.business.geodesy import haversine_km, unit_vectors
+
+# Slots added since the tree was built that trigger a rebuild, at least, and as a fraction of the tree
+REBUILD_MIN_SLOTS = 4096
+REBUILD_SLOT_FRACTION = 0.01
+
+# Largest number of (query, added slot) distances computed directly; beyond it the added slots get their own tree
+DIRECT_DISTANCES_MAX = 1 << 22
+
+
+def merge_nearest(slots, distances, more_slots, more_distances, k: int) -> tuple:
+    """
+    Returns the k nearest of two sets of candidates for each query.
+
+    :param slots: The candidate slots of each query, one row per query.
+    :param distances: The distances of the candidates, infinite for no candidate.
+    :param more_slots: More candidate slots of each query.
+    :param more_distances: The distances of the other candidates.
+    :param k: The number of candidates kept per query.
+    :type k: int
+    :return: The kept slots and distances, nearest first.
+    """
+    slots = np.concatenate((slots, more_slots), axis=1)
+    distances = np.concatenate((distances, more_distances), axis=1)
+    order = np.argsort(distances, axis=1, kind='stable')[:, :k]
+
+    return np.take_along_axis(slots, order, axis=1), np.take_along_axis(distances, order, axis=1)
+
+
+class CitySpatialIndex(CityIndex):
+    """
+    A spatial index of the cities with coordinates, searched for the cities nearest to points.
+
+    Cities are points on the unit sphere in a KD-tree, so the nearest points by straight-line distance are the
+    nearest cities by great-circle distance. Removed cities stay in the tree and are skipped by queries; cities added
+    since the tree was built are compared directly until the next rebuild.
+    """
+
+    SLOT_ARRAYS = CityIndex.SLOT_ARRAYS + ('_points',)
+
+    def _reset_index(self):
+        self._points = np.zeros((0, 3), dtype=np.float64)
+        self._tree = None
+        self._delta = []
+
+    def _accepts(self, row) -> bool:
+        return row[3] is not None and row[4] is not None
+
+    def _index_slots(self, start: int, rows, built: bool):
+        self._points[start:start + len(rows)] = unit_vectors([row[3] for row in rows], [row[4] for row in rows])
+
+        if built:
+            self._build_tree()
+        else:
+            self._delta.extend(range(start, start + len(rows)))
+
+    def _build_tree(self):
+        self._tree = cKDTree(self._points[:self._size]) if self._size else None
+        self._delta = []
+
+    def _needs_compaction(self) -> bool:
+        tree_size = 0 if self._tree is None else self._tree.n
+        return len(self._delta) > max(REBUILD_MIN_SLOTS, REBUILD_SLOT_FRACTION * tree_size)
+
+    def _compact_index(self, alive, renumber):
+        self._build_tree()
+
+    def _query_tree(self, points, k: int) -> tuple:
+        """
+        Returns the k nearest cities in the tree to each point, skipping removed cities.
+
+        :param points: The query points on the unit sphere.
+        :param k: The number of cities per point.
+        :type k: int
+        :return: The slots and straight-line distances, nearest first, padded with -1 and infinity.
+        """
+        slots = np.full((len(points), k), -1, dtype=np.int64)
+        distances = np.full((len(points), k), np.inf)
+
+        if self._tree is None:
+            return slots, distances
+
+        pending = np.arange(len(points))
+        width = min(k, self._tree.n)
+
+        # Queries whose nearest cities include removed ones ask again for twice as many
+        while pending.size:
+            found_distances, found = self._tree.query(points[pending], k=width)
+            found_distances = found_distances.reshape(pending.size, width)
+            found = found.reshape(pending.size, width)
+
+            removed = ~self._alive[found]
+            found_distances[removed] = np.inf
+            found[removed] = -1
+
+            order = np.argsort(found_distances, axis=1, kind='stable')[:, :k]
+            slots[pending, :order.shape[1]] = np.take_along_axis(found, order, axis=1)
+            distances[pending, :order.shape[1]] = np.take_along_axis(found_distances, order, axis=1)
+
+            if width == self._tree.n:
+                break
+
+            pending = pending[np.count_nonzero(removed, axis=1) > width - k]
+            width = min(2 * width, self._tree.n)
+
+        return slots, distances
+
+    def _query_delta(self, points, k: int) -> tuple:
+        """
+        Returns the k nearest cities added since the tree was built to each point.
+
+        :param points: The query points on the unit sphere.
+        :param k: The number of cities per point.
+        :type k: int
+        :return: The slots and straight-line distances, nearest first, padded with -1 and infinity.
+        """
+        delta = np.array(self._delta, dtype=np.int64)
+        delta = delta[self._alive[delta]] if delta.size else delta
+        width = min(k, delta.size)
+
+        if width == 0:
+            return np.full((len(points), 0), -1, dtype=np.int64), np.zeros((len(points), 0))
+
+        if len(points) * delta.size <= DIRECT_DISTANCES_MAX:
+            distances = np.linalg.norm(points[:, np.newaxis, :] - self._points[delta][np.newaxis, :, :], axis=2)
+            nearest = np.argpartition(distances, width - 1, axis=1)[:, :width]
+            return delta[nearest], np.take_along_axis(distances, nearest, axis=1)
+
+        distances, nearest = cKDTree(self._points[delta]).query(points, k=width)
+        return delta[nearest.reshape(len(points), width)], distances.reshape(len(points), width)
+
+    def nearest(self, latitudes, longitudes, k: int) -> list:
+        """
+        Returns the k cities nearest to each of many points, nearest first.
+
+        :param latitudes: The latitudes of the points in degrees.
+        :param longitudes: The longitudes of the points in degrees.
+        :param k: The number of cities per point.
+        :type k: int
+        :return: For each point, the list of (id, name, subdivision, latitude, longitude, distance) rows of its
+            nearest cities, with the great-circle distance in kilometres.
+        """
+        latitudes = np.asarray(latitudes, dtype=np.float64)
+        longitudes = np.asarray(longitudes, dtype=np.float64)
+        points = unit_vectors(latitudes, longitudes)
+
+        self.refresh()
+
+        with self._lock:
+            slots, distances = merge_nearest(*(self._query_tree(points, k) + self._query_delta(points, k)), k=k)
+            found = slots >= 0
+            kilometres = np.zeros(slots.shape)
+            kilometres[found] = haversine_km(np.broadcast_to(latitudes[:, np.newaxis], slots.shape)[found],
+                                             np.broadcast_to(longitudes[:, np.newaxis], slots.shape)[found],
+                                             self._latitudes[slots[found]], self._longitudes[slots[found]])
+
+            return [[self._row(slot) + (distance,)
+                     for slot, distance in zip(point_slots, point_kilometres) if slot >= 0]
+                    for point_slots, point_kilometres in zip(slots.tolist(), kilometres.tolist())]
+
+
+city_spatial_index = CitySpatialIndex()
+
+
+def init_city_spatial_index(app):
+    """
+    Build the city spatial index from the database.
+
+    :param app: The Flask application.
+    :return: None
+    """
+    with app.app_context():
+        city_spatial_index.build()
@@ -0,0 +1,225 @@
+"""
+@author:     Fyzel@users.noreply.github.com
+
+@copyright:  2017 Englesh.org. All rights reserved.
+
+@license:    https://github.com/Fyzel/geolocation-data-flaskapi/blob/master/LICENSE
+
+@contact:    Fyzel@users.noreply.github.com
+@deffield    updated: 2026-10-17
+"""
+
+import csv
+import io
+import json
+
+from sqlalchemy import and_, lambda_stmt, or_, select
+
+from database import db
+from database.models import City
+
+NDJSON_MIMETYPE = 'application/x-ndjson'
+CSV_MIMETYPE = 'text/csv'
+
+CITY_COLUMNS = ('id', 'name', 'subdivision', 'latitude', 'longitude')
+
+
+def select_cities(*criteria):
+    """
+    Returns a statement selecting the serialized columns of the matching city records.
+
+    :param criteria: The filter criteria.
+    :return: The select statement.
+    """
+    return select(City.id, City.name, City.subdivision, City.latitude, City.longitude).where(*criteria)
+
+
+def select_city(city_id: int):
+    """
+    Returns a cached statement selecting the serialized columns of one city record.
+
+    The statement is compiled once; later calls only bind the new id.
+
+    :param city_id: The city record identifier.
+    :type city_id: int
+    :return: The lambda statement.
+    """
+    return lambda_stmt(lambda: select(City.id, City.name, City.subdivision, City.latitude, City.longitude)
+                       .where(City.id == city_id))
+
+
+def select_city_page(subdivision: str, limit: int, after=None):
+    """
+    Returns a cached statement selecting the serialized columns of a page of city records in a subdivision, ordered
+    by name and id.
+
+    Pages are read with a keyset on (name, id) rather than an offset, so every page is a range scan of the
+    city_name_subdivision_index no matter how deep it is. The statement is compiled once for first pages and once
+    for later pages; later calls only bind the new values.
+
+    :param subdivision: The subdivision code (e.g. CA-AB).
+    :type subdivision: str
+    :param limit: The maximum number of rows.
+    :type limit: int
+    :param after: The (name, id) of the last city record of the previous page, or None for the first page.
+    :type after: tuple
+    :return: The lambda statement.
+    """
+    statement = lambda_stmt(lambda: select(City.id, City.name, City.subdivision, City.latitude, City.longitude)
+                            .where(City.subdivision == subdivision))
+
+    if after is not None:
+        name, city_id = after
+        statement += lambda s: s.where(or_(City.name > name, and_(City.name == name, City.id > city_id)))
+
+    statement += lambda s: s.order_by(City.name, City.id).limit(limit)
+    return statement
+
+
+def select_city_export(subdivision_codes=None):
+    """
+    Returns a statement selecting every city record, or those in the given subdivisions, in primary key order.
+
+    :param subdivision_codes: The subdivision codes to export, or None for the whole table.
+    :return: The select statement.
+    """
+    criteria = [] if subdivision_codes is None else [City.subdivision.in_(subdivision_codes)]
+    return select_cities(*criteria).order_by(City.id)
+
+
+def _iter_result(result):
+    try:
+        for row in result:
+            yield row
+    finally:
+        result.close()
+
+
+def iter_city_rows(statement, batch_size: int, connection=None):
+    """
+    Run a city statement and iterate its rows through a server-side cursor.
+
+    The statement runs at once, so errors surface before a response starts. Rows are then fetched batch_size at a
+    time (an SSCursor on mysqlclient), so memory use does not grow with the size of the result.
+
+    :param statement: The select statement.
+    :param batch_size: The number of rows fetched per round trip.
+    :type batch_size: int
+    :param connection: The connection to read from, or None for the application session.
+    :return: A generator of (id, name, subdivision, latitude, longitude) rows.
+    """
+    if connection is None:
+        connection = db.session
+
+    result = connection.execute(statement.execution_options(yield_per=batch_size))
+    return _iter_result(result)
+
+
+def encode_city_row(row) -> bytes:
+    """
+    Encode a city row as it is marshalled by the City model.
+
+    :param row: The (id, name, subdivision, latitude, longitude) row.
+    :return: The encoded JSON object.
+    """
+    return json.dumps(dict(zip(CITY_COLUMNS, row)), separators=(',', ':')).encode('utf-8')
+
+
+def encode_city_rows(rows) -> bytes:
+    """
+    Encode city rows as one JSON array.
+
+    :param rows: The (id, name, subdivision, latitude, longitude) rows.
+    :return: The encoded JSON array.
+    """
+    return b'[' + b','.join(encode_city_row(row) for row in rows) + b']'
+
+
+def encode_city_distance_rows(rows) -> bytes:
+    """
+    Encode city rows with their distance from a point as one JSON array.
+
+    :param rows: The (id, name, subdivision, latitude, longitude, distance) rows.
+    :return: The encoded JSON array.
+    """
+    return json.dumps([dict(zip(CITY_COLUMNS + ('distance',), row)) for row in rows],
+                      separators=(',', ':')).encode('utf-8')
+
+
+def _chunks(rows, batch_size: int, separator: bytes):
+    chunk = []
+
+    for row in rows:
+        chunk.append(encode_city_row(row))
+
+        if len(chunk) >= batch_size:
+            yield separator.join(chunk)
+            chunk = []
+
+    if chunk:
+        yield separator.join(chunk)
+
+
+def encode_json_array(rows, batch_size: int):
+    """
+    Encode city rows incrementally as one JSON array.
+
+    :param rows: The (id, name, subdivision, latitude, longitude) rows.
+    :param batch_size: The number of rows per yielded chunk.
+    :type batch_size: int
+    :return: A generator of encoded chunks.
+    """
+    yield b'['
+
+    first = True
+    for chunk in _chunks(rows, batch_size, b','):
+        yield chunk if first else b',' + chunk
+        first = False
+
+    yield b']'
+
+
+def encode_ndjson(rows, batch_size: int):
+    """
+    Encode city rows incrementally as newline delimited JSON, one object per line.
+
+    :param rows: The (id, name, subdivision, latitude, longitude) rows.
+    :param batch_size: The number of rows per yielded chunk.
+    :type batch_size: int
+    :return: A generator of encoded chunks.
+    """
+    for chunk in _chunks(rows, batch_size, b'\n'):
+        yield chunk + b'\n'
+
+
+def encode_csv(rows, batch_size: int):
+    """
+    Encode city rows incrementally as CSV with a header line.
+
+    :param rows: The (id, name, subdivision, latitude, longitude) rows.
+    :param batch_size: The number of rows per yielded chunk.
+    :type batch_size: int
+    :return: A generator of encoded chunks.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+    writer.writerow(CITY_COLUMNS)
+    count = 0
+
+    for row in rows:
+        writer.writerow(row)
+        count += 1
+
+        if count >= batch_size:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+            count = 0
+
+    yield buffer.getvalue().encode('utf-8')
+
+
+EXPORT_FORMATS = {
+    'ndjson': (encode_ndjson, NDJSON_MIMETYPE),
+    'csv': (encode_csv, CSV_MIMETYPE),
+}
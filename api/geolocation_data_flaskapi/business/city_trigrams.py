@@ -0,0 +1,237 @@
+"""
+@author:     Fyzel@users.noreply.github.com
+
+@copyright:  2017 Englesh.org. All rights reserved.
+
+@license:    https://github.com/Fyzel/geolocation-data-flaskapi/blob/master/LICENSE
+
+@contact:    Fyzel@users.noreply.github.com
+@deffield    updated: 2026-10-17
+"""
+
+import math
+import re
+
+import numpy as np
+
+from api.geolocation_data_flaskapi.business.city_index import CityIndex
+from api.geolocation_data_flaskapi.business.city_search import normalize_name
+
+WORD = re.compile(r'[^\W_]+')
+
+# Posting entries added since the last compaction that trigger the next one, at least, and as a fraction of the
+# compacted entries
+COMPACT_MIN_ENTRIES = 65536
+COMPACT_ENTRY_FRACTION = 0.1
+
+
+def pad_words(name: str) -> str:
+    """
+    Returns the words of a normalized city name, each padded with two spaces before and one after.
+
+    :param name: The city name.
+    :type name: str
+    :return: The padded words, e.g. '  saint   john ' for 'Saint-John'.
+    """
+    return ''.join('  {word} '.format(word=word) for word in WORD.findall(normalize_name(name)))
+
+
+def name_trigrams(name: str) -> set:
+    """
+    Returns the trigrams of a city name, each packed into an int as three 21 bit code points.
+
+    Trigrams are taken from each padded word, so 'Edmonton' gives '  e', ' ed', 'edm', ..., 'ton' and 'on '.
+
+    :param name: The city name.
+    :type name: str
+    :return: The set of trigram codes.
+    """
+    text = pad_words(name)
+    return {(ord(text[i]) << 42) | (ord(text[i + 1]) << 21) | ord(text[i + 2])
+            for i in range(len(text) - 2)
+            if text[i + 1] != ' ' or text[i + 2] != ' '}
+
+
+def index_trigrams(names) -> tuple:
+    """
+    Returns the trigrams of many city names at once; the same trigrams name_trigrams returns for each name.
+
+    :param names: The city names.
+    :return: The number of trigrams of each name as an array, and the positions of the names having each trigram as
+        arrays by trigram code.
+    """
+    texts = [pad_words(name) for name in names]
+    lengths = np.zeros(len(texts), dtype=np.int32)
+    chars = np.frombuffer(''.join(texts).encode('utf-32-le'), dtype=np.uint32).astype(np.uint64)
+
+    if chars.size < 3:
+        return lengths, {}
+
+    # A window is a trigram unless it ends in two spaces, i.e. runs past the end of a word
+    valid = (chars[1:-1] != 32) | (chars[2:] != 32)
+    codes = ((chars[:-2] << np.uint64(42)) | (chars[1:-1] << np.uint64(21)) | chars[2:])[valid]
+    owners = np.repeat(np.arange(len(texts), dtype=np.int64), [len(text) for text in texts])[:-2][valid]
+
+    if codes.size == 0:
+        return lengths, {}
+
+    # Group by trigram, the names of each trigram in order, and count a trigram once per name
+    order = np.argsort(codes, kind='stable')
+    codes = codes[order]
+    owners = owners[order].astype(np.int32)
+    distinct = np.ones(codes.size, dtype=bool)
+    distinct[1:] = (codes[1:] != codes[:-1]) | (owners[1:] != owners[:-1])
+    codes = codes[distinct]
+    owners = owners[distinct]
+    lengths += np.bincount(owners, minlength=len(texts)).astype(np.int32)
+
+    starts = np.flatnonzero(np.concatenate(([True], codes[1:] != codes[:-1])))
+    bounds = starts.tolist() + [codes.size]
+
+    return lengths, {code: owners[bounds[index]:bounds[index + 1]]
+                     for index, code in enumerate(codes[starts].tolist())}
+
+
+class CityTrigramIndex(CityIndex):
+    """
+    A trigram inverted index of every city name, searched by similarity.
+
+    The similarity of two names is the number of trigrams they share over the number of distinct trigrams of both,
+    so 'Edmonten' still finds 'Edmonton' and 'Montreal' finds 'Montréal'. A search counts the shared trigrams of
+    every city in one pass over the postings of the query trigrams, so it never scans the city table. The postings
+    of slots added since the last compaction are kept apart until the next one merges them.
+    """
+
+    SLOT_ARRAYS = CityIndex.SLOT_ARRAYS + ('_lengths',)
+
+    def _reset_index(self):
+        self._lengths = np.zeros(0, dtype=np.int32)
+        self._postings = {}
+        self._delta = {}
+        self._entries = 0
+        self._delta_entries = 0
+
+    def _index_slots(self, start: int, rows, built: bool):
+        if len(rows) == 1:
+            trigrams = name_trigrams(rows[0][1])
+            self._lengths[start] = len(trigrams)
+
+            for trigram in trigrams:
+                self._delta.setdefault(trigram, []).append(start)
+
+            self._delta_entries += len(trigrams)
+            return
+
+        lengths, postings = index_trigrams([row[1] for row in rows])
+        self._lengths[start:start + len(rows)] = lengths
+
+        if built:
+            self._postings = postings
+            self._entries = sum(positions.size for positions in postings.values())
+            return
+
+        for trigram, positions in postings.items():
+            self._delta.setdefault(trigram, []).extend((positions + start).tolist())
+            self._delta_entries += positions.size
+
+    def _needs_compaction(self) -> bool:
+        return self._delta_entries > max(COMPACT_MIN_ENTRIES, COMPACT_ENTRY_FRACTION * self._entries)
+
+    def _compact_index(self, alive, renumber):
+        postings = {}
+
+        for trigram in set(self._postings) | set(self._delta):
+            positions = np.concatenate((self._postings.get(trigram, np.zeros(0, dtype=np.int32)),
+                                        np.array(self._delta.get(trigram, ()), dtype=np.int32)))
+            positions = renumber[positions[alive[positions]]]
+
+            if positions.size:
+                postings[trigram] = positions
+
+        self._postings = postings
+        self._delta = {}
+        self._entries = sum(positions.size for positions in postings.values())
+        self._delta_entries = 0
+
+    def search(self, query: str, limit: int, threshold: float, country_alpha2: str = None) -> list:
+        """
+        Returns the cities whose name is most similar to a query, most similar first.
+
+        :param query: The misspelt or partial city name; accents and case are ignored.
+        :type query: str
+        :param limit: The maximum number of cities.
+        :type limit: int
+        :param threshold: The minimum similarity of a match, between 0 and 1.
+        :type threshold: float
+        :param country_alpha2: The country of the cities, or None for every country.
+        :type country_alpha2: str
+        :return: The (id, name, subdivision, latitude, longitude) rows.
+        """
+        trigrams = name_trigrams(query)
+
+        if not trigrams:
+            return []
+
+        country_alpha2 = country_alpha2.upper() if country_alpha2 else None
+        self.refresh(country_alpha2)
+
+        with self._lock:
+            return [self._row(slot) for slot in self._search(trigrams, limit, threshold, country_alpha2)]
+
+    def _search(self, trigrams: set, limit: int, threshold: float, country_alpha2: str = None) -> list:
+        parts = []
+
+        for trigram in trigrams:
+            positions = self._postings.get(trigram)
+            if positions is not None:
+                parts.append(positions)
+
+            positions = self._delta.get(trigram)
+            if positions:
+                parts.append(np.array(positions, dtype=np.int32))
+
+        if not parts:
+            return []
+
+        slots = np.concatenate(parts)
+
+        if country_alpha2 is not None:
+            number = self._country_numbers.get(country_alpha2)
+
+            if number is None:
+                return []
+
+            slots = slots[self._countries[slots] == number]
+
+        # Count the trigrams shared by the slots of the postings only, not by every slot of the index. A match
+        # shares at least threshold times as many trigrams as the query has
+        candidates, shared = np.unique(slots, return_counts=True)
+        kept = (shared >= max(1, math.ceil(threshold * len(trigrams) - 1e-9))) & self._alive[candidates]
+        candidates, shared = candidates[kept], shared[kept]
+        similarity = shared / (len(trigrams) + self._lengths[candidates] - shared)
+
+        matches = similarity >= threshold
+        candidates, similarity = candidates[matches], similarity[matches]
+
+        if candidates.size > limit:
+            lowest = np.partition(similarity, candidates.size - limit)[candidates.size - limit]
+            matches = similarity >= lowest
+            candidates, similarity = candidates[matches], similarity[matches]
+
+        order = np.lexsort((self._ids[candidates], -similarity))[:limit]
+
+        return candidates[order].tolist()
+
+
+city_trigram_index = CityTrigramIndex()
+
+
+def init_city_trigram_index(app):
+    """
+    Build the city trigram index from the database.
+
+    :param app: The Flask application.
+    :return: None
+    """
+    with app.app_context():
+        city_trigram_index.build()
@@ -0,0 +1,132 @@
+"""
+@author:     Fyzel@users.noreply.github.com
+
+@copyright:  2017 Englesh.org. All rights reserved.
+
+@license:    https://github.com/Fyzel/geolocation-data-flaskapi/blob/master/LICENSE
+
+@contact:    Fyzel@users.noreply.github.com
+@deffield    updated: 2026-10-17
+"""
+
+import uuid
+from threading import Lock
+
+from api.geolocation_data_flaskapi.business.cache import get_cache_store
+
+# Generation key of the city records of every country
+ALL_CITIES = '*'
+
+
+class GenerationCounter(object):
+    """
+    A set of version counters, one per key, that writers bump whenever the data behind the key changes.
+
+    Counters start at zero for every key. The epoch is unique to the counter instance so generations handed out
+    before a restart never match the ones handed out after it. When the counters are kept in a store shared by
+    every worker, the epoch is kept there too, so every worker hands out the same generations.
+    """
+
+    def __init__(self, store=None):
+        """
+        GenerationCounter constructor.
+
+        :param store: The SQLiteStore shared by the workers, or None to keep the counters in this process.
+        :type store: SQLiteStore
+        """
+        self._lock = Lock()
+        self._generations = {}
+        self._store = store
+
+        if store is None:
+            self._epoch = uuid.uuid4().hex[:8]
+        else:
+            self._epoch = '{epoch:08x}'.format(epoch=store.setdefault_counter('epoch', uuid.uuid4().int & 0xffffffff))
+
+    @property
+    def epoch(self) -> str:
+        """
+        The identifier of this counter instance.
+        """
+        return self._epoch
+
+    def get(self, key: str) -> int:
+        """
+        Returns the current generation of a key.
+
+        :param key: The key.
+        :type key: str
+        :return: The generation.
+        """
+        if self._store is not None:
+            return self._store.counter('generation:{key}'.format(key=key))
+
+        return self._generations.get(key, 0)
+
+    def bump(self, *keys):
+        """
+        Advance the generation of every key.
+
+        :param keys: The keys whose data changed.
+        :return: None
+        """
+        if self._store is not None:
+            self._store.incr(*('generation:{key}'.format(key=key) for key in keys))
+            return
+
+        with self._lock:
+            for key in set(keys):
+                self._generations[key] = self._generations.get(key, 0) + 1
+
+
+city_generations = GenerationCounter()
+
+
+def init_city_generations(config):
+    """
+    Keep the city generations on the cache backend selected by CACHE_BACKEND, so that with a shared backend a write
+    through one worker invalidates the entity tags and cached pages of every worker.
+
+    :param config: The application config.
+    :return: None
+    """
+    global city_generations
+    city_generations = GenerationCounter(store=get_cache_store(config))
+
+
+def get_city_generation(subdivision: str) -> int:
+    """
+    Returns the generation of the city records in a subdivision.
+
+    :param subdivision: The subdivision code (e.g. CA-AB), a country alpha-2 code for the whole country, or ALL_CITIES
+        for every country.
+    :type subdivision: str
+    :return: The generation.
+    """
+    return city_generations.get(subdivision.upper())
+
+
+def bump_city_generation(*subdivisions):
+    """
+    Record that the city records in the subdivisions, in the countries they belong to and in all countries changed.
+
+    :param subdivisions: The subdivision codes (e.g. CA-AB).
+    :return: None
+    """
+    codes = [subdivision.upper() for subdivision in subdivisions if subdivision]
+
+    if codes:
+        city_generations.bump(*(codes + [code[:2] for code in codes] + [ALL_CITIES]))
+
+
+def get_city_etag(subdivision: str) -> str:
+    """
+    Returns the entity tag of the city records in a subdivision.
+
+    :param subdivision: The subdivision code (e.g. CA-AB), a country alpha-2 code for the whole country, or ALL_CITIES
+        for every country.
+    :type subdivision: str
+    :return: The unquoted entity tag.
+    """
+    return 'city-{epoch}-{generation}'.format(epoch=city_generations.epoch,
+                                              generation=get_city_generation(subdivision))
@@ -0,0 +1,58 @@
+"""
+@author:     Fyzel@users.noreply.github.com
+
+@copyright:  2017 Englesh.org. All rights reserved.
+
+@license:    https://github.com/Fyzel/geolocation-data-flaskapi/blob/master/LICENSE
+
+@contact:    Fyzel@users.noreply.github.com
+@deffield    updated: 2026-10-17
+"""
+
+import numpy as np
+
+# Mean radius of the Earth in kilometres
+EARTH_RADIUS_KM = 6371.0088
+
+
+def unit_vectors(latitudes, longitudes) -> np.ndarray:
+    """
+    Returns the points on the unit sphere at coordinates.
+
+    The straight-line distance between two such points grows with the great-circle distance between the
+    coordinates, so the nearest points in 3D are the nearest cities on the globe, across the antimeridian and the
+    poles too.
+
+    :param latitudes: The latitudes in degrees.
+    :param longitudes: The longitudes in degrees.
+    :return: An array of (x, y, z) rows.
+    """
+    latitudes = np.radians(np.asarray(latitudes, dtype=np.float64))
+    longitudes = np.radians(np.asarray(longitudes, dtype=np.float64))
+    cos_latitudes = np.cos(latitudes)
+
+    return np.stack((cos_latitudes * np.cos(longitudes), cos_latitudes * np.sin(longitudes), np.sin(latitudes)),
+                    axis=-1)
+
+
+def haversine_km(latitudes1, longitudes1, latitudes2, longitudes2) -> np.ndarray:
+    """
+    Returns the great-circle distances between coordinates with the haversine formula.
+
+    The arguments are broadcast against each other, so a column of coordinates and a row of coordinates give the
+    matrix of the distances between them.
+
+    :param latitudes1: The latitudes of the first points in degrees.
+    :param longitudes1: The longitudes of the first points in degrees.
+    :param latitudes2: The latitudes of the second points in degrees.
+    :param longitudes2: The longitudes of the second points in degrees.
+    :return: The distances in kilometres.
+    """
+    latitudes1 = np.radians(latitudes1)
+    latitudes2 = np.radians(latitudes2)
+    half_latitudes = (latitudes2 - latitudes1) / 2.0
+    half_longitudes = np.radians(np.subtract(longitudes2, longitudes1)) / 2.0
+
+    haversines = np.sin(half_latitudes) ** 2 + np.cos(latitudes1) * np.cos(latitudes2) * np.sin(half_longitudes) ** 2
+
+    return 2.0 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(haversines, 0.0, 1.0)))
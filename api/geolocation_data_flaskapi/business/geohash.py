@@ -0,0 +1,121 @@
+"""
+@author:     Fyzel@users.noreply.github.com
+
+@copyright:  2017 Englesh.org. All rights reserved.
+
+@license:    https://github.com/Fyzel/geolocation-data-flaskapi/blob/master/LICENSE
+
+@contact:    Fyzel@users.noreply.github.com
+@deffield    updated: 2026-10-17
+"""
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+# Characters of a stored geohash, a cell of about 5 by 5 metres
+GEOHASH_LENGTH = 9
+
+
+def _cell_bits(length: int) -> tuple:
+    """
+    Returns the number of longitude and latitude bits of a geohash; the bits alternate, longitude first.
+
+    :param length: The number of characters of the geohash.
+    :type length: int
+    :return: The (longitude bits, latitude bits) tuple.
+    """
+    return (5 * length + 1) // 2, 5 * length // 2
+
+
+def _cell(value: float, low: float, high: float, bits: int) -> int:
+    return min(int((value - low) / (high - low) * (1 << bits)), (1 << bits) - 1)
+
+
+def _interleave(x: int, y: int, longitude_bits: int, latitude_bits: int) -> int:
+    code = 0
+
+    for bit in range(longitude_bits + latitude_bits):
+        if bit % 2 == 0:
+            code = (code << 1) | ((x >> (longitude_bits - 1 - bit // 2)) & 1)
+        else:
+            code = (code << 1) | ((y >> (latitude_bits - 1 - bit // 2)) & 1)
+
+    return code
+
+
+def _to_base32(code: int, length: int) -> str:
+    return ''.join(BASE32[(code >> (5 * (length - 1 - position))) & 31] for position in range(length))
+
+
+def encode_geohash(latitude: float, longitude: float, length: int = GEOHASH_LENGTH) -> str:
+    """
+    Returns the geohash of coordinates.
+
+    Geohashes sharing a prefix are in the same cell of that length, so the cities of a cell are one range of a
+    B-tree index on the geohash.
+
+    :param latitude: The latitude in degrees.
+    :type latitude: float
+    :param longitude: The longitude in degrees.
+    :type longitude: float
+    :param length: The number of characters of the geohash.
+    :type length: int
+    :return: The geohash (e.g. c3x29 for Edmonton).
+    """
+    longitude_bits, latitude_bits = _cell_bits(length)
+
+    return _to_base32(_interleave(_cell(longitude, -180.0, 180.0, longitude_bits),
+                                  _cell(latitude, -90.0, 90.0, latitude_bits),
+                                  longitude_bits, latitude_bits), length)
+
+
+def cover_box(south: float, west: float, north: float, east: float, max_ranges: int) -> list:
+    """
+    Returns the geohash ranges covering a box, as few and as tight as max_ranges allows.
+
+    The box is covered with the cells of the longest geohash length needing at most max_ranges cells, and cells
+    next to each other in geohash order are merged into one range.
+
+    :param south: The southern latitude of the box in degrees.
+    :type south: float
+    :param west: The western longitude of the box in degrees; greater than east when the box crosses the antimeridian.
+    :type west: float
+    :param north: The northern latitude of the box in degrees.
+    :type north: float
+    :param east: The eastern longitude of the box in degrees.
+    :type east: float
+    :param max_ranges: The maximum number of ranges.
+    :type max_ranges: int
+    :return: The list of (low, high) ranges, from low included to high excluded; high is None for no upper bound.
+        A single ('', None) range covers every geohash.
+    """
+    boxes = [(west, east)] if west <= east else [(west, 180.0), (-180.0, east)]
+    cells = None
+
+    for length in range(1, GEOHASH_LENGTH + 1):
+        longitude_bits, latitude_bits = _cell_bits(length)
+        ys = (_cell(south, -90.0, 90.0, latitude_bits), _cell(north, -90.0, 90.0, latitude_bits))
+        xs = [(_cell(box_west, -180.0, 180.0, longitude_bits), _cell(box_east, -180.0, 180.0, longitude_bits))
+              for box_west, box_east in boxes]
+
+        if sum((x1 - x0 + 1) * (ys[1] - ys[0] + 1) for x0, x1 in xs) > max_ranges:
+            break
+
+        cells = (length, longitude_bits, latitude_bits, xs, ys)
+
+    if cells is None:
+        return [('', None)]
+
+    length, longitude_bits, latitude_bits, xs, ys = cells
+    codes = sorted({_interleave(x, y, longitude_bits, latitude_bits)
+                    for x0, x1 in xs for x in range(x0, x1 + 1) for y in range(ys[0], ys[1] + 1)})
+
+    # Merge runs of consecutive cells into [start, end) ranges
+    runs = []
+    for code in codes:
+        if runs and runs[-1][1] == code:
+            runs[-1][1] = code + 1
+        else:
+            runs.append([code, code + 1])
+
+    return [(_to_base32(start, length), _to_base32(end, length) if end < 1 << (5 * length) else None)
+            for start, end in runs]
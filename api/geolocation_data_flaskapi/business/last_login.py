@@ -0,0 +1,128 @@
+"""
+@author:     Fyzel@users.noreply.github.com
+
+@copyright:  2017 Englesh.org. All rights reserved.
+
+@license:    https://github.com/Fyzel/geolocation-data-flaskapi/blob/master/LICENSE
+
+@contact:    Fyzel@users.noreply.github.com
+@deffield    updated: 2026-10-17
+"""
+
+import atexit
+import logging
+import os
+import time
+from datetime import datetime
+from threading import Condition, Thread
+
+from sqlalchemy import case, update
+
+from database import db
+from database.models import User
+
+log = logging.getLogger(__name__)
+
+
+class LastLoginWriter(object):
+    """
+    Writes the last login dates of users behind the logins, from a background thread.
+
+    Logins are queued in memory, keeping only the latest date per user, and flushed as one UPDATE statement every
+    interval seconds or as soon as max_entries users are waiting, whichever comes first. The queue is drained when
+    the process exits, so the stored dates lag the logins by at most the interval.
+    """
+
+    def __init__(self, app, interval: float = 5.0, max_entries: int = 500):
+        """
+        LastLoginWriter constructor.
+
+        :param app: The Flask application whose database is written.
+        :param interval: The maximum number of seconds a login waits before it is written.
+        :type interval: float
+        :param max_entries: The number of waiting users that triggers an early flush.
+        :type max_entries: int
+        """
+        self._app = app
+        self._interval = interval
+        self._max_entries = max_entries
+        self._condition = Condition()
+        self._pending = {}
+        self._thread = None
+        self._pid = None
+        self.flushes = 0
+        self.written = 0
+
+        atexit.register(self.flush)
+
+    def _start(self):
+        if self._thread is None or self._pid != os.getpid():
+            self._thread = Thread(target=self._run, name='last-login-writer', daemon=True)
+            self._pid = os.getpid()
+            self._thread.start()
+
+    def record(self, user_id: int, login_date: datetime = None):
+        """
+        Queue the last login date of a user.
+
+        :param user_id: The user's database id.
+        :type user_id: int
+        :param login_date: The login date, or None for now.
+        :type login_date: datetime
+        :return: None
+        """
+        with self._condition:
+            self._start()
+            self._pending[user_id] = login_date or datetime.utcnow()
+
+            if len(self._pending) >= self._max_entries:
+                self._condition.notify()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                deadline = time.monotonic() + self._interval
+
+                while len(self._pending) < self._max_entries:
+                    remaining = deadline - time.monotonic()
+
+                    if remaining <= 0:
+                        break
+
+                    self._condition.wait(remaining)
+
+            self.flush()
+
+    def flush(self):
+        """
+        Write every queued login date in one UPDATE statement.
+
+        On failure the dates are queued again, unless a newer login of the same user was queued in the meantime.
+
+        :return: None
+        """
+        with self._condition:
+            pending, self._pending = self._pending, {}
+
+        if not pending:
+            return
+
+        statement = update(User) \
+            .where(User.id.in_(pending.keys())) \
+            .values(last_login_date=case(pending, value=User.id))
+
+        try:
+            with self._app.app_context():
+                with db.engine.begin() as connection:
+                    connection.execute(statement)
+        except Exception:
+            log.exception('Failed to write {count} last login dates'.format(count=len(pending)))
+
+            with self._condition:
+                for user_id, login_date in pending.items():
+                    self._pending.setdefault(user_id, login_date)
+
+            return
+
+        self.flushes += 1
+        self.written += len(pending)
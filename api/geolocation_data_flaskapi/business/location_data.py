@@ -9,10 +9,275 @@
 @deffield    updated: 2017-10-15
 """
 
+import math
+
+from sqlalchemy import and_, insert, or_, select
+from sqlalchemy.exc import IntegrityError
+
+from api.geolocation_data_flaskapi.business.cache import LRUCache, create_cache
+from api.geolocation_data_flaskapi.business.city_search import city_name_index
+from api.geolocation_data_flaskapi.business.city_spatial import city_spatial_index
+from api.geolocation_data_flaskapi.business.city_stream import encode_city_row, encode_city_rows, select_cities, \
+    select_city, select_city_page
+from api.geolocation_data_flaskapi.business.city_trigrams import city_trigram_index
+from api.geolocation_data_flaskapi.business.geohash import cover_box, encode_geohash
+from api.geolocation_data_flaskapi.business.generations import bump_city_generation, get_city_generation, \
+    init_city_generations
 from database import db
+from database.routing import read_from_primary
 from database.models import City
 
-from database.model_exceptions import LengthError
+from database.model_exceptions import CoordinateError, LengthError
+
+CITY_NAME_MAX_LENGTH = 64
+
+# Names per IN (...) list when matching a bulk request against existing records
+NAME_LOOKUP_CHUNK_SIZE = 500
+
+BULK_STATUS_CREATED = 'created'
+BULK_STATUS_DUPLICATE = 'duplicate'
+BULK_STATUS_INVALID = 'invalid'
+
+# Serialized city records by id, as (subdivision, payload)
+city_cache = LRUCache()
+
+# Serialized city list pages by (subdivision, generation, limit, after), as (payload, next_after)
+city_page_cache = LRUCache()
+
+
+def init_city_cache(config):
+    """
+    Create the city record and city list caches, and the city generations, on the cache backend selected by
+    CACHE_BACKEND and sized from the application config.
+
+    :param config: The application config.
+    :return: None
+    """
+    global city_cache, city_page_cache
+
+    init_city_generations(config)
+    city_cache = create_cache(config, 'city', maxsize=config['CITY_CACHE_SIZE'], ttl=config['CITY_CACHE_TTL'])
+    city_page_cache = create_cache(config, 'city_page',
+                                   maxsize=config['CITY_PAGE_CACHE_SIZE'], ttl=config['CITY_PAGE_CACHE_TTL'])
+
+
+def get_city_record(city_id: int):
+    """
+    Returns a serialized city record, reading through the city record cache. Cache misses are read from the
+    primary, as a replica may not have the write that invalidated the entry yet.
+
+    :param city_id: The city record identifier.
+    :type city_id: int
+    :return: A (subdivision, payload) tuple with the encoded JSON record, else None when the city does not exist.
+    """
+    record = city_cache.get(city_id)
+
+    if record is None:
+        version = city_cache.version
+
+        with read_from_primary():
+            row = db.session.execute(select_city(city_id)).first()
+
+        if row is None:
+            return None
+
+        record = (row.subdivision, encode_city_row(row))
+        city_cache.set(city_id, record, version=version)
+
+    return record
+
+
+def get_city_page(subdivision: str, limit: int, after=None) -> list:
+    """
+    Returns a page of city records in a subdivision ordered by name and id, as rows rather than City entities.
+
+    :param subdivision: The subdivision code (e.g. CA-AB).
+    :type subdivision: str
+    :param limit: The maximum number of city records to return.
+    :type limit: int
+    :param after: The (name, id) of the last city record of the previous page, or None for the first page.
+    :type after: tuple
+    :return: Up to limit + 1 (id, name, subdivision, latitude, longitude) rows; the extra row shows that another page
+        exists.
+    """
+    return db.session.execute(select_city_page(subdivision, limit + 1, after)).all()
+
+
+def get_city_page_payload(subdivision: str, limit: int, after=None) -> tuple:
+    """
+    Returns an encoded page of city records in a subdivision, reading through the city list cache.
+
+    Pages are cached under the generation of the subdivision, which every write to the subdivision advances, so a
+    cached page is never served after a write; with the 'memory' cache backend, only after a write through this
+    worker process. The generation is read before the database so a page loaded while a write commits is filed
+    under the older generation. Cache misses are read from the primary, as a replica may not have the writes of the
+    current generation yet.
+
+    :param subdivision: The upper case subdivision code (e.g. CA-AB).
+    :type subdivision: str
+    :param limit: The maximum number of city records to return.
+    :type limit: int
+    :param after: The (name, id) of the last city record of the previous page, or None for the first page.
+    :type after: tuple
+    :return: A (payload, next_after) tuple with the encoded JSON list and the (name, id) position to continue from,
+        or None for the last page.
+    """
+    key = (subdivision, get_city_generation(subdivision), limit, after)
+    page = city_page_cache.get(key)
+
+    if page is None:
+        with read_from_primary():
+            city_records = get_city_page(subdivision, limit, after)
+
+        next_after = None
+
+        if len(city_records) > limit:
+            city_records = city_records[:limit]
+            next_after = (city_records[-1].name, city_records[-1].id)
+
+        payload = encode_city_rows(city_records)
+        page = (payload, next_after)
+        city_page_cache.set(key, page)
+
+    return page
+
+
+def city_row(city: City) -> tuple:
+    """
+    Returns the row of a city entity, as the city statements select it.
+
+    :param city: The city entity.
+    :type city: City
+    :return: The (id, name, subdivision, latitude, longitude) row.
+    """
+    return city.id, city.name, city.subdivision, city.latitude, city.longitude
+
+
+def get_subdivision(data):
+    """
+    Returns the upper case subdivision code of JSON city data, as the list queries compare it exactly.
+
+    :param data: JSON data of a city object.
+    :return: The subdivision code (e.g. CA-AB), or the value as given when it is not a string.
+    """
+    subdivision = data.get('subdivision')
+
+    return subdivision.upper() if isinstance(subdivision, str) else subdivision
+
+
+def get_coordinates(data) -> tuple:
+    """
+    Returns the validated coordinates of JSON city data.
+
+    :param data: JSON data of a city object.
+    :return: The (latitude, longitude) in degrees, or (None, None) when the city has no coordinates.
+    """
+    latitude = data.get('latitude')
+    longitude = data.get('longitude')
+
+    if latitude is None and longitude is None:
+        return None, None
+
+    if latitude is None or longitude is None:
+        raise CoordinateError('City latitude and longitude must be given together')
+
+    if isinstance(latitude, bool) or isinstance(longitude, bool) or \
+            not isinstance(latitude, (int, float)) or not isinstance(longitude, (int, float)):
+        raise CoordinateError('City latitude and longitude must be numbers')
+
+    if not (math.isfinite(latitude) and -90.0 <= latitude <= 90.0):
+        raise CoordinateError('City latitude must be between -90 and 90 degrees')
+
+    if not (math.isfinite(longitude) and -180.0 <= longitude <= 180.0):
+        raise CoordinateError('City longitude must be between -180 and 180 degrees')
+
+    return float(latitude), float(longitude)
+
+
+def get_geohash(latitude: float, longitude: float):
+    """
+    Returns the geohash stored with city coordinates.
+
+    :param latitude: The latitude in degrees, or None.
+    :type latitude: float
+    :param longitude: The longitude in degrees, or None.
+    :type longitude: float
+    :return: The geohash, or None when the city has no coordinates.
+    """
+    if latitude is None or longitude is None:
+        return None
+
+    return encode_geohash(latitude, longitude)
+
+
+def get_cities_in_box_payload(south: float, west: float, north: float, east: float, limit: int,
+                              max_ranges: int) -> bytes:
+    """
+    Returns the encoded city records inside a box.
+
+    The box is covered with at most max_ranges geohash ranges, read in one query as range scans of the geohash
+    index, and the rows of the ranges are filtered to the box exactly.
+
+    :param south: The southern latitude of the box in degrees.
+    :type south: float
+    :param west: The western longitude of the box in degrees; greater than east when the box crosses the antimeridian.
+    :type west: float
+    :param north: The northern latitude of the box in degrees.
+    :type north: float
+    :param east: The eastern longitude of the box in degrees.
+    :type east: float
+    :param limit: The maximum number of city records.
+    :type limit: int
+    :param max_ranges: The maximum number of geohash ranges.
+    :type max_ranges: int
+    :return: The encoded JSON array of city records.
+    """
+    ranges = []
+
+    for low, high in cover_box(south, west, north, east, max_ranges):
+        if high is None:
+            ranges.append(City.geohash >= low)
+        else:
+            ranges.append(and_(City.geohash >= low, City.geohash < high))
+
+    if west <= east:
+        longitudes = City.longitude.between(west, east)
+    else:
+        longitudes = or_(City.longitude >= west, City.longitude <= east)
+
+    statement = select_cities(or_(*ranges), City.latitude.between(south, north), longitudes).limit(limit)
+
+    return encode_city_rows(db.session.execute(statement).all())
+
+
+def record_city_change(removed=None, added=None):
+    """
+    Advance the generations of the subdivisions a committed write to a city record changed, and apply the write to
+    the city indexes.
+
+    :param removed: The (id, name, subdivision, latitude, longitude) row of the city record before the write, or None
+        when it was created.
+    :type removed: tuple
+    :param added: The (id, name, subdivision, latitude, longitude) row of the city record after the write, or None
+        when it was deleted.
+    :type added: tuple
+    :return: None
+    """
+    changes = {}
+
+    if removed is not None:
+        changes.setdefault(removed[2].upper(), [None, None])[0] = removed
+
+    if added is not None:
+        changes.setdefault(added[2].upper(), [None, None])[1] = added
+
+    generations = dict((subdivision, get_city_generation(subdivision)) for subdivision in changes)
+    bump_city_generation(*changes)
+
+    for subdivision, (removed_city, added_city) in changes.items():
+        city_name_index.apply(subdivision, generations[subdivision], removed=removed_city, added=added_city)
+        city_trigram_index.apply(subdivision, generations[subdivision], removed=removed_city, added=added_city)
+        city_spatial_index.apply(subdivision, generations[subdivision], removed=removed_city, added=added_city)
 
 
 def create_city(data) -> City:
@@ -23,39 +288,216 @@ def create_city(data) -> City:
     :return: City
     """
     name = data.get('name')
-    subdivision = data.get('subdivision')
+    subdivision = get_subdivision(data)
 
     if len(name) < 1:
         raise LengthError('City name must be one or more characters in length')
 
+    latitude, longitude = get_coordinates(data)
+
     city = City(name=name,
-                subdivision=subdivision)
+                subdivision=subdivision,
+                latitude=latitude,
+                longitude=longitude,
+                geohash=get_geohash(latitude, longitude))
 
     db.session.add(city)
     db.session.commit()
 
+    record_city_change(added=city_row(city))
+
     return city
 
 
+def find_city_ids(subdivision: str, names) -> dict:
+    """
+    Returns the identifiers of the named city records in a subdivision.
+
+    :param subdivision: The subdivision code (e.g. CA-AB).
+    :type subdivision: str
+    :param names: The city names.
+    :return: A dictionary of city id by name.
+    """
+    names = list(names)
+    city_ids = {}
+
+    for start in range(0, len(names), NAME_LOOKUP_CHUNK_SIZE):
+        statement = select(City.name, City.id).where(
+            and_(City.subdivision == subdivision,
+                 City.name.in_(names[start:start + NAME_LOOKUP_CHUNK_SIZE])))
+        city_ids.update((name, city_id) for name, city_id in db.session.execute(statement))
+
+    return city_ids
+
+
+def validate_bulk_city(index: int, data, subdivision: str) -> tuple:
+    """
+    Validates one record of a bulk city creation.
+
+    :param index: The position of the record in the request.
+    :type index: int
+    :param data: JSON data for a new city object.
+    :param subdivision: The subdivision code of the request (e.g. CA-AB).
+    :type subdivision: str
+    :return: A (status, row) tuple with the status dictionary of the record and the row to insert, or None for the
+        row when the record is invalid.
+    """
+    status = {'index': index, 'id': None, 'name': None, 'status': BULK_STATUS_INVALID, 'message': None}
+    name = data.get('name') if isinstance(data, dict) else None
+
+    if not isinstance(name, str):
+        status['message'] = 'City name is required'
+        return status, None
+
+    status['name'] = name
+
+    try:
+        latitude, longitude = get_coordinates(data)
+    except CoordinateError as error:
+        status['message'] = str(error)
+        return status, None
+
+    if len(name) < 1 or len(name) > CITY_NAME_MAX_LENGTH:
+        status['message'] = 'City name must be between 1 and {maximum} characters in length'.format(
+            maximum=CITY_NAME_MAX_LENGTH)
+        return status, None
+
+    if data.get('subdivision') is not None and str(data.get('subdivision')).upper() != subdivision.upper():
+        status['message'] = 'City subdivision does not match the request subdivision'
+        return status, None
+
+    return status, {'subdivision': subdivision, 'name': name, 'latitude': latitude, 'longitude': longitude,
+                    'geohash': get_geohash(latitude, longitude)}
+
+
+def insert_city_rows(rows) -> list:
+    """
+    Inserts city rows with one multi-row INSERT and one commit.
+
+    When some of the cities already exist, the INSERT is rolled back and the rows are inserted again by
+    insert_city_rows_each.
+
+    :param rows: The city rows.
+    :return: The names of the cities not inserted because they already exist.
+    """
+    try:
+        db.session.execute(insert(City), rows)
+        db.session.commit()
+    except IntegrityError:
+        # A concurrent writer, or a case-insensitive collation, created some of the names after they were matched
+        db.session.rollback()
+        return insert_city_rows_each(rows)
+
+    return []
+
+
+def insert_city_rows_each(rows) -> list:
+    """
+    Inserts city rows with one savepoint per row and one commit, so the rows of existing cities do not stop the
+    others.
+
+    :param rows: The city rows.
+    :return: The names of the cities not inserted because they already exist.
+    """
+    existing = []
+
+    for row in rows:
+        try:
+            with db.session.begin_nested():
+                db.session.execute(insert(City), row)
+        except IntegrityError:
+            existing.append(row['name'])
+
+    db.session.commit()
+
+    return existing
+
+
+def create_cities(subdivision: str, records) -> list:
+    """
+    Creates many city records in one subdivision in a single transaction.
+
+    The records are validated together, matched against the existing records of the subdivision, and the new ones
+    are inserted with one multi-row INSERT and one commit.
+
+    :param subdivision: The subdivision code (e.g. CA-AB).
+    :type subdivision: str
+    :param records: JSON data for the new city objects.
+    :return: One status dictionary per record, in request order, with index, id, name, status and message.
+    """
+    statuses = []
+    pending = {}
+    rows = {}
+
+    for index, data in enumerate(records):
+        status, row = validate_bulk_city(index, data, subdivision)
+        statuses.append(status)
+
+        if row is None:
+            continue
+
+        if row['name'] in pending:
+            status['status'] = BULK_STATUS_DUPLICATE
+            status['message'] = 'City is repeated in the request'
+        else:
+            pending[row['name']] = status
+            rows[row['name']] = row
+
+    for name, city_id in find_city_ids(subdivision, pending).items():
+        status = pending.pop(name, None)
+
+        if status is not None:
+            status['id'] = city_id
+            status['status'] = BULK_STATUS_DUPLICATE
+            status['message'] = 'City already exists'
+
+    if pending:
+        for name in insert_city_rows([rows[name] for name in pending]):
+            status = pending.pop(name)
+            status['status'] = BULK_STATUS_DUPLICATE
+            status['message'] = 'City already exists'
+
+        for name, city_id in find_city_ids(subdivision, pending).items():
+            status = pending.get(name)
+
+            if status is not None:
+                status['id'] = city_id
+                status['status'] = BULK_STATUS_CREATED
+
+        bump_city_generation(subdivision)
+
+    return statuses
+
+
 def update_city(city_id: int, data) -> City:
     """
     Update a city record in the database.
 
     :param city_id: The city record identifier.
     :type city_id: int
-    :param data: Updated JSON data for an existing City object.
+    :param data: Updated JSON data for an existing City object. The stored coordinates are kept unless it has the
+        latitude or longitude key; null for both clears them.
     :return: City
     """
     city = City.query.filter(City.id == city_id).one()
+    previous = city_row(city)
+
     city.name = data.get('name')
-    city.subdivision = data.get('subdivision')
+    city.subdivision = get_subdivision(data)
 
     if len(city.name) < 1:
         raise LengthError('City name must be one or more characters in length')
 
+    if 'latitude' in data or 'longitude' in data:
+        city.latitude, city.longitude = get_coordinates(data)
+        city.geohash = get_geohash(city.latitude, city.longitude)
+
     db.session.add(city)
     db.session.commit()
 
+    city_cache.delete(city_id)
+    record_city_change(removed=previous, added=city_row(city))
+
     return city
 
 
@@ -68,5 +510,10 @@ def delete_city(city_id: int):
     :return: None
     """
     city = City.query.filter(City.id == city_id).one()
+    previous = city_row(city)
+
     db.session.delete(city)
     db.session.commit()
+
+    city_cache.delete(city_id)
+    record_city_change(removed=previous)
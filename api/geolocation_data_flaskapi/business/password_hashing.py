@@ -0,0 +1,180 @@
+"""
+@author:     Fyzel@users.noreply.github.com
+
+@copyright:  2017 Englesh.org. All rights reserved.
+
+@license:    https://github.com/Fyzel/geolocation-data-flaskapi/blob/master/LICENSE
+
+@contact:    Fyzel@users.noreply.github.com
+@deffield    updated: 2026-10-17
+"""
+
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from threading import BoundedSemaphore, Lock
+
+from passlib.hash import sha512_crypt
+
+log = logging.getLogger(__name__)
+
+
+class PasswordHasherBusy(Exception):
+    """
+    Exception when every password hashing slot stayed taken for the whole queue timeout, or an operation did not
+    finish before its deadline.
+    """
+
+    def __init__(self, message):
+        """
+        Constructor.
+
+        :param message: The error message.
+        :type message: str
+        """
+        self.message = message
+
+
+def hash_password(secret: str, rounds: int) -> str:
+    """
+    Hash a salted password.
+
+    :param secret: The salted password.
+    :type secret: str
+    :param rounds: The number of sha512_crypt rounds.
+    :type rounds: int
+    :return: The password hash.
+    """
+    return sha512_crypt.using(rounds=rounds).hash(secret)
+
+
+def verify_password(secret: str, password_hash: str) -> bool:
+    """
+    Verify a salted password against a password hash.
+
+    :param secret: The salted password.
+    :type secret: str
+    :param password_hash: The stored password hash.
+    :type password_hash: str
+    :return: True if the password matches, else False.
+    """
+    return sha512_crypt.verify(secret, password_hash)
+
+
+class PasswordHasher(object):
+    """
+    Hashes and verifies passwords in a dedicated, size-limited process pool, so the CPU time of a burst of logins is
+    taken off the request threads.
+
+    At most workers + queue_size operations are admitted at once. A caller waits up to queue_timeout seconds for
+    one of these slots, and up to timeout seconds in all for the result, and gets PasswordHasherBusy otherwise; an
+    operation given up on keeps its slot until its worker finishes it. With zero workers operations run on the calling
+    thread. The pool is started on first use in each process, so workers forked after the application is loaded
+    get their own pool.
+    """
+
+    def __init__(self, rounds: int = sha512_crypt.default_rounds, workers: int = 0, queue_size: int = 0,
+                 queue_timeout: float = 1.0, timeout: float = 5.0):
+        """
+        PasswordHasher constructor.
+
+        :param rounds: The number of sha512_crypt rounds of new password hashes.
+        :type rounds: int
+        :param workers: The number of worker processes, or 0 to hash on the calling thread.
+        :type workers: int
+        :param queue_size: The number of operations that may wait for a worker process.
+        :type queue_size: int
+        :param queue_timeout: The number of seconds to wait for a slot.
+        :type queue_timeout: float
+        :param timeout: The number of seconds to wait for an operation, waiting for a slot included.
+        :type timeout: float
+        """
+        self._rounds = rounds
+        self._workers = workers
+        self._queue_timeout = queue_timeout
+        self._timeout = timeout
+        self._slots = BoundedSemaphore(workers + queue_size)
+        self._lock = Lock()
+        self._executor = None
+        self._pid = None
+
+    @property
+    def rounds(self) -> int:
+        """
+        The number of sha512_crypt rounds of new password hashes.
+        """
+        return self._rounds
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ProcessPoolExecutor(max_workers=self._workers,
+                                                     mp_context=multiprocessing.get_context('spawn'))
+                self._pid = os.getpid()
+
+            return self._executor
+
+    def _run(self, function, *args):
+        if self._workers < 1:
+            return function(*args)
+
+        deadline = time.monotonic() + self._timeout
+
+        if not self._slots.acquire(timeout=min(self._queue_timeout, self._timeout)):
+            raise PasswordHasherBusy(message='Every password hashing slot is taken.')
+
+        try:
+            future = self._get_executor().submit(function, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+
+        future.add_done_callback(lambda done: self._slots.release())
+
+        try:
+            return future.result(timeout=max(deadline - time.monotonic(), 0.0))
+        except FutureTimeoutError:
+            future.cancel()
+            raise PasswordHasherBusy(message='Password hashing timed out.')
+        except BrokenProcessPool:
+            log.exception('Password hashing pool broke, restarting it on next use')
+
+            with self._lock:
+                self._executor = None
+
+            raise PasswordHasherBusy(message='The password hashing pool is restarting.')
+
+    def hash(self, secret: str) -> str:
+        """
+        Hash a salted password with the configured rounds.
+
+        :param secret: The salted password.
+        :type secret: str
+        :return: The password hash.
+        """
+        return self._run(hash_password, secret, self._rounds)
+
+    def verify(self, secret: str, password_hash: str) -> bool:
+        """
+        Verify a salted password against a password hash.
+
+        :param secret: The salted password.
+        :type secret: str
+        :param password_hash: The stored password hash.
+        :type password_hash: str
+        :return: True if the password matches, else False.
+        """
+        return self._run(verify_password, secret, password_hash)
+
+    def needs_update(self, password_hash: str) -> bool:
+        """
+        Checks if a password hash was made with other parameters than the configured ones.
+
+        :param password_hash: The stored password hash.
+        :type password_hash: str
+        :return: True if the password should be hashed again, else False.
+        """
+        return sha512_crypt.using(rounds=self._rounds).needs_update(password_hash)
@@ -0,0 +1,293 @@
+"""
+@author:     Fyzel@users.noreply.github.com
+
+@copyright:  2017 Englesh.org. All rights reserved.
+
+@license:    https://github.com/Fyzel/geolocation-data-flaskapi/blob/master/LICENSE
+
+@contact:    Fyzel@users.noreply.github.com
+@deffield    updated: 2026-10-17
+"""
+
+import json
+import logging
+from functools import lru_cache
+from importlib.metadata import version
+from types import MappingProxyType
+
+from flask_restplus import marshal
+from pycountry import countries, subdivisions
+
+from api.geolocation_data_flaskapi.serializers import country, subdivision
+
+log = logging.getLogger(__name__)
+
+
+def encode_json(data) -> bytes:
+    """
+    Encode marshalled data as the JSON bytes sent to the client.
+
+    :param data: The marshalled data.
+    :return: The UTF-8 encoded JSON document.
+    """
+    return json.dumps(data, separators=(',', ':')).encode('utf-8')
+
+
+class CountryIndex(object):
+    """
+    An immutable index of pre-serialized ISO 3166-1 country records.
+
+    The pycountry data only changes when the package is upgraded, so every record is marshalled and encoded once
+    and the endpoints answer with a single dictionary lookup.
+    """
+
+    def __init__(self, records):
+        """
+        CountryIndex constructor.
+
+        :param records: The pycountry country records to index.
+        """
+        marshalled = [marshal(record, country) for record in records]
+
+        items = {}
+        for data in marshalled:
+            payload = encode_json(data)
+            for key in (data['alpha_2'], data['alpha_3'], data['numeric']):
+                items[key.upper()] = payload
+
+        self._collection = encode_json(marshalled)
+        self._items = MappingProxyType(items)
+        self._count = len(marshalled)
+
+    @classmethod
+    def build(cls):
+        """
+        Build the index from the installed pycountry database.
+
+        :return: CountryIndex
+        """
+        index = cls(list(countries))
+        log.info('Built country index with {count} records'.format(count=index.count))
+        return index
+
+    @property
+    def collection(self) -> bytes:
+        """
+        The encoded list of every country record.
+        """
+        return self._collection
+
+    @property
+    def count(self) -> int:
+        """
+        The number of country records in the index.
+        """
+        return self._count
+
+    def get(self, code: str):
+        """
+        Returns the encoded country record.
+
+        :param code: The alpha-2, alpha-3 or numeric code of the country.
+        :type code: str
+        :return: The encoded country record, else None.
+        """
+        return self._items.get(code.upper())
+
+
+class SubdivisionIndex(object):
+    """
+    An immutable index of pre-serialized ISO 3166-2 subdivision records.
+
+    Records are indexed by the full subdivision code (e.g. CA-AB) and listed by the country alpha-2 code. Every
+    country has an entry, so a missing country is answered from the index as well.
+    """
+
+    def __init__(self, country_codes, records):
+        """
+        SubdivisionIndex constructor.
+
+        :param country_codes: The alpha-2 codes of every country.
+        :param records: The pycountry subdivision records to index.
+        """
+        by_country = dict((country_code.upper(), []) for country_code in country_codes)
+        items = {}
+
+        for record in records:
+            data = marshal(record, subdivision)
+            by_country.setdefault(data['country_code'].upper(), []).append(data)
+            items[data['code'].upper()] = encode_json(data)
+
+        self._collections = MappingProxyType(
+            dict((country_code, encode_json(data)) for country_code, data in by_country.items()))
+        self._codes_by_country = MappingProxyType(
+            dict((country_code, tuple(item['code'] for item in data)) for country_code, data in by_country.items()))
+        self._items = MappingProxyType(items)
+        self._codes = frozenset(items)
+
+    @classmethod
+    def build(cls):
+        """
+        Build the index from the installed pycountry database.
+
+        :return: SubdivisionIndex
+        """
+        index = cls([record.alpha_2 for record in countries], list(subdivisions))
+        log.info('Built subdivision index with {count} records'.format(count=index.count))
+        return index
+
+    @property
+    def count(self) -> int:
+        """
+        The number of subdivision records in the index.
+        """
+        return len(self._items)
+
+    @property
+    def codes(self) -> frozenset:
+        """
+        The full code of every subdivision record (e.g. CA-AB).
+        """
+        return self._codes
+
+    def get_codes(self, country_alpha2: str):
+        """
+        Returns the full codes of a country's subdivision records.
+
+        :param country_alpha2: The unique two character identifier of the country record.
+        :type country_alpha2: str
+        :return: A tuple of subdivision codes, else None when the country does not exist.
+        """
+        return self._codes_by_country.get(country_alpha2.upper())
+
+    def get_collection(self, country_alpha2: str):
+        """
+        Returns the encoded list of subdivision records for a country.
+
+        :param country_alpha2: The unique two character identifier of the country record.
+        :type country_alpha2: str
+        :return: The encoded list of subdivision records, else None when the country does not exist.
+        """
+        return self._collections.get(country_alpha2.upper())
+
+    def get(self, country_alpha2: str, subdivision_code: str):
+        """
+        Returns the encoded subdivision record.
+
+        :param country_alpha2: The unique two character identifier of the country record.
+        :type country_alpha2: str
+        :param subdivision_code: The subdivision code without the country prefix (e.g. AB).
+        :type subdivision_code: str
+        :return: The encoded subdivision record, else None.
+        """
+        code = '{country_code}-{subdivision_code}'.format(country_code=country_alpha2,
+                                                          subdivision_code=subdivision_code)
+        return self._items.get(code.upper())
+
+
+_country_index = None
+_subdivision_index = None
+
+
+def get_country_index() -> CountryIndex:
+    """
+    Returns the country index, building it on first use.
+
+    :return: CountryIndex
+    """
+    global _country_index
+
+    if _country_index is None:
+        _country_index = CountryIndex.build()
+
+    return _country_index
+
+
+def get_subdivision_index() -> SubdivisionIndex:
+    """
+    Returns the subdivision index, building it on first use.
+
+    :return: SubdivisionIndex
+    """
+    global _subdivision_index
+
+    if _subdivision_index is None:
+        _subdivision_index = SubdivisionIndex.build()
+
+    return _subdivision_index
+
+
+@lru_cache(maxsize=4096)
+def is_valid_subdivision(country_alpha2: str, subdivision_code: str) -> bool:
+    """
+    Checks if the country and subdivision codes name an existing subdivision.
+
+    Results are cached, including invalid codes, so repeated requests for junk codes cost a single cache lookup.
+
+    :param country_alpha2: The unique two character identifier of the country record.
+    :type country_alpha2: str
+    :param subdivision_code: The subdivision code without the country prefix (e.g. AB).
+    :type subdivision_code: str
+    :return: True if the subdivision exists, else False.
+    """
+    code = '{country_code}-{subdivision_code}'.format(country_code=country_alpha2,
+                                                      subdivision_code=subdivision_code)
+    return code.upper() in get_subdivision_index().codes
+
+
+@lru_cache(maxsize=1)
+def get_reference_data_etag() -> str:
+    """
+    Returns the entity tag shared by every country and subdivision record.
+
+    The records only change when pycountry is upgraded, so the tag is derived from the installed pycountry version.
+
+    :return: The unquoted entity tag.
+    """
+    return 'pycountry-{version}'.format(version=version('pycountry'))
+
+
+def get_country_etag(country_alpha2: str = None):
+    """
+    Returns the entity tag of the country list or of a country record.
+
+    :param country_alpha2: The country code, or None for the list.
+    :type country_alpha2: str
+    :return: The unquoted entity tag, else None when the country does not exist.
+    """
+    if country_alpha2 is not None and get_country_index().get(country_alpha2) is None:
+        return None
+
+    return get_reference_data_etag()
+
+
+def get_subdivision_etag(country_alpha2: str, subdivision_code: str = None):
+    """
+    Returns the entity tag of a country's subdivision list or of a subdivision record.
+
+    :param country_alpha2: The unique two character identifier of the country record.
+    :type country_alpha2: str
+    :param subdivision_code: The subdivision code without the country prefix, or None for the list.
+    :type subdivision_code: str
+    :return: The unquoted entity tag, else None when the record does not exist.
+    """
+    index = get_subdivision_index()
+
+    if subdivision_code is None:
+        if index.get_collection(country_alpha2) is None:
+            return None
+    elif index.get(country_alpha2, subdivision_code) is None:
+        return None
+
+    return get_reference_data_etag()
+
+
+def init_reference_data():
+    """
+    Build the reference data indexes so the first request does not pay for it.
+
+    :return: None
+    """
+    get_country_index()
+    get_subdivision_index()
+    get_reference_data_etag()
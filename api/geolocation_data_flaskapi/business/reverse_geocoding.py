@@ -0,0 +1,93 @@
+"""
+@author:     Fyzel@users.noreply.github.com
+
+@copyright:  2017 Englesh.org. All rights reserved.
+
+@license:    https://github.com/Fyzel/geolocation-data-flaskapi/blob/master/LICENSE
+
+@contact:    Fyzel@users.noreply.github.com
+@deffield    updated: 2026-10-17
+"""
+
+import json
+
+import numpy as np
+
+from api.geolocation_data_flaskapi.business.city_spatial import city_spatial_index
+from api.geolocation_data_flaskapi.business.city_stream import CITY_COLUMNS
+from api.geolocation_data_flaskapi.business.reference_data import get_country_index, get_subdivision_index
+from database.model_exceptions import CoordinateError
+
+
+def get_point_arrays(points) -> tuple:
+    """
+    Returns the validated coordinates of JSON point objects as arrays.
+
+    :param points: The list of {"latitude": ..., "longitude": ...} objects.
+    :type points: list
+    :return: The latitudes and longitudes in degrees, as float64 arrays.
+    """
+    for position, point in enumerate(points):
+        if not isinstance(point, dict):
+            raise CoordinateError('Point {position} must be an object'.format(position=position))
+
+        for key in ('latitude', 'longitude'):
+            value = point.get(key)
+
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                raise CoordinateError('Point {position} {key} must be a number'.format(position=position, key=key))
+
+    latitudes = np.array([point['latitude'] for point in points], dtype=np.float64)
+    longitudes = np.array([point['longitude'] for point in points], dtype=np.float64)
+
+    # NaN fails both comparisons, so it is out of range too
+    invalid = np.flatnonzero(~((latitudes >= -90.0) & (latitudes <= 90.0)))
+    if invalid.size:
+        raise CoordinateError('Point {position} latitude must be between -90 and 90 degrees'.format(
+            position=int(invalid[0])))
+
+    invalid = np.flatnonzero(~((longitudes >= -180.0) & (longitudes <= 180.0)))
+    if invalid.size:
+        raise CoordinateError('Point {position} longitude must be between -180 and 180 degrees'.format(
+            position=int(invalid[0])))
+
+    return latitudes, longitudes
+
+
+def reverse_geocode(latitudes, longitudes) -> bytes:
+    """
+    Returns the nearest city of each point with its subdivision and country record, as one JSON array.
+
+    Every point is looked up in one query of the city spatial index. Each item of the array is an object with the
+    city, including its distance from the point in kilometres, and the encoded subdivision and country records, or
+    null when no city has coordinates.
+
+    :param latitudes: The latitudes of the points in degrees.
+    :param longitudes: The longitudes of the points in degrees.
+    :return: The encoded JSON array, in point order.
+    """
+    subdivision_index = get_subdivision_index()
+    country_index = get_country_index()
+    references = {}
+    items = []
+
+    for rows in city_spatial_index.nearest(latitudes, longitudes, 1):
+        if not rows:
+            items.append(b'null')
+            continue
+
+        row = rows[0]
+        code = row[2].upper()
+        reference = references.get(code)
+
+        if reference is None:
+            reference = references[code] = b''.join((
+                b',"subdivision":', subdivision_index.get(code[:2], code[3:]) or b'null',
+                b',"country":', country_index.get(code[:2]) or b'null',
+                b'}'))
+
+        items.append(b'{"city":' +
+                     json.dumps(dict(zip(CITY_COLUMNS + ('distance',), row)), separators=(',', ':')).encode('utf-8') +
+                     reference)
+
+    return b'[' + b','.join(items) + b']'
@@ -9,16 +9,34 @@
 @deffield    updated: 2017-10-15
 """
 
+import time
 import uuid
 from datetime import datetime
 
+from flask import current_app
 from flask_jwt import JWTError
-from passlib.hash import sha512_crypt
 from sqlalchemy import and_
 
+from api.geolocation_data_flaskapi.business.cache import LRUCache, LatencyStats, create_cache
+from api.geolocation_data_flaskapi.business.last_login import LastLoginWriter
+from api.geolocation_data_flaskapi.business.password_hashing import PasswordHasher, PasswordHasherBusy
 from database import db
+from database.routing import read_from_primary
 from database.models import User
 
+# Enabled users by id, as (id, username, enabled, created_date, last_login_date)
+identity_cache = LRUCache()
+
+# Durations of identity lookups answered from the cache and from the database
+identity_cache_latency = LatencyStats()
+identity_database_latency = LatencyStats()
+
+# Hashes and verifies passwords off the request threads
+password_hasher = PasswordHasher()
+
+# Writes last login dates behind the logins, or None to write them during the login
+last_login_writer = None
+
 
 class PasswordException(Exception):
     """
@@ -35,6 +53,74 @@ class PasswordException(Exception):
         self.message = message
 
 
+def init_identity_cache(config):
+    """
+    Create the identity cache on the cache backend selected by CACHE_BACKEND and sized from the application config.
+
+    :param config: The application config.
+    :return: None
+    """
+    global identity_cache
+    identity_cache = create_cache(config, 'identity',
+                                  maxsize=config['IDENTITY_CACHE_SIZE'], ttl=config['IDENTITY_CACHE_TTL'])
+
+
+def init_password_hasher(config):
+    """
+    Create the password hasher from the application config.
+
+    :param config: The application config.
+    :return: None
+    """
+    global password_hasher
+    password_hasher = PasswordHasher(rounds=config['PASSWORD_HASH_ROUNDS'],
+                                     workers=config['PASSWORD_HASH_WORKERS'],
+                                     queue_size=config['PASSWORD_HASH_QUEUE_SIZE'],
+                                     queue_timeout=config['PASSWORD_HASH_QUEUE_TIMEOUT'],
+                                     timeout=config['PASSWORD_HASH_TIMEOUT'])
+
+
+def init_last_login_writer(app):
+    """
+    Write the last login dates of the application's users from a background thread.
+
+    :param app: The Flask application.
+    :return: None
+    """
+    global last_login_writer
+    last_login_writer = LastLoginWriter(app,
+                                        interval=app.config['LAST_LOGIN_FLUSH_INTERVAL'],
+                                        max_entries=app.config['LAST_LOGIN_FLUSH_SIZE'])
+
+
+def evict_identity(user_id: int):
+    """
+    Remove a user from the identity cache so the next request with their token reads the user record again.
+
+    :param user_id: The user's database id.
+    :type user_id: int
+    :return: None
+    """
+    identity_cache.delete(user_id)
+
+
+def get_identity_stats() -> dict:
+    """
+    Returns the identity cache counters and the lookup latencies of this process.
+
+    :return: A dictionary of cache, hit_rate, cache_latency and database_latency.
+    """
+    cache_stats = identity_cache.stats()
+    lookups = cache_stats['hits'] + cache_stats['misses']
+
+    return {
+        'cache': cache_stats,
+        'hit_rate': cache_stats['hits'] / lookups if lookups else 0.0,
+        'cache_latency': identity_cache_latency.stats(),
+        'database_latency': identity_database_latency.stats(),
+    }
+
+
 def salt_password(password, salt):
     return '%s%s' % (password, salt)
 
@@ -43,6 +129,10 @@ def authenticate(username: str, password: str):
     """
     Authenticate a user using their username and a supplied password.
 
+    A password hash made with other parameters than the configured ones is replaced on a successful login. The last
+    login date is queued for the last login writer when there is one. Neither is written when the database is
+    opened read-only (SQLITE_IMMUTABLE).
+
     :param username: The user's username.
     :type username: str
     :param password: The user's candidate password provided at login.
@@ -51,18 +141,43 @@ def authenticate(username: str, password: str):
     """
     try:
         user = User.query.filter(and_(User.username == username, User.enabled == 1)).one()
+        secret = salt_password(password, user.salt)
+
+        if user.enabled and password_hasher.verify(secret, user.password):
+            if not current_app.config.get('SQLITE_IMMUTABLE'):
+                record_login(user=user, secret=secret)
 
-        if user.enabled and sha512_crypt.verify(
-                salt_password(password, user.salt),
-                user.password):
-            update_last_login_date(username=username)
             return user
         else:
             return None
+    except PasswordHasherBusy:
+        raise JWTError(error='Service unavailable', description='Too many concurrent logins, retry later',
+                       status_code=503, headers={'Retry-After': '1'})
     except Exception as exception:
         raise JWTError(error='Invalid credential', description='Stop hacking', status_code=401)
 
 
+def record_login(user: User, secret: str):
+    """
+    Record a successful login: replace an outdated password hash and update the last login date.
+
+    :param user: The authenticated user.
+    :type user: User
+    :param secret: The user's salted password.
+    :type secret: str
+    :return: None
+    """
+    if password_hasher.needs_update(user.password):
+        user.password = password_hasher.hash(secret)
+        db.session.add(user)
+        db.session.commit()
+
+    if last_login_writer is None:
+        update_last_login_date(username=user.username)
+    else:
+        last_login_writer.record(user.id)
+
+
 def username_is_available(username: str) -> bool:
     """
     Checks if the username is available.
@@ -91,7 +206,7 @@ def create_user(data):
 
     if username_is_available(username):
         salt = str(uuid.uuid4())
-        encrypted_password = sha512_crypt.hash(salt_password(password, salt))
+        encrypted_password = password_hasher.hash(salt_password(password, salt))
 
         user = User(username=username,
                     password=encrypted_password,
@@ -112,9 +227,12 @@ def delete_user(username: str):
     :return: None
     """
     user = User.query.filter(User.username == username).one()
+    user_id = user.id
     db.session.delete(user)
     db.session.commit()
 
+    evict_identity(user_id)
+
 
 def disable_user(username: str) -> User:
     """
@@ -129,6 +247,8 @@ def disable_user(username: str) -> User:
     db.session.add(user)
     db.session.commit()
 
+    evict_identity(user.id)
+
     return user
 
 
@@ -145,6 +265,8 @@ def enable_user(username: str) -> User:
     db.session.add(user)
     db.session.commit()
 
+    evict_identity(user.id)
+
     return user
 
 
@@ -181,17 +303,51 @@ def update_password(username: str, password: str, new_password: str, salt: str)
     """
     user = User.query.filter(User.username == username).one()
 
-    if sha512_crypt.verify(salt_password(password, salt), user.password):
-        user.password = sha512_crypt.hash(salt_password(new_password, salt))
+    if password_hasher.verify(salt_password(password, salt), user.password):
+        user.password = password_hasher.hash(salt_password(new_password, salt))
         db.session.add(user)
         db.session.commit()
 
+        evict_identity(user.id)
+
         return user
     else:
         raise PasswordException(message='Current password is not correct.')
 
 
 def identity(payload):
+    """
+    Resolve the user of a JSON Web Token, reading through the identity cache.
+
+    Only enabled users are cached, and disabling, enabling or deleting a user or changing their password evicts
+    them, so revoking a user takes effect on their next request. Users are read from the primary, never from a
+    replica that may not have the revocation yet. The cached user is detached from the session and carries no
+    password hash.
+
+    :param payload: The decoded token.
+    :type payload: dict
+    :return: A User object on success, else None when the user does not exist or is disabled.
+    """
+    started = time.perf_counter()
     user_id = payload['identity']
-    user = User.query.filter(User.id == user_id).one()
+    record = identity_cache.get(user_id)
+
+    if record is not None:
+        identity_cache_latency.record(time.perf_counter() - started)
+        return User(id=record[0], username=record[1], password=None, salt=None, enabled=record[2],
+                    created_date=record[3], last_login_date=record[4])
+
+    version = identity_cache.version
+
+    with read_from_primary():
+        user = User.query.filter(User.id == user_id).one_or_none()
+
+    if user is not None and user.enabled:
+        identity_cache.set(user_id,
+                           (user.id, user.username, user.enabled, user.created_date, user.last_login_date),
+                           version=version)
+    else:
+        user = None
+
+    identity_database_latency.record(time.perf_counter() - started)
     return user
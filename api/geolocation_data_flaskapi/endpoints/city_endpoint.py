@@ -0,0 +1,158 @@
+"""
+@author:     Fyzel@users.noreply.github.com
+
+@copyright:  2017 Englesh.org. All rights reserved.
+
+@license:    https://github.com/Fyzel/geolocation-data-flaskapi/blob/master/LICENSE
+
+@contact:    Fyzel@users.noreply.github.com
+@deffield    updated: 2026-10-17
+"""
+
+import logging
+
+from flask import Response, current_app, request, stream_with_context
+from flask_restplus import Resource, abort
+
+from api.restplus import api
+from api.geolocation_data_flaskapi.business.city_distances import MATRIX_MIMETYPE, encode_distance_matrix, \
+    encode_distance_matrix_json, get_city_coordinates
+from api.geolocation_data_flaskapi.business.generations import ALL_CITIES, get_city_etag
+from api.geolocation_data_flaskapi.business.location_data import get_cities_in_box_payload
+from api.geolocation_data_flaskapi.endpoints.location_endpoint import fuzzy_search_cities
+from api.geolocation_data_flaskapi.parsers import city_box_arguments, city_fuzzy_search_arguments
+from api.geolocation_data_flaskapi.responses import conditional, json_response
+from api.geolocation_data_flaskapi.serializers import city, city_distance_matrix_request
+
+log = logging.getLogger(__name__)
+
+ns = api.namespace('city',
+                   description='Operations related to the cities of every country')
+
+
+def all_city_etag(**kwargs) -> str:
+    """
+    Returns the entity tag of the city records of every country.
+    :return: The unquoted entity tag.
+    """
+    return get_city_etag(ALL_CITIES)
+
+
+def get_city_ids(data: dict, key: str) -> list:
+    """
+    Returns a validated list of city ids of a JSON request.
+
+    :param data: The JSON request object.
+    :type data: dict
+    :param key: The key of the list.
+    :type key: str
+    :return: The list of city ids.
+    """
+    city_ids = data.get(key)
+
+    if not isinstance(city_ids, list) or len(city_ids) == 0 or \
+            any(isinstance(city_id, bool) or not isinstance(city_id, int) for city_id in city_ids):
+        abort(400, 'Bad request: {key} must be a non-empty list of city ids'.format(key=key))
+
+    if len(city_ids) > current_app.config['CITY_DISTANCE_MAX_IDS']:
+        abort(400, 'Bad request: At most {maximum} {key} are accepted per request'.format(
+            maximum=current_app.config['CITY_DISTANCE_MAX_IDS'], key=key))
+
+    return city_ids
+
+
+@ns.route('/fuzzy')
+class CityFuzzySearch(Resource):
+    @api.expect(city_fuzzy_search_arguments)
+    @api.response(200, 'Success', [city])
+    @api.response(304, 'Not modified.')
+    @conditional(all_city_etag)
+    def get(self):
+        """
+        Returns the city records of every country whose name is most similar to a possibly misspelt name.
+
+        Names are compared by their trigrams, so "Edmonten" finds "Edmonton" and "Montreal" finds "Montréal".
+        :return:
+        """
+        return fuzzy_search_cities()
+
+
+@ns.route('/box')
+class CityBox(Resource):
+    @api.expect(city_box_arguments)
+    @api.response(200, 'Success', [city])
+    @api.response(304, 'Not modified.')
+    @api.response(400, 'Bad request: the box is invalid')
+    @conditional(all_city_etag)
+    def get(self):
+        """
+        Returns the city records of every country inside a latitude and longitude box.
+
+        * A box whose west longitude is greater than its east longitude crosses the antimeridian.
+        * Only cities with coordinates are returned, in no particular order, up to the limit.
+        :return:
+        """
+        args = city_box_arguments.parse_args(request)
+
+        if args.get('south') > args.get('north'):
+            abort(400, 'Bad request: The south latitude must not be greater than the north latitude')
+
+        limit = min(args.get('limit') or current_app.config['CITY_BOX_LIMIT_DEFAULT'],
+                    current_app.config['CITY_BOX_LIMIT_MAX'])
+
+        return json_response(get_cities_in_box_payload(args.get('south'), args.get('west'), args.get('north'),
+                                                       args.get('east'), limit,
+                                                       current_app.config['CITY_BOX_MAX_RANGES']))
+
+
+@ns.route('/distances')
+class CityDistanceMatrix(Resource):
+    @api.response(200, 'Success')
+    @api.response(400, 'Bad request: the city ids are invalid')
+    @api.response(404, 'Cities not found.')
+    @api.expect(city_distance_matrix_request, validate=False)
+    def post(self):
+        """
+        Returns the great-circle distances in kilometres between every origin and destination city.
+
+        * Send the origin and, optionally, the destination city ids in the request body.
+
+        ```
+        {"origins": [1, 2, 3], "destinations": [4, 5]}
+        ```
+
+        * The matrix has a row per origin and a column per destination, in request order.
+        * With Accept: application/octet-stream the matrix is sent as little-endian float32 values in row-major
+          order, else as a JSON object with the origins, destinations and distances.
+        :return:
+        """
+        data = request.json
+
+        if not isinstance(data, dict):
+            abort(400, 'Bad request: An object with the origin city ids is required')
+
+        origin_ids = get_city_ids(data, 'origins')
+        destination_ids = get_city_ids(data, 'destinations') if data.get('destinations') is not None else origin_ids
+
+        origin_latitudes, origin_longitudes, missing = get_city_coordinates(origin_ids)
+
+        if destination_ids is origin_ids:
+            destination_latitudes, destination_longitudes = origin_latitudes, origin_longitudes
+        else:
+            destination_latitudes, destination_longitudes, missing_destinations = get_city_coordinates(destination_ids)
+            missing = list(dict.fromkeys(missing + missing_destinations))
+
+        if missing:
+            abort(404, 'Cities not found or without coordinates: {city_ids}'.format(
+                city_ids=', '.join(str(city_id) for city_id in missing[:10])))
+
+        origins = (origin_latitudes, origin_longitudes)
+        destinations = (destination_latitudes, destination_longitudes)
+
+        if request.accept_mimetypes.best_match(['application/json', MATRIX_MIMETYPE]) == MATRIX_MIMETYPE:
+            return Response(stream_with_context(encode_distance_matrix(origins, destinations)),
+                            mimetype=MATRIX_MIMETYPE)
+
+        return Response(stream_with_context(encode_distance_matrix_json(origin_ids, destination_ids, origins,
+                                                                        destinations)),
+                        mimetype='application/json')
@@ -0,0 +1,53 @@
+"""
+@author:     Fyzel@users.noreply.github.com
+
+@copyright:  2017 Englesh.org. All rights reserved.
+
+@license:    https://github.com/Fyzel/geolocation-data-flaskapi/blob/master/LICENSE
+
+@contact:    Fyzel@users.noreply.github.com
+@deffield    updated: 2026-10-17
+"""
+
+import logging
+
+from flask import Response, current_app, request, stream_with_context
+from flask_jwt import jwt_required
+from flask_restplus import Resource, abort
+
+from api.restplus import api
+from api.geolocation_data_flaskapi.business.city_stream import EXPORT_FORMATS, iter_city_rows, select_city_export
+from api.geolocation_data_flaskapi.business.reference_data import get_subdivision_index
+from api.geolocation_data_flaskapi.parsers import city_export_arguments
+
+log = logging.getLogger(__name__)
+
+ns = api.namespace('export',
+                   description='Operations related to bulk exports')
+
+
+@ns.route('/city/')
+@api.response(404, 'Country not found.')
+class CityExport(Resource):
+    @api.expect(city_export_arguments)
+    @api.response(200, 'Success')
+    @jwt_required()
+    def get(self):
+        """
+        Streams every city record, or those of one country, in primary key order as NDJSON or CSV.
+        :return:
+        """
+        args = city_export_arguments.parse_args(request)
+        subdivision_codes = None
+
+        if args.get('country'):
+            subdivision_codes = get_subdivision_index().get_codes(args.get('country'))
+
+            if subdivision_codes is None:
+                abort(404, 'Country not found')
+
+        encode, mimetype = EXPORT_FORMATS[args.get('format')]
+        batch_size = current_app.config['CITY_STREAM_BATCH_SIZE']
+        rows = iter_city_rows(select_city_export(subdivision_codes), batch_size)
+
+        return Response(stream_with_context(encode(rows, batch_size)), mimetype=mimetype)
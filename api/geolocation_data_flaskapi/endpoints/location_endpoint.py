@@ -11,18 +11,29 @@
 
 import logging
 
-from flask import request
+from flask import Response, current_app, request, stream_with_context, url_for
 from flask_jwt import jwt_required
 from flask_restplus import Resource, abort
 from sqlalchemy import and_
 from sqlalchemy.exc import IntegrityError
 
 from api.restplus import api
-from api.geolocation_data_flaskapi.business.location_data import create_city, delete_city, update_city
-from api.geolocation_data_flaskapi.serializers import country, subdivision, city
-from database.model_exceptions import LengthError
+from api.geolocation_data_flaskapi.business.city_search import city_name_index
+from api.geolocation_data_flaskapi.business.city_stream import NDJSON_MIMETYPE, encode_city_rows, encode_json_array, \
+    encode_ndjson, iter_city_rows, select_cities
+from api.geolocation_data_flaskapi.business.city_trigrams import city_trigram_index
+from api.geolocation_data_flaskapi.business.generations import get_city_etag
+from api.geolocation_data_flaskapi.business.location_data import create_cities, create_city, delete_city, \
+    get_city_page_payload, get_city_record, update_city
+from api.geolocation_data_flaskapi.business.reference_data import get_country_etag, get_country_index, \
+    get_subdivision_etag, get_subdivision_index
+from api.geolocation_data_flaskapi.parsers import city_fuzzy_search_arguments, city_pagination_arguments, \
+    city_search_arguments, decode_city_cursor, encode_city_cursor
+from api.geolocation_data_flaskapi.responses import conditional, json_response
+from api.geolocation_data_flaskapi.serializers import country, subdivision, city, city_bulk_item, city_bulk_status
+from api.geolocation_data_flaskapi.validators import subdivision_required
+from database.model_exceptions import CoordinateError, LengthError
 from database.models import City
-from pycountry import countries, subdivisions
 
 log = logging.getLogger(__name__)
 
@@ -30,38 +41,132 @@ ns = api.namespace('country',
                    description='Operations related to locations')
 
 
+def city_etag(country_alpha2: str, subdivision_code: str, **kwargs) -> str:
+    """
+    Returns the entity tag of the city records in the subdivision named by the URL parameters.
+    :param country_alpha2: The unique two character identifier of the country record.
+    :type country_alpha2: str
+    :param subdivision_code: The unique two character identifier of the subdivision record.
+    :type subdivision_code: str
+    :return: The unquoted entity tag.
+    """
+    return get_city_etag('{country_code}-{subdivision_code}'.format(country_code=country_alpha2,
+                                                                    subdivision_code=subdivision_code))
+
+
+def country_city_etag(country_alpha2: str, **kwargs):
+    """
+    Returns the entity tag of the city records in the country named by the URL parameters.
+    :param country_alpha2: The unique two character identifier of the country record.
+    :type country_alpha2: str
+    :return: The unquoted entity tag, else None when the country does not exist.
+    """
+    if get_subdivision_index().get_codes(country_alpha2) is None:
+        return None
+
+    return get_city_etag(country_alpha2)
+
+
+def accepts_ndjson() -> bool:
+    """
+    Checks if the client prefers newline delimited JSON over a JSON array.
+    :return: True if application/x-ndjson is the best match of the Accept header, else False.
+    """
+    return request.accept_mimetypes.best_match(['application/json', NDJSON_MIMETYPE]) == NDJSON_MIMETYPE
+
+
+def stream_cities(statement) -> Response:
+    """
+    Stream the city records selected by a statement as a chunked response.
+
+    The records are encoded as newline delimited JSON when the client accepts application/x-ndjson, else as one
+    JSON array.
+    :param statement: The select statement.
+    :return: Response
+    """
+    batch_size = current_app.config['CITY_STREAM_BATCH_SIZE']
+    rows = iter_city_rows(statement, batch_size)
+
+    if accepts_ndjson():
+        return Response(stream_with_context(encode_ndjson(rows, batch_size)), mimetype=NDJSON_MIMETYPE)
+
+    return Response(stream_with_context(encode_json_array(rows, batch_size)), mimetype='application/json')
+
+
+def search_cities(codes, country_alpha2: str = None) -> Response:
+    """
+    Returns the city records of subdivisions whose name starts with the prefix argument, ordered by name.
+    :param codes: The subdivision codes.
+    :param country_alpha2: The country of the subdivisions when they are all its subdivisions.
+    :type country_alpha2: str
+    :return: Response
+    """
+    args = city_search_arguments.parse_args(request)
+    limit = min(args.get('limit') or current_app.config['CITY_SEARCH_LIMIT_DEFAULT'],
+                current_app.config['CITY_SEARCH_LIMIT_MAX'])
+
+    return json_response(encode_city_rows(city_name_index.search(codes, args.get('prefix'), limit,
+                                                                 country_alpha2=country_alpha2)))
+
+
+def fuzzy_search_cities(country_alpha2: str = None) -> Response:
+    """
+    Returns the city records whose name is most similar to the name argument, most similar first.
+    :param country_alpha2: The country of the city records, or None for every country.
+    :type country_alpha2: str
+    :return: Response
+    """
+    args = city_fuzzy_search_arguments.parse_args(request)
+    limit = min(args.get('limit') or current_app.config['CITY_SEARCH_LIMIT_DEFAULT'],
+                current_app.config['CITY_SEARCH_LIMIT_MAX'])
+
+    return json_response(encode_city_rows(city_trigram_index.search(args.get('name'), limit,
+                                                                    current_app.config['CITY_FUZZY_SEARCH_THRESHOLD'],
+                                                                    country_alpha2=country_alpha2)))
+
+
 @ns.route('/')
 class CountryCollection(Resource):
-    @api.marshal_list_with(country)
+    @api.response(200, 'Success', [country])
+    @api.response(304, 'Not modified.')
+    @conditional(get_country_etag)
     def get(self):
         """
         Returns list of country records.
         :return:
         """
 
-        return list(countries)
+        return json_response(get_country_index().collection)
 
 
 @ns.route('/<string:country_alpha2>')
 @api.response(404, 'Country not found.')
 class CountryItem(Resource):
-    @api.marshal_with(country)
+    @api.response(200, 'Success', country)
+    @api.response(304, 'Not modified.')
+    @conditional(get_country_etag)
     def get(self, country_alpha2: str):
         """
         Returns a country record.
         :param country_alpha2: The unique two character identifier of the country record.
+            The three character identifier and the numeric code are also accepted.
         :type country_alpha2: str
         :return:
         """
-        try:
-            return countries.get(alpha_2=country_alpha2)
-        except KeyError:
+        country_record = get_country_index().get(country_alpha2)
+
+        if country_record is None:
             abort(404, 'Country not found')
 
+        return json_response(country_record)
+
 
 @ns.route('/<string:country_alpha2>/subdivision/')
+@api.response(404, 'Subdivisions not found.')
 class SubdivisionCollection(Resource):
-    @api.marshal_list_with(subdivision)
+    @api.response(200, 'Success', [subdivision])
+    @api.response(304, 'Not modified.')
+    @conditional(get_subdivision_etag)
     def get(self, country_alpha2: str):
         """
         Returns list of subdivision records for the country.
@@ -69,16 +174,20 @@ class SubdivisionCollection(Resource):
         :type country_alpha2: str
         :return:
         """
-        try:
-            return list(subdivisions.get(country_code=country_alpha2))
-        except KeyError:
+        subdivision_records = get_subdivision_index().get_collection(country_alpha2)
+
+        if subdivision_records is None:
             abort(404, 'Subdivisions not found')
 
+        return json_response(subdivision_records)
+
 
 @ns.route('/<string:country_alpha2>/subdivision/<string:subdivision_code>')
 @api.response(404, 'Subdivision not found.')
 class SubdivisionItem(Resource):
-    @api.marshal_with(subdivision)
+    @api.response(200, 'Success', subdivision)
+    @api.response(304, 'Not modified.')
+    @conditional(get_subdivision_etag)
     def get(self, country_alpha2: str, subdivision_code: str):
         """
         Returns the specified subdivision record.
@@ -88,32 +197,163 @@ class SubdivisionItem(Resource):
         :type subdivision_code: str
         :return:
         """
-        subdivivion_code = '{country_code}-{subdivision_code}'.format(country_code=country_alpha2, subdivision_code=subdivision_code)
-        subdivision_record = subdivisions.get(code=subdivivion_code)
+        subdivision_record = get_subdivision_index().get(country_alpha2, subdivision_code)
 
         if subdivision_record is not None:
-            return subdivision_record
+            return json_response(subdivision_record)
         else:
             abort(404, 'Subdivision not found')
 
 
+@ns.route('/<string:country_alpha2>/city/')
+@api.response(404, 'Country not found.')
+class CountryCityCollection(Resource):
+    @api.response(200, 'Success', [city])
+    @api.response(304, 'Not modified.')
+    @conditional(country_city_etag)
+    def get(self, country_alpha2: str):
+        """
+        Streams every city record of the country in one chunked response, ordered by subdivision and name.
+
+        The records are encoded as newline delimited JSON when the client accepts application/x-ndjson.
+        :param country_alpha2: The unique two character identifier of the country record.
+        :type country_alpha2: str
+        :return:
+        """
+        codes = get_subdivision_index().get_codes(country_alpha2)
+
+        if codes is None:
+            abort(404, 'Country not found')
+
+        statement = select_cities(City.subdivision.in_(codes)).order_by(City.subdivision, City.name, City.id)
+        return stream_cities(statement)
+
+
+@ns.route('/<string:country_alpha2>/city/search')
+@api.response(404, 'Country not found.')
+class CountryCitySearch(Resource):
+    @api.expect(city_search_arguments)
+    @api.response(200, 'Success', [city])
+    @api.response(304, 'Not modified.')
+    @conditional(country_city_etag)
+    def get(self, country_alpha2: str):
+        """
+        Returns the city records of the country whose name starts with a prefix, ordered by name.
+
+        Accents and case are ignored, so the prefix "que" matches "Québec".
+        :param country_alpha2: The unique two character identifier of the country record.
+        :type country_alpha2: str
+        :return:
+        """
+        codes = get_subdivision_index().get_codes(country_alpha2)
+
+        if codes is None:
+            abort(404, 'Country not found')
+
+        return search_cities(codes, country_alpha2=country_alpha2)
+
+
+@ns.route('/<string:country_alpha2>/city/fuzzy')
+@api.response(404, 'Country not found.')
+class CountryCityFuzzySearch(Resource):
+    @api.expect(city_fuzzy_search_arguments)
+    @api.response(200, 'Success', [city])
+    @api.response(304, 'Not modified.')
+    @conditional(country_city_etag)
+    def get(self, country_alpha2: str):
+        """
+        Returns the city records of the country whose name is most similar to a possibly misspelt name.
+
+        Names are compared by their trigrams, so "Edmonten" finds "Edmonton" and "Montreal" finds "Montréal".
+        :param country_alpha2: The unique two character identifier of the country record.
+        :type country_alpha2: str
+        :return:
+        """
+        if get_subdivision_index().get_codes(country_alpha2) is None:
+            abort(404, 'Country not found')
+
+        return fuzzy_search_cities(country_alpha2=country_alpha2)
+
+
+@ns.route('/<string:country_alpha2>/subdivision/<string:subdivision_code>/city/search')
+@api.response(400, 'Bad request: country_alpha2 and subdivision_code are invalid')
+class CitySearch(Resource):
+    method_decorators = [subdivision_required]
+
+    @api.expect(city_search_arguments)
+    @api.response(200, 'Success', [city])
+    @api.response(304, 'Not modified.')
+    @conditional(city_etag)
+    def get(self, country_alpha2: str, subdivision_code: str):
+        """
+        Returns the city records of the subdivision whose name starts with a prefix, ordered by name.
+
+        Accents and case are ignored, so the prefix "que" matches "Québec".
+        :param country_alpha2: The unique two character identifier of the country record.
+        :type country_alpha2: str
+        :param subdivision_code: The unique two character identifier of the subdivision record.
+        :type subdivision_code: str
+        :return:
+        """
+        return search_cities(['{country_code}-{subdivision_code}'.format(country_code=country_alpha2,
+                                                                         subdivision_code=subdivision_code)])
+
+
 @ns.route('/<string:country_alpha2>/subdivision/<string:subdivision_code>/city/')
+@api.response(400, 'Bad request: country_alpha2 and subdivision_code are invalid')
 class CityCollection(Resource):
-    @api.marshal_list_with(city)
+    method_decorators = [subdivision_required]
+
+    @api.expect(city_pagination_arguments)
+    @api.response(200, 'Success', [city])
+    @api.response(304, 'Not modified.')
+    @conditional(city_etag)
     def get(self, country_alpha2: str, subdivision_code: str):
         """
-        Returns list of city records for the subdivision.
+        Returns a page of city records for the subdivision ordered by name.
+
+        When more records exist, the response carries a Link header with rel="next" and an X-Next-Cursor header.
+        Pass the cursor back to fetch the next page.
+
+        With stream=1, or when the client accepts application/x-ndjson, every city record of the subdivision is
+        streamed in one chunked response instead.
         :param country_alpha2: The unique two character identifier of the country record.
         :type country_alpha2: str
         :param subdivision_code: The unique two character identifier of the subdivision record.
         :type subdivision_code: str
         :return:
         """
-        subdivision_code = '{country_code}-{subdivision_code}'.format(country_code=country_alpha2,
-                                                                      subdivision_code=subdivision_code)
-        city_records = City.query.filter(City.subdivision == subdivision_code).order_by(City.name).all()
-
-        return city_records
+        args = city_pagination_arguments.parse_args(request)
+        code = '{country_code}-{subdivision_code}'.format(country_code=country_alpha2,
+                                                          subdivision_code=subdivision_code)
+
+        if args.get('stream') or accepts_ndjson():
+            return stream_cities(select_cities(City.subdivision == code).order_by(City.name, City.id))
+
+        limit = min(args.get('limit') or current_app.config['CITY_PAGE_LIMIT_DEFAULT'],
+                    current_app.config['CITY_PAGE_LIMIT_MAX'])
+        after = None
+
+        if args.get('cursor'):
+            try:
+                after = decode_city_cursor(args.get('cursor'))
+            except ValueError:
+                abort(400, 'Bad request: cursor is invalid')
+
+        payload, next_after = get_city_page_payload(code, limit, after)
+        response = json_response(payload)
+
+        if next_after is not None:
+            cursor = encode_city_cursor(*next_after)
+            next_url = url_for(request.endpoint,
+                               country_alpha2=country_alpha2,
+                               subdivision_code=subdivision_code,
+                               cursor=cursor,
+                               limit=limit)
+            response.headers['Link'] = '<{url}>; rel="next"'.format(url=next_url)
+            response.headers['X-Next-Cursor'] = cursor
+
+        return response
 
     @api.response(201, 'City successfully created.')
     @api.expect(city)
@@ -130,20 +370,12 @@ class CityCollection(Resource):
         """
         data = request.json
 
-        # Validate the country_alpha2 and subdivision_code are valid
-        code = '{country_alpha2}-{subdivision_code}'.format(country_alpha2=country_alpha2,
-                                                            subdivision_code=subdivision_code)
-
-        try:
-            if subdivisions.get(code=code) is None:
-                abort(400, 'Bad request: country_alpha2 and subdivision_code are invalid')
-        except KeyError:
-            abort(400, 'Bad request: country_alpha2 and subdivision_code are invalid')
-
         try:
             data = create_city(data)
         except LengthError:
             abort(400, 'Bad request: City name length')
+        except CoordinateError as error:
+            abort(400, 'Bad request: {message}'.format(message=error))
         except IntegrityError:
             abort(400, 'Bad request: City already exists')
         except Exception:
@@ -152,10 +384,59 @@ class CityCollection(Resource):
         return data, 201
 
 
+@ns.route('/<string:country_alpha2>/subdivision/<string:subdivision_code>/city/bulk')
+@api.response(400, 'Bad request: country_alpha2 and subdivision_code are invalid')
+class CityBulkCollection(Resource):
+    method_decorators = [subdivision_required]
+
+    @api.response(200, 'Cities processed.')
+    @api.expect([city_bulk_item], validate=False)
+    @api.marshal_list_with(city_bulk_status)
+    @jwt_required()
+    def post(self, country_alpha2: str, subdivision_code: str):
+        """
+        Creates many city records in the subdivision in one transaction.
+
+        * Send a JSON array of city objects in the request body.
+
+        ```
+        [
+            {"name": "Calgary"},
+            {"name": "Edmonton"}
+        ]
+        ```
+
+        * The response lists one status per city, in request order: created, duplicate or invalid.
+        :param country_alpha2: The unique two character identifier of the country record.
+        :type country_alpha2: str
+        :param subdivision_code: The unique two character identifier of the subdivision record.
+        :type subdivision_code: str
+        :return:
+        """
+        data = request.json
+
+        if not isinstance(data, list):
+            abort(400, 'Bad request: A list of cities is required')
+
+        if len(data) > current_app.config['CITY_BULK_MAX_ITEMS']:
+            abort(400, 'Bad request: At most {maximum} cities are accepted per request'.format(
+                maximum=current_app.config['CITY_BULK_MAX_ITEMS']))
+
+        code = '{country_code}-{subdivision_code}'.format(country_code=country_alpha2,
+                                                          subdivision_code=subdivision_code)
+
+        return create_cities(code, data)
+
+
 @ns.route('/<string:country_alpha2>/subdivision/<string:subdivision_code>/city/<int:city_id>')
+@api.response(400, 'Bad request: country_alpha2 and subdivision_code are invalid')
 @api.response(404, 'City not found.')
 class CityItem(Resource):
-    @api.marshal_with(city)
+    method_decorators = [subdivision_required]
+
+    @api.response(200, 'Success', city)
+    @api.response(304, 'Not modified.')
+    @conditional(city_etag)
     def get(self, country_alpha2: str, subdivision_code: str, city_id: int):
         """
         Returns a city record.
@@ -167,17 +448,14 @@ class CityItem(Resource):
         :type city_id: int
         :return:
         """
-        # Validate the country_alpha2 and subdivision_code are valid
         code = '{country_alpha2}-{subdivision_code}'.format(country_alpha2=country_alpha2,
                                                             subdivision_code=subdivision_code)
+        city_record = get_city_record(city_id)
 
-        try:
-            if subdivisions.get(code=code) is None:
-                abort(400, 'Bad request: country_alpha2 and subdivision_code are invalid')
-        except KeyError:
-            abort(400, 'Bad request: country_alpha2 and subdivision_code are invalid')
+        if city_record is None or city_record[0].upper() != code.upper():
+            abort(404, 'City not found')
 
-        return City.query.filter(City.id == city_id).one()
+        return json_response(city_record[1])
 
     @api.expect(city)
     @api.response(204, 'City successfully updated.')
@@ -208,20 +486,12 @@ class CityItem(Resource):
         """
         data = request.json
 
-        # Validate the country_alpha2 and subdivision_code are valid
-        code = '{country_alpha2}-{subdivision_code}'.format(country_alpha2=country_alpha2,
-                                                            subdivision_code=subdivision_code)
-
-        try:
-            if subdivisions.get(code=code) is None:
-                abort(400, 'Bad request: country_alpha2 and subdivision_code are invalid')
-        except KeyError:
-            abort(400, 'Bad request: country_alpha2 and subdivision_code are invalid')
-
         try:
             data = update_city(city_id, data)
         except LengthError:
             abort(400, 'Bad request: City name length error')
+        except CoordinateError as error:
+            abort(400, 'Bad request: {message}'.format(message=error))
         return data, 204
 
     @api.response(204, 'City successfully deleted.')
@@ -237,15 +507,5 @@ class CityItem(Resource):
         :param city_id: The unique identifier of the city record.
         :type city_id: int
         """
-        # Validate the country_alpha2 and subdivision_code are valid
-        code = '{country_alpha2}-{subdivision_code}'.format(country_alpha2=country_alpha2,
-                                                            subdivision_code=subdivision_code)
-
-        try:
-            if subdivisions.get(code=code) is None:
-                abort(400, 'Bad request: country_alpha2 and subdivision_code are invalid')
-        except KeyError:
-            abort(400, 'Bad request: country_alpha2 and subdivision_code are invalid')
-
         delete_city(city_id)
         return None, 204
@@ -0,0 +1,90 @@
+"""
+@author:     Fyzel@users.noreply.github.com
+
+@copyright:  2017 Englesh.org. All rights reserved.
+
+@license:    https://github.com/Fyzel/geolocation-data-flaskapi/blob/master/LICENSE
+
+@contact:    Fyzel@users.noreply.github.com
+@deffield    updated: 2026-10-17
+"""
+
+import logging
+
+from flask import current_app, request
+from flask_restplus import Resource, abort
+
+from api.restplus import api
+from api.geolocation_data_flaskapi.business.city_spatial import city_spatial_index
+from api.geolocation_data_flaskapi.business.city_stream import encode_city_distance_rows
+from api.geolocation_data_flaskapi.business.reverse_geocoding import get_point_arrays, reverse_geocode
+from api.geolocation_data_flaskapi.endpoints.city_endpoint import all_city_etag
+from api.geolocation_data_flaskapi.parsers import city_nearest_arguments
+from api.geolocation_data_flaskapi.responses import conditional, json_response
+from api.geolocation_data_flaskapi.serializers import city_distance, point, reverse_geocoded_point
+from database.model_exceptions import CoordinateError
+
+log = logging.getLogger(__name__)
+
+ns = api.namespace('nearest',
+                   description='Operations related to the cities nearest to a point')
+
+
+@ns.route('')
+class NearestCityCollection(Resource):
+    @api.expect(city_nearest_arguments)
+    @api.response(200, 'Success', [city_distance])
+    @api.response(304, 'Not modified.')
+    @conditional(all_city_etag)
+    def get(self):
+        """
+        Returns the city records nearest to a point, nearest first, with their great-circle distance.
+
+        Only cities with coordinates are returned.
+        :return:
+        """
+        args = city_nearest_arguments.parse_args(request)
+        k = min(args.get('k') or current_app.config['CITY_NEAREST_LIMIT_DEFAULT'],
+                current_app.config['CITY_NEAREST_LIMIT_MAX'])
+
+        rows, = city_spatial_index.nearest([args.get('lat')], [args.get('lon')], k)
+
+        return json_response(encode_city_distance_rows(rows))
+
+
+@ns.route('/batch')
+class NearestCityBatch(Resource):
+    @api.response(200, 'Success', [reverse_geocoded_point])
+    @api.response(400, 'Bad request: the points are invalid')
+    @api.expect([point], validate=False)
+    def post(self):
+        """
+        Returns the city nearest to each of many points, with its subdivision and country records.
+
+        * Send a JSON array of point objects in the request body.
+
+        ```
+        [
+            {"latitude": 53.5461, "longitude": -113.4938},
+            {"latitude": 51.0447, "longitude": -114.0719}
+        ]
+        ```
+
+        * The response lists one object per point, in request order, or null when no city has coordinates.
+        :return:
+        """
+        data = request.json
+
+        if not isinstance(data, list):
+            abort(400, 'Bad request: A list of points is required')
+
+        if len(data) > current_app.config['CITY_REVERSE_GEOCODE_MAX_POINTS']:
+            abort(400, 'Bad request: At most {maximum} points are accepted per request'.format(
+                maximum=current_app.config['CITY_REVERSE_GEOCODE_MAX_POINTS']))
+
+        try:
+            latitudes, longitudes = get_point_arrays(data)
+        except CoordinateError as error:
+            abort(400, 'Bad request: {message}'.format(message=error))
+
+        return json_response(reverse_geocode(latitudes, longitudes))
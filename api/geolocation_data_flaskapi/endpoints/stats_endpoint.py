@@ -0,0 +1,49 @@
+"""
+@author:     Fyzel@users.noreply.github.com
+
+@copyright:  2017 Englesh.org. All rights reserved.
+
+@license:    https://github.com/Fyzel/geolocation-data-flaskapi/blob/master/LICENSE
+
+@contact:    Fyzel@users.noreply.github.com
+@deffield    updated: 2026-10-17
+"""
+
+import logging
+
+from flask_jwt import jwt_required
+from flask_restplus import Resource
+
+from api.restplus import api
+from api.geolocation_data_flaskapi.business.security import get_identity_stats
+from database import db
+from database.pool_stats import get_pool_stats
+
+log = logging.getLogger(__name__)
+
+ns = api.namespace('stats',
+                   description='Operations related to runtime statistics of this worker process')
+
+
+@ns.route('/identity')
+class IdentityStats(Resource):
+    @api.response(200, 'Success')
+    @jwt_required()
+    def get(self):
+        """
+        Returns the identity cache hit rate and the identity lookup latencies of this worker process.
+        :return:
+        """
+        return get_identity_stats()
+
+
+@ns.route('/pool')
+class PoolStats(Resource):
+    @api.response(200, 'Success')
+    @jwt_required()
+    def get(self):
+        """
+        Returns the database connection pool state and the checkout wait times of this worker process.
+        :return:
+        """
+        return get_pool_stats(db.engine)
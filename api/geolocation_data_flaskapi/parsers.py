@@ -0,0 +1,188 @@
+"""
+@author:     Fyzel@users.noreply.github.com
+
+@copyright:  2017 Englesh.org. All rights reserved.
+
+@license:    https://github.com/Fyzel/geolocation-data-flaskapi/blob/master/LICENSE
+
+@contact:    Fyzel@users.noreply.github.com
+@deffield    updated: 2026-10-17
+"""
+
+import base64
+import binascii
+import json
+
+from flask_restplus import inputs, reqparse
+
+
+def latitude(value) -> float:
+    """
+    Parse a latitude in degrees.
+
+    :param value: The argument value.
+    :return: The latitude.
+    """
+    value = float(value)
+
+    if not -90.0 <= value <= 90.0:
+        raise ValueError('Latitude must be between -90 and 90 degrees')
+
+    return value
+
+
+latitude.__schema__ = {'type': 'number', 'minimum': -90, 'maximum': 90}
+
+
+def longitude(value) -> float:
+    """
+    Parse a longitude in degrees.
+
+    :param value: The argument value.
+    :return: The longitude.
+    """
+    value = float(value)
+
+    if not -180.0 <= value <= 180.0:
+        raise ValueError('Longitude must be between -180 and 180 degrees')
+
+    return value
+
+
+longitude.__schema__ = {'type': 'number', 'minimum': -180, 'maximum': 180}
+
+city_pagination_arguments = reqparse.RequestParser()
+city_pagination_arguments.add_argument('cursor',
+                                       type=str,
+                                       required=False,
+                                       location='args',
+                                       help='The next cursor returned with the previous page')
+city_pagination_arguments.add_argument('limit',
+                                       type=inputs.positive,
+                                       required=False,
+                                       location='args',
+                                       help='The maximum number of city records to return')
+city_pagination_arguments.add_argument('stream',
+                                       type=inputs.boolean,
+                                       required=False,
+                                       default=False,
+                                       location='args',
+                                       help='Stream every city record of the subdivision in one response')
+
+city_search_arguments = reqparse.RequestParser()
+city_search_arguments.add_argument('prefix',
+                                   type=str,
+                                   required=True,
+                                   location='args',
+                                   help='The beginning of the city name; accents and case are ignored')
+city_search_arguments.add_argument('limit',
+                                   type=inputs.positive,
+                                   required=False,
+                                   location='args',
+                                   help='The maximum number of city records to return')
+
+city_fuzzy_search_arguments = reqparse.RequestParser()
+city_fuzzy_search_arguments.add_argument('name',
+                                         type=str,
+                                         required=True,
+                                         location='args',
+                                         help='The city name, possibly misspelt; accents and case are ignored')
+city_fuzzy_search_arguments.add_argument('limit',
+                                         type=inputs.positive,
+                                         required=False,
+                                         location='args',
+                                         help='The maximum number of city records to return')
+
+city_nearest_arguments = reqparse.RequestParser()
+city_nearest_arguments.add_argument('lat',
+                                    type=latitude,
+                                    required=True,
+                                    location='args',
+                                    help='The latitude of the point in degrees')
+city_nearest_arguments.add_argument('lon',
+                                    type=longitude,
+                                    required=True,
+                                    location='args',
+                                    help='The longitude of the point in degrees')
+city_nearest_arguments.add_argument('k',
+                                    type=inputs.positive,
+                                    required=False,
+                                    location='args',
+                                    help='The number of city records to return')
+
+city_box_arguments = reqparse.RequestParser()
+city_box_arguments.add_argument('south',
+                                type=latitude,
+                                required=True,
+                                location='args',
+                                help='The southern latitude of the box in degrees')
+city_box_arguments.add_argument('west',
+                                type=longitude,
+                                required=True,
+                                location='args',
+                                help='The western longitude of the box in degrees, greater than east across the '
+                                     'antimeridian')
+city_box_arguments.add_argument('north',
+                                type=latitude,
+                                required=True,
+                                location='args',
+                                help='The northern latitude of the box in degrees')
+city_box_arguments.add_argument('east',
+                                type=longitude,
+                                required=True,
+                                location='args',
+                                help='The eastern longitude of the box in degrees')
+city_box_arguments.add_argument('limit',
+                                type=inputs.positive,
+                                required=False,
+                                location='args',
+                                help='The maximum number of city records to return')
+
+city_export_arguments = reqparse.RequestParser()
+city_export_arguments.add_argument('country',
+                                   type=str,
+                                   required=False,
+                                   location='args',
+                                   help='The alpha-2 code of the country to export, all countries by default')
+city_export_arguments.add_argument('format',
+                                   type=str,
+                                   required=False,
+                                   default='ndjson',
+                                   choices=('ndjson', 'csv'),
+                                   location='args',
+                                   help='The export format')
+
+
+def encode_city_cursor(name: str, city_id: int) -> str:
+    """
+    Encode the position after a city record as an opaque cursor.
+
+    :param name: The city name.
+    :type name: str
+    :param city_id: The unique identifier of the city record.
+    :type city_id: int
+    :return: The cursor.
+    """
+    position = json.dumps([name, city_id], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(position).decode('ascii').rstrip('=')
+
+
+def decode_city_cursor(cursor: str) -> tuple:
+    """
+    Decode a cursor produced by encode_city_cursor.
+
+    :param cursor: The cursor.
+    :type cursor: str
+    :return: The (name, id) position.
+    :raises ValueError: The cursor is malformed.
+    """
+    try:
+        padding = '=' * (-len(cursor) % 4)
+        name, city_id = json.loads(base64.urlsafe_b64decode(cursor + padding).decode('utf-8'))
+    except (binascii.Error, UnicodeDecodeError, TypeError, ValueError):
+        raise ValueError('Malformed cursor')
+
+    if not isinstance(name, str) or not isinstance(city_id, int):
+        raise ValueError('Malformed cursor')
+
+    return name, city_id
@@ -0,0 +1,103 @@
+"""
+@author:     Fyzel@users.noreply.github.com
+
+@copyright:  2017 Englesh.org. All rights reserved.
+
+@license:    https://github.com/Fyzel/geolocation-data-flaskapi/blob/master/LICENSE
+
+@contact:    Fyzel@users.noreply.github.com
+@deffield    updated: 2026-10-17
+"""
+
+from functools import wraps
+
+from flask import Response, request
+from werkzeug.http import quote_etag
+
+from database.routing import used_replica
+
+
+def json_response(payload: bytes, status: int = 200) -> Response:
+    """
+    Wrap an already encoded JSON document in a response.
+
+    :param payload: The encoded JSON document.
+    :type payload: bytes
+    :param status: The HTTP status code.
+    :type status: int
+    :return: Response
+    """
+    return Response(payload, status=status, mimetype='application/json')
+
+
+def not_modified(etag: str) -> Response:
+    """
+    Returns an empty 304 Not Modified response.
+
+    :param etag: The unquoted entity tag of the current representation.
+    :type etag: str
+    :return: Response
+    """
+    response = Response(status=304)
+    response.set_etag(etag)
+    return response
+
+
+def with_etag(result, etag: str):
+    """
+    Add an ETag header to the result of a resource method.
+
+    :param result: A Response, a (data, code[, headers]) tuple or the data alone.
+    :param etag: The unquoted entity tag.
+    :type etag: str
+    :return: The result with the ETag header.
+    """
+    if isinstance(result, Response):
+        result.set_etag(etag)
+        return result
+
+    data, code, headers = result, 200, {}
+
+    if isinstance(result, tuple):
+        data = result[0]
+        code = result[1] if len(result) > 1 else 200
+        headers = result[2] if len(result) > 2 else {}
+
+    headers = dict(headers or {})
+    headers['ETag'] = quote_etag(etag)
+    return data, code, headers
+
+
+def conditional(etag_for):
+    """
+    Answer a GET with 304 Not Modified when the If-None-Match header matches the current entity tag.
+
+    The entity tag is computed from the URL parameters before the resource method runs, so a 304 does not touch the
+    data behind the resource. A representation read from a replica, which may lag the entity tag, is sent without
+    one. Place the decorator above marshal_with.
+
+    :param etag_for: A callable returning the unquoted entity tag from the URL parameters, or None to skip.
+    :return: The decorator.
+    """
+
+    def decorator(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            etag = etag_for(**kwargs)
+
+            if etag is None:
+                return f(*args, **kwargs)
+
+            if request.if_none_match.contains_weak(etag):
+                return not_modified(etag)
+
+            result = f(*args, **kwargs)
+
+            if used_replica():
+                return result
+
+            return with_etag(result, etag)
+
+        return decorated
+
+    return decorator
@@ -14,6 +14,13 @@ from flask_restplus import fields
 from api.restplus import api
 
 
+class NullableFloat(fields.Float):
+    """
+    A float field that also accepts null, to clear the value.
+    """
+    __schema_type__ = ['number', 'null']
+
+
 country = api.model(
     'Country',
     {
@@ -83,4 +90,115 @@ city = api.model(
             readOnly=True,
             max=6,
             description='The unique identifier of the subdivision record'),
+        'latitude': NullableFloat(
+            required=False,
+            min=-90,
+            max=90,
+            description='The city''s latitude in degrees, given together with the longitude; an update without '
+                        'both keeps the stored coordinates and null for both clears them'),
+        'longitude': NullableFloat(
+            required=False,
+            min=-180,
+            max=180,
+            description='The city''s longitude in degrees, given together with the latitude; an update without '
+                        'both keeps the stored coordinates and null for both clears them'),
+    })
+
+city_distance = api.inherit(
+    'CityDistance',
+    city,
+    {
+        'distance': fields.Float(
+            readOnly=True,
+            description='The great-circle distance from the point to the city in kilometres'),
+    })
+
+point = api.model(
+    'Point',
+    {
+        'latitude': fields.Float(
+            required=True,
+            min=-90,
+            max=90,
+            description='The point''s latitude in degrees'),
+        'longitude': fields.Float(
+            required=True,
+            min=-180,
+            max=180,
+            description='The point''s longitude in degrees'),
+    })
+
+reverse_geocoded_point = api.model(
+    'ReverseGeocodedPoint',
+    {
+        'city': fields.Nested(
+            city_distance,
+            readOnly=True,
+            description='The city nearest to the point'),
+        'subdivision': fields.Nested(
+            subdivision,
+            readOnly=True,
+            description='The subdivision of the city'),
+        'country': fields.Nested(
+            country,
+            readOnly=True,
+            description='The country of the city'),
+    })
+
+city_distance_matrix_request = api.model(
+    'CityDistanceMatrixRequest',
+    {
+        'origins': fields.List(
+            fields.Integer,
+            required=True,
+            description='The unique identifiers of the origin city records, one matrix row each'),
+        'destinations': fields.List(
+            fields.Integer,
+            required=False,
+            description='The unique identifiers of the destination city records, one matrix column each; the '
+                        'origins by default'),
+    })
+
+city_bulk_item = api.model(
+    'CityBulkItem',
+    {
+        'name': fields.String(
+            required=True,
+            max=64,
+            description='The city''s name'),
+        'subdivision': fields.String(
+            required=False,
+            max=6,
+            description='The unique identifier of the subdivision record, defaults to the request subdivision'),
+        'latitude': fields.Float(
+            required=False,
+            min=-90,
+            max=90,
+            description='The city''s latitude in degrees, given together with the longitude'),
+        'longitude': fields.Float(
+            required=False,
+            min=-180,
+            max=180,
+            description='The city''s longitude in degrees, given together with the latitude'),
+    })
+
+city_bulk_status = api.model(
+    'CityBulkStatus',
+    {
+        'index': fields.Integer(
+            readOnly=True,
+            description='The position of the city in the request'),
+        'id': fields.Integer(
+            readOnly=True,
+            description='The unique identifier of the created or existing record'),
+        'name': fields.String(
+            readOnly=True,
+            description='The city''s name'),
+        'status': fields.String(
+            readOnly=True,
+            enum=['created', 'duplicate', 'invalid'],
+            description='The outcome for the city'),
+        'message': fields.String(
+            readOnly=True,
+            description='The reason the city was not created'),
     })
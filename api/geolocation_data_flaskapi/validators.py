@@ -0,0 +1,39 @@
+"""
+@author:     Fyzel@users.noreply.github.com
+
+@copyright:  2017 Englesh.org. All rights reserved.
+
+@license:    https://github.com/Fyzel/geolocation-data-flaskapi/blob/master/LICENSE
+
+@contact:    Fyzel@users.noreply.github.com
+@deffield    updated: 2026-10-17
+"""
+
+from functools import wraps
+
+from flask_restplus import abort
+
+from api.geolocation_data_flaskapi.business.reference_data import is_valid_subdivision
+
+
+def subdivision_required(f):
+    """
+    Reject the request with a 400 unless the country_alpha2 and subdivision_code URL parameters name an existing
+    subdivision, and pass them on upper case, so the cache keys, generations and queries of /ca/ab/ and /CA/AB/
+    are the same.
+
+    :param f: The resource method to decorate.
+    :return: The decorated resource method.
+    """
+
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        if not is_valid_subdivision(kwargs['country_alpha2'], kwargs['subdivision_code']):
+            abort(400, 'Bad request: country_alpha2 and subdivision_code are invalid')
+
+        kwargs['country_alpha2'] = kwargs['country_alpha2'].upper()
+        kwargs['subdivision_code'] = kwargs['subdivision_code'].upper()
+
+        return f(*args, **kwargs)
+
+    return decorated
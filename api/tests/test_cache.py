@@ -0,0 +1,75 @@
+"""
+@author:     Fyzel@users.noreply.github.com
+
+@copyright:  2017 Englesh.org. All rights reserved.
+
+@license:    https://github.com/Fyzel/geolocation-data-flaskapi/blob/master/LICENSE
+
+@contact:    Fyzel@users.noreply.github.com
+@deffield    updated: 2026-10-17
+"""
+
+import os
+import stat
+import tempfile
+import unittest
+from datetime import datetime
+
+from api.geolocation_data_flaskapi.business.cache import SQLiteCache, SQLiteStore, get_default_cache_path
+
+
+class TestCaseSQLiteCache(unittest.TestCase):
+    """Two workers of one host sharing a cache file, each with its own store and cache."""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'cache.sqlite')
+        self.first = SQLiteCache(SQLiteStore(self.path), 'city', maxsize=10, ttl=60)
+        self.second = SQLiteCache(SQLiteStore(self.path), 'city', maxsize=10, ttl=60)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_file_private_to_owner(self):
+        """The cache file is created readable and writable by its owner only."""
+        self.assertEqual(stat.S_IMODE(os.stat(self.path).st_mode), 0o600)
+
+    def test_default_path_private_to_owner(self):
+        """The default cache file is in a directory only its owner can enter."""
+        status = os.lstat(os.path.dirname(get_default_cache_path()))
+
+        self.assertTrue(stat.S_ISDIR(status.st_mode))
+        self.assertEqual(status.st_uid, os.getuid())
+        self.assertEqual(stat.S_IMODE(status.st_mode), 0o700)
+
+    def test_value_shared_between_workers(self):
+        """A value cached by one worker is read back by the other with its types."""
+        page = (b'[{"id":1,"name":"Edmonton"}]', ('Edmonton', 1))
+        identity = (1, 'admin', True, datetime(2017, 10, 15, 12, 30), None)
+
+        self.first.set(1, page)
+        self.first.set(2, identity)
+
+        self.assertEqual(self.second.get(1), page)
+        self.assertEqual(self.second.get(2), identity)
+        self.assertIsNone(self.second.get(3))
+
+    def test_delete_seen_by_other_worker(self):
+        """A delete by one worker evicts the value and drops the stale set of a read racing it in the other."""
+        self.first.set(1, (b'payload', None))
+        version = self.second.version
+
+        self.first.delete(1)
+        self.second.set(1, (b'stale', None), version=version)
+
+        self.assertIsNone(self.second.get(1))
+        self.assertEqual(self.second.version, version + 1)
+
+    def test_value_not_encodable(self):
+        """Values that do not encode as JSON are refused rather than pickled."""
+        with self.assertRaises(TypeError):
+            self.first.set(1, object())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,147 @@
+"""
+@author:     Fyzel@users.noreply.github.com
+
+@copyright:  2017 Englesh.org. All rights reserved.
+
+@license:    https://github.com/Fyzel/geolocation-data-flaskapi/blob/master/LICENSE
+
+@contact:    Fyzel@users.noreply.github.com
+@deffield    updated: 2026-10-17
+"""
+
+import json
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from flask import Flask
+from sqlalchemy import column, insert, select, table
+
+from api.geolocation_data_flaskapi.responses import conditional, json_response
+from database import db
+from database.routing import PRIMARY_COOKIE, init_replica_routing
+
+# A table in both files naming the file a read came from
+item = table('item', column('source'))
+
+
+def create_database(path: str, source: str):
+    """Create a SQLite file whose item table names the file.
+
+    :arg path: The file path
+    :arg source: The name of the file
+    """
+    with sqlite3.connect(path) as connection:
+        connection.execute('CREATE TABLE item (source TEXT NOT NULL)')
+        connection.execute('INSERT INTO item (source) VALUES (?)', (source,))
+
+    connection.close()
+
+
+def create_app(primary_uri: str, replica_uri: str) -> Flask:
+    """Create an application with a primary and a replica and routes reading and writing the item table.
+
+    :arg primary_uri: The URI of the primary
+    :arg replica_uri: The URI of the replica
+    :rtype Flask
+    """
+    app = Flask(__name__)
+    app.config.update(SQLALCHEMY_DATABASE_URI=primary_uri,
+                      SQLALCHEMY_REPLICA_URIS=[replica_uri],
+                      REPLICA_CHECK_INTERVAL=5.0,
+                      REPLICA_RETRY_INTERVAL=30.0,
+                      REPLICA_STICKY_SECONDS=10)
+
+    init_replica_routing(app)
+    db.init_app(app)
+
+    def read_source() -> bytes:
+        return json.dumps(db.session.execute(select(item.c.source)).scalars().first()).encode('utf-8')
+
+    @app.route('/source', methods=['GET', 'POST'])
+    def source():
+        return json_response(read_source())
+
+    @app.route('/source/write', methods=['POST'])
+    def write():
+        db.session.execute(insert(item).values(source='written'))
+        db.session.commit()
+        return json_response(read_source(), status=201)
+
+    @app.route('/source/tagged')
+    @conditional(lambda: 'item-1')
+    def tagged():
+        return json_response(read_source())
+
+    return app
+
+
+class TestCaseReplicaRouting(unittest.TestCase):
+    """Reads and writes of requests to an application with a primary and a replica SQLite file."""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.primary_uri = 'sqlite:///{path}'.format(path=os.path.join(self.directory.name, 'primary.sqlite'))
+        self.replica_uri = 'sqlite:///{path}'.format(path=os.path.join(self.directory.name, 'replica.sqlite'))
+
+        create_database(os.path.join(self.directory.name, 'primary.sqlite'), 'primary')
+        create_database(os.path.join(self.directory.name, 'replica.sqlite'), 'replica')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_get_reads_from_replica(self):
+        """A GET reads from the replica and any other method from the primary."""
+        client = create_app(self.primary_uri, self.replica_uri).test_client()
+
+        self.assertEqual(client.get('/source').json, 'replica')
+        self.assertEqual(client.post('/source').json, 'primary')
+
+    def test_write_goes_to_primary_and_sticks(self):
+        """A write goes to the primary and its cookie sends the next reads of the client to the primary."""
+        client = create_app(self.primary_uri, self.replica_uri).test_client()
+
+        response = client.post('/source/write')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertIn(PRIMARY_COOKIE, response.headers.get('Set-Cookie', ''))
+
+        with sqlite3.connect(os.path.join(self.directory.name, 'primary.sqlite')) as connection:
+            self.assertEqual(connection.execute("SELECT COUNT(*) FROM item WHERE source = 'written'").fetchone()[0], 1)
+
+        with sqlite3.connect(os.path.join(self.directory.name, 'replica.sqlite')) as connection:
+            self.assertEqual(connection.execute("SELECT COUNT(*) FROM item WHERE source = 'written'").fetchone()[0], 0)
+
+        self.assertEqual(client.get('/source').json, 'primary')
+        self.assertEqual(client.application.test_client().get('/source').json, 'replica',
+                         'Expected the reads of other clients on the replica')
+
+    def test_unhealthy_replica_skipped(self):
+        """A GET reads from the primary when the replica cannot be opened."""
+        replica_uri = 'sqlite:///{path}'.format(path=os.path.join(self.directory.name, 'missing', 'replica.sqlite'))
+        client = create_app(self.primary_uri, replica_uri).test_client()
+
+        self.assertEqual(client.get('/source').status_code, 200)
+        self.assertEqual(client.get('/source').json, 'primary')
+
+    def test_conditional_without_etag_on_replica_read(self):
+        """A representation read from the replica has no ETag; one read from the primary has it and matches."""
+        client = create_app(self.primary_uri, self.replica_uri).test_client()
+
+        response = client.get('/source/tagged')
+
+        self.assertEqual(response.json, 'replica')
+        self.assertNotIn('ETag', response.headers)
+
+        # The write sets the cookie sending the reads of the client to the primary
+        client.post('/source/write')
+        response = client.get('/source/tagged')
+
+        self.assertEqual(response.json, 'primary')
+        self.assertEqual(response.headers.get('ETag'), '"item-1"')
+        self.assertEqual(client.get('/source/tagged', headers={'If-None-Match': '"item-1"'}).status_code, 304)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -14,6 +14,7 @@ import logging
 import random
 import sys
 import string
+import struct
 import unittest
 from datetime import datetime
 
@@ -96,6 +97,11 @@ def get_random_valid_city_record_data(country_alpha2: str, subdivision_code: str
     }
 
 
+def get_random_coordinates() -> tuple:
+    """Get random (latitude, longitude) coordinates in Alberta"""
+    return round(random.uniform(49.0, 60.0), 6), round(random.uniform(-120.0, -110.0), 6)
+
+
 def get_subdivision_resource(country_alpha2: str, subdivision_code=None) -> str:
     """Get the """
     if subdivision_code is None:
@@ -171,6 +177,61 @@ class TestCaseLocation(unittest.TestCase):
     def tearDown(self):
         pass
 
+    def send(self, log, method: str, resource: str, expected_code: int, **kwargs) -> requests.Response:
+        """Send a request to a resource of the API and check its HTTP status code.
+
+        :arg log: The logger of the test
+        :arg method: The HTTP method
+        :arg resource: The resource path under the context
+        :arg expected_code: The expected HTTP status code
+        :rtype requests.Response
+        """
+        app_url = '{base_url}/{context}/{resource}'.format(
+            base_url=self.base_url,
+            context=self.context,
+            resource=resource
+        )
+
+        log.debug('app_url= {url}'.format(url=app_url))
+
+        response = requests.request(method, app_url, **kwargs)
+
+        log.debug('Got {response_code} - expected {expected_code}'.format(
+            response_code=response.status_code,
+            expected_code=expected_code)
+        )
+
+        self.assertEqual(response.status_code, expected_code,
+                         'Expected a HTTP status code {code}'.format(code=expected_code))
+
+        return response
+
+    def create_city(self, log, name: str, latitude=None, longitude=None) -> dict:
+        """Create a city record in CA-AB with JWT token and return it.
+
+        :arg log: The logger of the test
+        :arg name: The city name
+        :arg latitude: The latitude of the city in degrees, or None
+        :arg longitude: The longitude of the city in degrees, or None
+        :rtype dict
+        """
+        record = {'name': name, 'subdivision': 'CA-AB'}
+
+        if latitude is not None:
+            record['latitude'] = latitude
+            record['longitude'] = longitude
+
+        headers = {
+            'authorization': 'JWT {token}'.format(token=TestCaseLocation.token),
+            'content-type': 'application/json',
+            'cache-control': 'no-cache'
+        }
+
+        response = self.send(log, 'POST', get_resource_without_id(country_alpha2='CA', subdivision_code='AB'), 201,
+                             data=json.dumps(record), headers=headers)
+
+        return response.json()
+
     def test_step_00_login_fail(self):
         """Test the login fail capability"""
         log = logging.getLogger('TestCase.test_step_00_login_fail')
@@ -1216,6 +1277,302 @@ class TestCaseLocation(unittest.TestCase):
         assert response.status_code == 404, 'Expected a HTTP status code 404'
         log.info('End')
 
+    def test_step_28_get_country_list_not_modified(self):
+        """Get country list with a matching entity tag."""
+        log = logging.getLogger('TestCase.test_step_28_get_country_list_not_modified')
+        log.info('Start')
+
+        response = self.send(log, 'GET', get_resource_without_id(), 200)
+
+        self.assertIn('ETag', response.headers, 'Expected an ETag header')
+
+        etag = response.headers['ETag']
+
+        log.debug('etag= {etag}'.format(etag=etag))
+
+        response = self.send(log, 'GET', get_resource_without_id(), 304, headers={'if-none-match': etag})
+
+        self.assertEqual(len(response.text), 0, 'Expected no data in the response')
+
+        log.info('End')
+
+    def test_step_29_get_city_list_page_with_auth(self):
+        """Follow the next page link of a page of city records with JWT token."""
+        log = logging.getLogger('TestCase.test_step_29_get_city_list_page_with_auth')
+        log.info('Start')
+
+        prefix = get_random_string(8)
+        self.create_city(log, '{prefix} 1'.format(prefix=prefix))
+        self.create_city(log, '{prefix} 2'.format(prefix=prefix))
+
+        headers = {
+            'authorization': 'JWT {token}'.format(token=TestCaseLocation.token),
+            'cache-control': 'no-cache'
+        }
+
+        response = self.send(log, 'GET', get_resource_without_id(country_alpha2='CA', subdivision_code='AB'), 200,
+                             headers=headers, params={'limit': 1})
+        first_page = response.json()
+
+        self.assertEqual(len(first_page), 1, 'Expected one record')
+        self.assertIn('X-Next-Cursor', response.headers, 'Expected a next cursor')
+        self.assertIn('rel="next"', response.headers['Link'], 'Expected a next page link')
+
+        next_url = response.headers['Link'].split(';')[0].strip('<>')
+
+        log.debug('next_url= {url}'.format(url=next_url))
+
+        response = requests.request('GET', '{base_url}{path}'.format(base_url=self.base_url, path=next_url),
+                                    headers=headers)
+
+        self.assertEqual(response.status_code, 200, 'Expected a HTTP status code 200')
+
+        second_page = response.json()
+
+        self.assertEqual(len(second_page), 1, 'Expected one record')
+        self.assertNotEqual(first_page[0]['id'], second_page[0]['id'], 'Expected no record on both pages')
+        self.assertLess((first_page[0]['name'], first_page[0]['id']), (second_page[0]['name'], second_page[0]['id']),
+                        'Expected the second page to follow the first')
+
+        log.info('End')
+
+    def test_step_30_stream_country_city_list_as_ndjson(self):
+        """Stream the city records of a country as newline delimited JSON."""
+        log = logging.getLogger('TestCase.test_step_30_stream_country_city_list_as_ndjson')
+        log.info('Start')
+
+        city = self.create_city(log, get_random_string(64))
+
+        headers = {
+            'accept': 'application/x-ndjson',
+            'cache-control': 'no-cache'
+        }
+
+        response = self.send(log, 'GET', 'country/CA/city/', 200, headers=headers, stream=True)
+
+        self.assertTrue(response.headers['content-type'].startswith('application/x-ndjson'), 'Expected NDJSON content')
+
+        city_ids = set()
+
+        for line in response.iter_lines():
+            if line:
+                json_data = json.loads(line)
+                self.assertEqual(json_data['subdivision'][:2], 'CA', 'Expected only the records of the country')
+                city_ids.add(json_data['id'])
+
+        self.assertIn(city['id'], city_ids, 'Expected the created record in the stream')
+
+        log.info('End')
+
+    def test_step_31_valid_country_valid_subdivision_bulk_create_city_records_with_auth(self):
+        """Create many city records in one request with JWT token."""
+        log = logging.getLogger(
+            'TestCase.test_step_31_valid_country_valid_subdivision_bulk_create_city_records_with_auth')
+        log.info('Start')
+
+        record = get_random_valid_city_record_data(country_alpha2='CA', subdivision_code='AB')
+
+        headers = {
+            'authorization': 'JWT {token}'.format(token=TestCaseLocation.token),
+            'content-type': 'application/json',
+            'cache-control': 'no-cache'
+        }
+
+        response = self.send(log, 'POST', '{resource}bulk'.format(
+            resource=get_resource_without_id(country_alpha2='CA', subdivision_code='AB')), 200,
+            data=json.dumps([record, record, {'name': ''}]), headers=headers)
+        json_data = response.json()
+
+        self.assertEqual([item['status'] for item in json_data], ['created', 'duplicate', 'invalid'])
+        self.assertIsNotNone(json_data[0]['id'], 'Expected the created record id')
+
+        log.info('End')
+
+    def test_step_32_get_identity_stats_with_auth(self):
+        """Get the identity cache statistics with JWT token."""
+        log = logging.getLogger('TestCase.test_step_32_get_identity_stats_with_auth')
+        log.info('Start')
+
+        headers = {
+            'authorization': 'JWT {token}'.format(token=TestCaseLocation.token),
+            'cache-control': 'no-cache'
+        }
+
+        json_data = self.send(log, 'GET', 'stats/identity', 200, headers=headers).json()
+
+        self.assertGreater(json_data['hit_rate'], 0.0, 'Expected the identity of earlier requests to be cached')
+        self.assertIn('mean_ms', json_data['cache_latency'])
+
+        log.info('End')
+
+    def test_step_33_search_country_city_list_by_prefix(self):
+        """Search the city records of a country by name prefix."""
+        log = logging.getLogger('TestCase.test_step_33_search_country_city_list_by_prefix')
+        log.info('Start')
+
+        prefix = 'Q{suffix}'.format(suffix=get_random_string(8))
+        city = self.create_city(log, '{prefix} Québec'.format(prefix=prefix))
+
+        json_data = self.send(log, 'GET', 'country/CA/city/search', 200,
+                              params={'prefix': prefix.lower(), 'limit': 5}).json()
+
+        self.assertEqual([item['id'] for item in json_data], [city['id']], 'Expected the created record only')
+
+        json_data = self.send(log, 'GET', 'country/CA/city/search', 200, params={'prefix': 'a', 'limit': 5}).json()
+
+        self.assertLessEqual(len(json_data), 5, 'Expected at most 5 city records')
+
+        for item in json_data:
+            self.assertEqual(item['subdivision'][:2], 'CA', 'Expected only the records of the country')
+            self.assertEqual(item['name'][:1].lower(), 'a', 'Expected the name to start with the prefix')
+
+        log.info('End')
+
+    def test_step_34_fuzzy_search_city_list(self):
+        """Search the city records of every country by a misspelt name."""
+        log = logging.getLogger('TestCase.test_step_34_fuzzy_search_city_list')
+        log.info('Start')
+
+        word = get_random_string(10)
+        city = self.create_city(log, 'Edmonton {word}'.format(word=word))
+
+        # Misspell the name: one letter changed and one dropped
+        json_data = self.send(log, 'GET', 'city/fuzzy', 200,
+                              params={'name': 'Edmonten {word}'.format(word=word[:-1]), 'limit': 5}).json()
+
+        self.assertLessEqual(len(json_data), 5, 'Expected at most 5 city records')
+        self.assertEqual(json_data[0]['id'], city['id'], 'Expected the created record first')
+
+        log.info('End')
+
+    def test_step_35_get_nearest_city_list(self):
+        """Get the city records nearest to a point."""
+        log = logging.getLogger('TestCase.test_step_35_get_nearest_city_list')
+        log.info('Start')
+
+        latitude, longitude = get_random_coordinates()
+        city = self.create_city(log, get_random_string(64), latitude, longitude)
+
+        json_data = self.send(log, 'GET', 'nearest', 200, params={'lat': latitude, 'lon': longitude, 'k': 5}).json()
+
+        self.assertLessEqual(len(json_data), 5, 'Expected at most 5 city records')
+        self.assertEqual(json_data[0]['id'], city['id'], 'Expected the created record first')
+        self.assertAlmostEqual(json_data[0]['distance'], 0.0, places=3)
+
+        distances = [item['distance'] for item in json_data]
+        self.assertEqual(distances, sorted(distances), 'Expected the nearest city records first')
+
+        self.send(log, 'GET', 'nearest', 400, params={'lat': 91, 'lon': 0})
+
+        log.info('End')
+
+    def test_step_36_reverse_geocode_points(self):
+        """Get the city nearest to each of many points."""
+        log = logging.getLogger('TestCase.test_step_36_reverse_geocode_points')
+        log.info('Start')
+
+        cities = [self.create_city(log, get_random_string(64), *get_random_coordinates()) for _ in range(2)]
+        points = [{'latitude': city['latitude'], 'longitude': city['longitude']} for city in cities]
+
+        headers = {
+            'content-type': 'application/json',
+            'cache-control': 'no-cache'
+        }
+
+        json_data = self.send(log, 'POST', 'nearest/batch', 200, data=json.dumps(points), headers=headers).json()
+
+        self.assertEqual([result['city']['id'] for result in json_data], [city['id'] for city in cities],
+                         'Expected the created record of each point')
+
+        for result in json_data:
+            self.assertEqual(result['subdivision']['code'], 'CA-AB', 'Expected the subdivision of the city')
+            self.assertEqual(result['country']['alpha_2'], 'CA', 'Expected the country of the city')
+
+        self.send(log, 'POST', 'nearest/batch', 400, data=json.dumps([{'latitude': 91, 'longitude': 0}]),
+                  headers=headers)
+
+        log.info('End')
+
+    def test_step_37_get_city_list_in_box(self):
+        """Get the city records inside a latitude and longitude box."""
+        log = logging.getLogger('TestCase.test_step_37_get_city_list_in_box')
+        log.info('Start')
+
+        latitude, longitude = get_random_coordinates()
+        city = self.create_city(log, get_random_string(64), latitude, longitude)
+        box = {'south': latitude - 0.01, 'west': longitude - 0.01, 'north': latitude + 0.01, 'east': longitude + 0.01}
+
+        json_data = self.send(log, 'GET', 'city/box', 200, params=box).json()
+
+        self.assertIn(city['id'], [item['id'] for item in json_data], 'Expected the created record in the box')
+
+        for item in json_data:
+            self.assertTrue(box['south'] <= item['latitude'] <= box['north'], 'Expected the latitude inside the box')
+            self.assertTrue(box['west'] <= item['longitude'] <= box['east'], 'Expected the longitude inside the box')
+
+        self.send(log, 'GET', 'city/box', 400, params=dict(box, south=box['north'], north=box['south']))
+
+        log.info('End')
+
+    def test_step_38_get_city_distance_matrix(self):
+        """Get the distances between city records."""
+        log = logging.getLogger('TestCase.test_step_38_get_city_distance_matrix')
+        log.info('Start')
+
+        cities = [self.create_city(log, get_random_string(64), 53.5461, -113.4938),
+                  self.create_city(log, get_random_string(64), 51.0447, -114.0719)]
+        city_ids = [city['id'] for city in cities]
+
+        headers = {
+            'content-type': 'application/json',
+            'cache-control': 'no-cache'
+        }
+
+        json_data = self.send(log, 'POST', 'city/distances', 200, data=json.dumps({'origins': city_ids}),
+                              headers=headers).json()
+
+        self.assertEqual(json_data['origins'], city_ids)
+        self.assertEqual(json_data['destinations'], city_ids)
+        self.assertEqual(json_data['distances'][0][0], 0, 'Expected no distance from a city to itself')
+        self.assertEqual(json_data['distances'][0][1], json_data['distances'][1][0], 'Expected a symmetric matrix')
+        self.assertAlmostEqual(json_data['distances'][0][1], 280.9, places=0)
+
+        headers['accept'] = 'application/octet-stream'
+
+        response = self.send(log, 'POST', 'city/distances', 200,
+                             data=json.dumps({'origins': city_ids[:1], 'destinations': city_ids}), headers=headers)
+        distances = struct.unpack('<2f', response.content)
+
+        self.assertEqual(distances[0], 0, 'Expected no distance from a city to itself')
+        self.assertAlmostEqual(distances[1], 280.9, places=0)
+
+        self.send(log, 'POST', 'city/distances', 400, data=json.dumps({'origins': []}), headers=headers)
+
+        log.info('End')
+
+    def test_step_39_get_city_list_lower_case_codes_with_auth(self):
+        """Get the city records of a subdivision by lower case codes, then by upper case codes."""
+        log = logging.getLogger('TestCase.test_step_39_get_city_list_lower_case_codes_with_auth')
+        log.info('Start')
+
+        # Leading zeros sort the name onto the first page
+        city = self.create_city(log, '00000000 {name}'.format(name=get_random_string(8)))
+
+        headers = {
+            'authorization': 'JWT {token}'.format(token=TestCaseLocation.token)
+        }
+
+        for country_alpha2, subdivision_code in (('ca', 'ab'), ('CA', 'AB')):
+            json_data = self.send(log, 'GET', get_resource_without_id(country_alpha2=country_alpha2,
+                                                                      subdivision_code=subdivision_code), 200,
+                                  headers=headers, params={'limit': 1000}).json()
+
+            self.assertIn(city['id'], [item['id'] for item in json_data],
+                          'Expected the created record for {country_alpha2}/{subdivision_code}'.format(
+                              country_alpha2=country_alpha2, subdivision_code=subdivision_code))
+
+        log.info('End')
+
 
 if __name__ == '__main__':
     logging.basicConfig(stream=sys.stderr)
@@ -1247,4 +1604,17 @@ if __name__ == '__main__':
     logging.getLogger('TestCase.test_step_25_delete_city_record_without_auth').setLevel(logging.DEBUG)
     logging.getLogger('TestCase.test_step_26_delete_record_with_auth').setLevel(logging.DEBUG)
     logging.getLogger('TestCase.test_step_27_get_deleted_record_with_auth').setLevel(logging.DEBUG)
+    logging.getLogger('TestCase.test_step_28_get_country_list_not_modified').setLevel(logging.DEBUG)
+    logging.getLogger('TestCase.test_step_29_get_city_list_page_with_auth').setLevel(logging.DEBUG)
+    logging.getLogger('TestCase.test_step_30_stream_country_city_list_as_ndjson').setLevel(logging.DEBUG)
+    logging.getLogger(
+        'TestCase.test_step_31_valid_country_valid_subdivision_bulk_create_city_records_with_auth').setLevel(logging.DEBUG)
+    logging.getLogger('TestCase.test_step_32_get_identity_stats_with_auth').setLevel(logging.DEBUG)
+    logging.getLogger('TestCase.test_step_33_search_country_city_list_by_prefix').setLevel(logging.DEBUG)
+    logging.getLogger('TestCase.test_step_34_fuzzy_search_city_list').setLevel(logging.DEBUG)
+    logging.getLogger('TestCase.test_step_35_get_nearest_city_list').setLevel(logging.DEBUG)
+    logging.getLogger('TestCase.test_step_36_reverse_geocode_points').setLevel(logging.DEBUG)
+    logging.getLogger('TestCase.test_step_37_get_city_list_in_box').setLevel(logging.DEBUG)
+    logging.getLogger('TestCase.test_step_38_get_city_distance_matrix').setLevel(logging.DEBUG)
+    logging.getLogger('TestCase.test_step_39_get_city_list_lower_case_codes_with_auth').setLevel(logging.DEBUG)
     unittest.main()
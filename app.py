@@ -9,21 +9,49 @@
 @deffield    updated: 2017-10-15
 """
 
+import os
 from os import path
 
 import logging.config
 
 from flask import Flask, Blueprint
 from api.restplus import api
-from api.geolocation_data_flaskapi.business.security import authenticate, identity
+from api.geolocation_data_flaskapi.business.location_data import init_city_cache
+from api.geolocation_data_flaskapi.business.city_spatial import init_city_spatial_index
+from api.geolocation_data_flaskapi.business.city_trigrams import init_city_trigram_index
+from api.geolocation_data_flaskapi.business.reference_data import init_reference_data
+from api.geolocation_data_flaskapi.business.security import authenticate, identity, init_identity_cache, \
+    init_last_login_writer, init_password_hasher
 from flask_jwt import JWT, jwt_required, current_identity
 from api.geolocation_data_flaskapi.endpoints.location_endpoint import ns as location_namespace
+from api.geolocation_data_flaskapi.endpoints.export_endpoint import ns as export_namespace
+from api.geolocation_data_flaskapi.endpoints.city_endpoint import ns as city_namespace
+from api.geolocation_data_flaskapi.endpoints.nearest_endpoint import ns as nearest_namespace
+from api.geolocation_data_flaskapi.endpoints.stats_endpoint import ns as stats_namespace
 
 from database import db
+from database.routing import init_replica_routing
+from database.sqlite import configure_sqlite, init_sqlite_engines
 
 
 def create_app():
+    """
+    Create and initialize the application.
+
+    The application is only built by this factory, never when the module is imported: the worker processes of the
+    password hasher import the main module of the API, and must not open the database and build the caches and
+    indexes.
+
+    :return: The Flask application.
+    """
     flask_app = Flask(__name__)
+    flask_app.config.from_object(os.environ.get('GEOLOCATION_DATA_FLASKAPI_CONFIG', 'config.DevelopmentConfig'))
+    initialize_app(flask_app)
+
+    JWT(flask_app, authenticate, identity)
+    flask_app.add_url_rule('/', view_func=index)
+    flask_app.add_url_rule('/protected', view_func=protected)
+
     return flask_app
 
 
@@ -31,38 +59,47 @@ def initialize_app(flask_app):
     blueprint = Blueprint('geolocation', __name__, url_prefix='/geolocation')
     api.init_app(blueprint)
     api.add_namespace(location_namespace)
+    api.add_namespace(export_namespace)
+    api.add_namespace(city_namespace)
+    api.add_namespace(nearest_namespace)
+    api.add_namespace(stats_namespace)
     flask_app.register_blueprint(blueprint)
 
+    configure_sqlite(flask_app)
+    init_replica_routing(flask_app)
     db.init_app(flask_app)
 
+    with flask_app.app_context():
+        init_sqlite_engines(flask_app, db.engines)
+
     from database import create_database
     create_database(app=flask_app)
 
+    init_reference_data()
+    init_city_cache(flask_app.config)
+    init_city_trigram_index(flask_app)
+    init_city_spatial_index(flask_app)
+    init_identity_cache(flask_app.config)
+    init_password_hasher(flask_app.config)
+    init_last_login_writer(flask_app)
+
 
 log_file_path = path.join(path.dirname(path.abspath(__file__)), 'logging.conf')
 logging.config.fileConfig(log_file_path)
 log = logging.getLogger(__name__)
 
-app = create_app()
-app.config.from_object('config.DevelopmentConfig')
-initialize_app(app)
-
-jwt = JWT(app, authenticate, identity)
-
 
-@app.route('/')
 def index():
     return 'Computer says, "Hello."'
 
 
-@app.route('/protected')
 @jwt_required()
 def protected():
     return '%s' % current_identity
 
 
 def main():
-    initialize_app(app)
+    app = create_app()
 
     if settings.FLASK_MODE is 'DEV':
         log.info('>>>>> Starting development server at http://{host}/{context}/ <<<<<'.format(
@@ -72,4 +109,4 @@ def main():
 
 
 if __name__ == "__main__":
-    app.run()
+    create_app().run()
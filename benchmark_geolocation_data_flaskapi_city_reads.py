@@ -0,0 +1,227 @@
+#!/usr/bin/python3
+
+"""
+benchmark_geolocation_data_flaskapi_city_reads -- compare the per-row cost of ORM and Core city reads
+
+benchmark_geolocation_data_flaskapi_city_reads is a command line utility to time the city list read paths.
+
+It loads one subdivision with city records into a scratch SQLite database and reads it back as City entities, as
+Core rows and as Core rows from a cached lambda statement, encoding each result to JSON the way the API does.
+
+@author:     Fyzel@users.noreply.github.com
+
+@copyright:  2017 Englesh.org. All rights reserved.
+
+@license:    https://github.com/Fyzel/geolocation-data-flaskapi/blob/master/LICENSE
+
+@contact:    Fyzel@users.noreply.github.com
+@deffield    updated: 2026-10-17
+"""
+
+import os
+import statistics
+import sys
+import tempfile
+import time
+from argparse import ArgumentParser
+from argparse import RawDescriptionHelpFormatter
+
+from sqlalchemy import create_engine, insert, select
+from sqlalchemy.orm import Session
+
+from api.geolocation_data_flaskapi.business.city_stream import encode_city_rows, select_cities, select_city_page
+from database.models import City
+
+__all__ = []
+__version__ = 1.0
+__date__ = '2026-10-17'
+__updated__ = '2026-10-17'
+__short_description__ = 'compare the per-row cost of ORM and Core city reads'
+__longer_description__ = 'a command line utility to time the city list read paths'
+__org_name__ = 'Englesh.org'
+__email__ = 'Fyzel@users.noreply.github.com'
+__license__ = 'https://github.com/Fyzel/geolocation-data-flaskapi/blob/master/LICENSE'
+
+DEBUG = False
+TEST_RUN = False
+
+SUBDIVISION = 'CA-AB'
+
+
+class CLIError(Exception):
+    """Generic exception to raise and log different fatal errors."""
+
+    def __init__(self, message):
+        super(CLIError).__init__(type(self))
+        self.message = 'E: {message}'.format(message=message)
+
+    def __str__(self):
+        return self.message
+
+    def __unicode__(self):
+        return self.message
+
+
+def load_cities(engine, rows: int) -> None:
+    """
+    Create the city table and fill one subdivision.
+
+    :param engine: The SQLAlchemy engine.
+    :param rows: The number of city records.
+    :type rows: int
+    :return None:
+    """
+    City.__table__.create(engine)
+
+    with engine.begin() as connection:
+        connection.execute(insert(City), [{'subdivision': SUBDIVISION, 'name': 'City {index:06d}'.format(index=index)}
+                                          for index in range(rows)])
+
+
+def read_orm(session, rows: int) -> bytes:
+    statement = select(City).where(City.subdivision == SUBDIVISION).order_by(City.name, City.id).limit(rows)
+    cities = session.execute(statement).scalars().all()
+    return encode_city_rows((city.id, city.name, city.subdivision, city.latitude, city.longitude) for city in cities)
+
+
+def read_core(session, rows: int) -> bytes:
+    statement = select_cities(City.subdivision == SUBDIVISION).order_by(City.name, City.id).limit(rows)
+    return encode_city_rows(session.execute(statement).all())
+
+
+def read_lambda(session, rows: int) -> bytes:
+    return encode_city_rows(session.execute(select_city_page(SUBDIVISION, rows)).all())
+
+
+READ_PATHS = (
+    ('orm entities', read_orm),
+    ('core rows', read_core),
+    ('core rows, cached lambda statement', read_lambda),
+)
+
+
+def time_read_path(engine, read, rows: int, repeat: int) -> float:
+    """
+    Time a read path with a new session per read, as the API does per request.
+
+    :param engine: The SQLAlchemy engine.
+    :param read: The read path.
+    :param rows: The number of city records read.
+    :type rows: int
+    :param repeat: The number of timed reads.
+    :type repeat: int
+    :return: The median cost per row in microseconds.
+    """
+    timings = []
+
+    for iteration in range(repeat + 1):
+        with Session(engine) as session:
+            started = time.perf_counter()
+            read(session, rows)
+            elapsed = time.perf_counter() - started
+
+        # The first read warms the statement caches
+        if iteration > 0:
+            timings.append(elapsed)
+
+    return 1000000.0 * statistics.median(timings) / rows
+
+
+def main(argv=None):
+    """Command line options."""
+
+    if argv is None:
+        argv = sys.argv
+    else:
+        sys.argv.extend(argv)
+
+    program_name = os.path.basename(sys.argv[0])
+    program_version = 'v{}'.format(__version__)
+    program_build_date = str(__updated__)
+    program_version_message = '%(prog)s {program_version} ({program_build_date})'.format(
+        program_version=program_version,
+        program_build_date=program_build_date)
+    program_shortdesc = __import__('__main__').__doc__.split("\n")[1]
+    program_license = '''{program_name}
+
+  Created by {user_name} on {created_date}.
+  Copyright 2017 {organization_name}. All rights reserved.
+
+  Licensed under {license}
+
+  Distributed on an "AS IS" basis without warranties
+  or conditions of any kind, either express or implied.
+
+USAGE
+'''.format(program_name=program_shortdesc,
+           user_name=__email__,
+           created_date=str(__date__),
+           organization_name=__org_name__,
+           license=__license__)
+
+    try:
+        # Setup argument parser
+        parser = ArgumentParser(description=program_license, formatter_class=RawDescriptionHelpFormatter)
+        parser.add_argument('-n',
+                            '--rows',
+                            dest='rows',
+                            default=10000,
+                            type=int,
+                            help='the number of city records in the subdivision (default: 10000)')
+        parser.add_argument('-r',
+                            '--repeat',
+                            dest='repeat',
+                            default=20,
+                            type=int,
+                            help='the number of timed reads per path (default: 20)')
+        parser.add_argument('-V',
+                            '--version',
+                            action='version',
+                            version=program_version_message)
+
+        # Process arguments
+        args = parser.parse_args()
+
+        if args.rows < 1:
+            raise CLIError('rows must be at least 1')
+
+        if args.repeat < 1:
+            raise CLIError('repeat must be at least 1')
+
+        with tempfile.TemporaryDirectory() as directory:
+            engine = create_engine('sqlite:///{path}'.format(path=os.path.join(directory, 'cities.db')))
+            load_cities(engine, args.rows)
+
+            print('{rows} city records, median of {repeat} reads'.format(rows=args.rows, repeat=args.repeat))
+
+            baseline = None
+            for label, read in READ_PATHS:
+                cost = time_read_path(engine, read, args.rows, args.repeat)
+                baseline = baseline or cost
+                print('{label:<40} {cost:8.2f} us/row {speedup:6.2f}x'.format(label=label,
+                                                                              cost=cost,
+                                                                              speedup=baseline / cost))
+
+            engine.dispose()
+
+        return 0
+    except KeyboardInterrupt:
+        # handle keyboard interrupt ###
+        return 0
+    except Exception as e:
+        if DEBUG or TEST_RUN:
+            raise e
+        indent = len(program_name) * " "
+        sys.stderr.write(program_name + ": " + repr(e) + "\n")
+        sys.stderr.write(indent + "  for help use --help")
+        return 2
+
+
+if __name__ == "__main__":
+    if DEBUG:
+        pass
+    if TEST_RUN:
+        import doctest
+
+        doctest.testmod()
+    sys.exit(main())
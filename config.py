@@ -17,6 +17,106 @@ class Config(object):
     SECRET_KEY = 'Change me'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+    # Connection pool: connections kept open, extra connections allowed under bursts, seconds to wait for a
+    # connection, seconds before a connection is replaced (below the MySQL wait_timeout) and a liveness check on
+    # checkout
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'pool_size': 10,
+        'max_overflow': 20,
+        'pool_timeout': 10,
+        'pool_recycle': 3600,
+        'pool_pre_ping': True,
+    }
+
+    # Pragmas applied to every connection of a SQLite database: write-ahead logging, fsync at checkpoints only,
+    # 64 MiB page cache and 256 MiB memory-mapped I/O
+    SQLITE_PRAGMAS = {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'cache_size': -65536,
+        'mmap_size': 268435456,
+        'busy_timeout': 5000,
+    }
+
+    # Open the SQLite database read-only and immutable; writes are refused and the file must not change while the
+    # API runs
+    SQLITE_IMMUTABLE = False
+
+    # Read replicas serving the reads of GET requests, round-robin over those that are up; each is checked at most
+    # every REPLICA_CHECK_INTERVAL seconds and skipped for REPLICA_RETRY_INTERVAL seconds when down. Clients read
+    # from the primary for REPLICA_STICKY_SECONDS after they write.
+    SQLALCHEMY_REPLICA_URIS = []
+    REPLICA_CHECK_INTERVAL = 5.0
+    REPLICA_RETRY_INTERVAL = 30.0
+    REPLICA_STICKY_SECONDS = 10
+
+    # City list paging
+    CITY_PAGE_LIMIT_DEFAULT = 100
+    CITY_PAGE_LIMIT_MAX = 1000
+
+    # City name prefix search, default and maximum number of cities returned
+    CITY_SEARCH_LIMIT_DEFAULT = 10
+    CITY_SEARCH_LIMIT_MAX = 100
+
+    # City name fuzzy search, minimum trigram similarity of a match, between 0 and 1
+    CITY_FUZZY_SEARCH_THRESHOLD = 0.3
+
+    # Nearest cities, default and maximum number of cities returned per point
+    CITY_NEAREST_LIMIT_DEFAULT = 10
+    CITY_NEAREST_LIMIT_MAX = 100
+
+    # Reverse geocoding, points accepted per request
+    CITY_REVERSE_GEOCODE_MAX_POINTS = 10000
+
+    # City bounding box queries, default and maximum number of cities returned, and geohash index ranges scanned
+    CITY_BOX_LIMIT_DEFAULT = 1000
+    CITY_BOX_LIMIT_MAX = 10000
+    CITY_BOX_MAX_RANGES = 32
+
+    # City distance matrices, city ids accepted per origin and destination list
+    CITY_DISTANCE_MAX_IDS = 5000
+
+    # City list streaming, rows fetched from the server-side cursor per round trip
+    CITY_STREAM_BATCH_SIZE = 1000
+
+    # Bulk city creation, cities accepted per request
+    CITY_BULK_MAX_ITEMS = 5000
+
+    # Cache backend, 'sqlite' for caches and invalidations shared by every worker process on the host through one
+    # SQLite file, or 'memory' for caches private to each worker process, only for a single worker: other workers do
+    # not see its writes, so they serve stale records for CITY_CACHE_TTL seconds, stale pages for
+    # CITY_PAGE_CACHE_TTL seconds and stale entity tags until a write reaches them. The SQLite file is created
+    # readable by its owner only, in a directory of the temporary directory private to the user running the API
+    # unless a path is set
+    CACHE_BACKEND = 'sqlite'
+    CACHE_SQLITE_PATH = None
+
+    # Password hashing, sha512_crypt rounds of new hashes (stored hashes with other rounds are replaced on login),
+    # worker processes, operations allowed to wait for a worker, seconds to wait for a worker and seconds to wait for
+    # the whole operation before answering 503
+    PASSWORD_HASH_ROUNDS = 656000
+    PASSWORD_HASH_WORKERS = 2
+    PASSWORD_HASH_QUEUE_SIZE = 8
+    PASSWORD_HASH_QUEUE_TIMEOUT = 1.0
+    PASSWORD_HASH_TIMEOUT = 5.0
+
+    # Last login dates are written behind the logins, at most every this many seconds or this many users
+    LAST_LOGIN_FLUSH_INTERVAL = 5.0
+    LAST_LOGIN_FLUSH_SIZE = 500
+
+    # JWT identity cache, entries and seconds to live; disabling, deleting or changing the password of a user evicts
+    # them at once
+    IDENTITY_CACHE_SIZE = 1000
+    IDENTITY_CACHE_TTL = 60
+
+    # City record cache, entries and seconds to live
+    CITY_CACHE_SIZE = 10000
+    CITY_CACHE_TTL = 300
+
+    # City list page cache, entries and seconds to live; pages are keyed by the subdivision generation
+    CITY_PAGE_CACHE_SIZE = 2000
+    CITY_PAGE_CACHE_TTL = 3600
+
     # RESTplus settings
     RESTPLUS_SWAGGER_UI_DOC_EXPANSION = 'list'
     RESTPLUS_VALIDATE = True
@@ -25,14 +125,48 @@ class Config(object):
 
 
 class ProductionConfig(Config):
-    pass
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'pool_size': 20,
+        'max_overflow': 30,
+        'pool_timeout': 5,
+        'pool_recycle': 1800,
+        'pool_pre_ping': True,
+    }
+
+
+class EdgeConfig(Config):
+    """
+    A read-mostly node serving a local SQLite file shipped with the data.
+    """
+    SQLALCHEMY_DATABASE_URI = 'sqlite:////var/lib/geolocation-data-flaskapi/geolocation.db'
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'pool_size': 10,
+        'max_overflow': 10,
+        'pool_timeout': 5,
+        'pool_pre_ping': False,
+    }
+    SQLITE_IMMUTABLE = True
 
 
 class DevelopmentConfig(Config):
     DEBUG = True
     SQLALCHEMY_TRACK_MODIFICATIONS = True
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'pool_size': 5,
+        'max_overflow': 5,
+        'pool_timeout': 30,
+        'pool_recycle': 3600,
+        'pool_pre_ping': True,
+    }
 
 
 class TestingConfig(Config):
     TESTING = True
     SQLALCHEMY_TRACK_MODIFICATIONS = True
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'pool_size': 2,
+        'max_overflow': 2,
+        'pool_timeout': 5,
+        'pool_recycle': 3600,
+        'pool_pre_ping': True,
+    }
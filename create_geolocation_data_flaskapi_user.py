@@ -166,7 +166,8 @@ USAGE
         if len(password) < 1 or len(password) > 256:
             raise CLIError('password must be between 1 to 256 characters')
 
-        hashed_password = sha512_crypt.hash(salt_password(password, salt))
+        hashed_password = sha512_crypt.using(rounds=config.Config.PASSWORD_HASH_ROUNDS).hash(
+            salt_password(password, salt))
 
         engine = create_engine(config.DevelopmentConfig.SQLALCHEMY_DATABASE_URI, echo=True)
 
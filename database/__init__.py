@@ -11,34 +11,149 @@
 
 from flask_sqlalchemy import SQLAlchemy
 
-db = SQLAlchemy()
+from database.pool_stats import InstrumentedQueuePool
+from database.routing import RoutingSession
 
+db = SQLAlchemy(engine_options={'poolclass': InstrumentedQueuePool}, session_options={'class_': RoutingSession})
 
-def create_city_indexes(app):
-    with app.app_context():
-        from sqlalchemy import text
-        from sqlalchemy.exc import OperationalError
+CITY_INDEXES = (
+    ('city_name_subdivision_index', 'CREATE UNIQUE INDEX city_name_subdivision_index ON city (subdivision, name);'),
+    ('city_id_uindex', 'CREATE UNIQUE INDEX city_id_uindex ON city (id);'),
+    ('city_name_index', 'CREATE INDEX city_name_index ON city (name);'),
+    ('city_geohash_index', 'CREATE INDEX city_geohash_index ON city (geohash);'),
+)
+
+# The city columns added after the table was first released, added to existing tables by create_database
+CITY_ADDED_COLUMNS = ('latitude', 'longitude', 'geohash')
+
+# The city indexes that are not needed to keep (subdivision, name) unique, safe to drop around a bulk load
+CITY_SECONDARY_INDEXES = ('city_id_uindex', 'city_name_index', 'city_geohash_index')
+
+
+def index_ddl(engine, ddl: str) -> str:
+    """
+    Adapt CREATE INDEX DDL to the dialect of an engine.
+
+    SQLite supports IF NOT EXISTS, so an existing index is skipped there instead of raising an error.
+
+    :param engine: The SQLAlchemy engine.
+    :param ddl: The CREATE [UNIQUE] INDEX statement.
+    :type ddl: str
+    :return: The statement for the engine.
+    """
+    if engine.dialect.name == 'sqlite':
+        return ddl.replace(' INDEX ', ' INDEX IF NOT EXISTS ', 1)
+
+    return ddl
+
+
+def add_city_columns_with_engine(engine, column_names=CITY_ADDED_COLUMNS):
+    """
+    Add the city table columns that do not exist yet, for tables created before the columns were.
+
+    :param engine: The SQLAlchemy engine.
+    :param column_names: The names of the columns to add.
+    :return: None
+    """
+    from sqlalchemy import inspect, text
+    from database.models import City
+
+    existing = {column['name'] for column in inspect(engine).get_columns(City.__tablename__)}
+
+    for name in column_names:
+        if name in existing:
+            continue
+
+        column = City.__table__.c[name]
+        sql = text('ALTER TABLE {table} ADD COLUMN {name} {type} NULL'.format(
+            table=City.__tablename__, name=name, type=column.type.compile(dialect=engine.dialect)))
+
+        with engine.begin() as connection:
+            connection.execute(sql)
 
-        # Create city table indices
-        try:
-            sql = text('CREATE UNIQUE INDEX city_name_subdivision_index ON city (subdivision, name);')
-            db.engine.execute(sql)
-        except OperationalError as oe:
-            pass
+
+def fill_city_geohashes_with_engine(engine, batch_size: int = 10000):
+    """
+    Set the geohash of the city records with coordinates and no geohash, for records written before the column was.
+
+    :param engine: The SQLAlchemy engine.
+    :param batch_size: The number of records updated per transaction.
+    :type batch_size: int
+    :return: None
+    """
+    from sqlalchemy import and_, bindparam, select, update
+    from api.geolocation_data_flaskapi.business.geohash import encode_geohash
+    from database.models import City
+
+    statement = select(City.id, City.latitude, City.longitude).where(
+        and_(City.geohash.is_(None), City.latitude.is_not(None), City.longitude.is_not(None))).limit(batch_size)
+    fill = update(City.__table__).where(City.__table__.c.id == bindparam('city_id')).values(
+        geohash=bindparam('city_geohash'))
+
+    while True:
+        with engine.begin() as connection:
+            rows = connection.execute(statement).all()
+
+            if not rows:
+                return
+
+            connection.execute(fill, [{'city_id': city_id, 'city_geohash': encode_geohash(latitude, longitude)}
+                                      for city_id, latitude, longitude in rows])
+
+
+def create_city_indexes_with_engine(engine, index_names=None):
+    """
+    Create the city table indexes that do not exist yet.
+
+    :param engine: The SQLAlchemy engine.
+    :param index_names: The names of the indexes to create, or None for all of them.
+    :return: None
+    """
+    from sqlalchemy import text
+    from sqlalchemy.exc import OperationalError
+
+    for name, ddl in CITY_INDEXES:
+        if index_names is not None and name not in index_names:
+            continue
 
         try:
-            sql = text('CREATE UNIQUE INDEX city_id_uindex ON city (id);')
-            db.engine.execute(sql)
+            with engine.begin() as connection:
+                connection.execute(text(index_ddl(engine, ddl)))
         except OperationalError as oe:
             pass
 
+
+def drop_city_indexes_with_engine(engine, index_names=CITY_SECONDARY_INDEXES):
+    """
+    Drop city table indexes that exist.
+
+    :param engine: The SQLAlchemy engine.
+    :param index_names: The names of the indexes to drop.
+    :return: None
+    """
+    from sqlalchemy import text
+    from sqlalchemy.exc import OperationalError
+
+    for name in index_names:
+        if engine.dialect.name == 'mysql':
+            sql = text('DROP INDEX {name} ON city;'.format(name=name))
+        elif engine.dialect.name == 'sqlite':
+            sql = text('DROP INDEX IF EXISTS {name};'.format(name=name))
+        else:
+            sql = text('DROP INDEX {name};'.format(name=name))
+
         try:
-            sql = text('CREATE INDEX city_name_index ON city (name);')
-            db.engine.execute(sql)
+            with engine.begin() as connection:
+                connection.execute(sql)
         except OperationalError as oe:
             pass
 
 
+def create_city_indexes(app):
+    with app.app_context():
+        create_city_indexes_with_engine(db.engine)
+
+
 def create_user_indexes(app):
     with app.app_context():
         from sqlalchemy import text
@@ -46,8 +161,9 @@ def create_user_indexes(app):
 
         # Create user table indices
         try:
-            sql = text('CREATE INDEX user_username_index ON user (username);')
-            db.engine.execute(sql)
+            sql = text(index_ddl(db.engine, 'CREATE INDEX user_username_index ON user (username);'))
+            with db.engine.begin() as connection:
+                connection.execute(sql)
         except OperationalError as oe:
             pass
 
@@ -58,7 +174,16 @@ def create_indexes(app):
 
 
 def create_database(app=None):
-    db.create_all(app=app)
+    # An immutable SQLite database is shipped with its schema and data
+    if app.config.get('SQLITE_IMMUTABLE'):
+        return
+
+    # Only the primary gets the schema; the read replica binds are copies of it
+    with app.app_context():
+        db.create_all(bind_key=None)
+        add_city_columns_with_engine(db.engine)
+        fill_city_geohashes_with_engine(db.engine)
+
     create_indexes(app)
 
 
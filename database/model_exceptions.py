@@ -17,6 +17,13 @@ class ForeignKeyError(ValueError):
     pass
 
 
+class CoordinateError(ValueError):
+    """
+    Raised when a latitude or longitude is missing or out of range.
+    """
+    pass
+
+
 class LengthError(ValueError):
     def __int__(self, message=''):
         super().__init__()
@@ -20,13 +20,20 @@ class City(db.Model):
     A class that represents the ORM for a city.
     """
     __tablename__ = 'city'
-    id = db.Column(db.BIGINT(), primary_key=True, autoincrement=True)
+    # SQLite only generates keys for INTEGER PRIMARY KEY columns
+    id = db.Column(db.BIGINT().with_variant(db.Integer(), 'sqlite'), primary_key=True, autoincrement=True)
     subdivision = db.Column(db.NVARCHAR(6), nullable=False)
     name = db.Column(db.NVARCHAR(64), nullable=False)
+    latitude = db.Column(db.Double(), nullable=True)
+    longitude = db.Column(db.Double(), nullable=True)
+    geohash = db.Column(db.String(9), nullable=True)
 
     def __init__(self,
                  subdivision: str,
                  name: str,
+                 latitude: float = None,
+                 longitude: float = None,
+                 geohash: str = None,
                  id=None):
         """
         City constructor.
@@ -38,6 +45,12 @@ class City(db.Model):
         :type name: str
         :param subdivision: The subdivision code (e.g. CA-AB).
         :type subdivision: str
+        :param latitude: The latitude of the city in degrees, or None when it is not known.
+        :type latitude: float
+        :param longitude: The longitude of the city in degrees, or None when it is not known.
+        :type longitude: float
+        :param geohash: The geohash of the coordinates, or None when they are not known.
+        :type geohash: str
         :param id: The unique id for the city.
         :type id: int, None
         """
@@ -52,6 +65,9 @@ class City(db.Model):
 
         self.name = name
         self.subdivision = subdivision
+        self.latitude = latitude
+        self.longitude = longitude
+        self.geohash = geohash
 
     def __repr__(self):
         """
@@ -0,0 +1,156 @@
+"""
+@author:     Fyzel@users.noreply.github.com
+
+@copyright:  2017 Englesh.org. All rights reserved.
+
+@license:    https://github.com/Fyzel/geolocation-data-flaskapi/blob/master/LICENSE
+
+@contact:    Fyzel@users.noreply.github.com
+@deffield    updated: 2026-10-17
+"""
+
+import bisect
+import time
+from threading import Lock
+
+from sqlalchemy import event
+from sqlalchemy.exc import TimeoutError
+from sqlalchemy.pool import QueuePool
+
+# Upper bounds, in milliseconds, of the checkout wait time histogram buckets
+CHECKOUT_WAIT_BUCKETS_MS = (1, 5, 10, 50, 100, 500, 1000, 5000)
+
+
+class PoolStats(object):
+    """
+    Thread-safe counters of a connection pool: checkout wait time histogram, checkout timeouts, new connections and
+    invalidated connections.
+    """
+
+    def __init__(self):
+        """
+        PoolStats constructor.
+        """
+        self._lock = Lock()
+        self.wait_buckets = [0] * (len(CHECKOUT_WAIT_BUCKETS_MS) + 1)
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.checkouts = 0
+        self.timeouts = 0
+        self.connects = 0
+        self.invalidations = 0
+        self.soft_invalidations = 0
+
+    def record_checkout(self, seconds: float):
+        """
+        Record the time a checkout waited for a connection.
+
+        :param seconds: The wait time in seconds.
+        :type seconds: float
+        :return: None
+        """
+        with self._lock:
+            self.checkouts += 1
+            self.wait_total += seconds
+            self.wait_max = max(self.wait_max, seconds)
+            self.wait_buckets[bisect.bisect_left(CHECKOUT_WAIT_BUCKETS_MS, seconds * 1000.0)] += 1
+
+    def record_timeout(self):
+        with self._lock:
+            self.timeouts += 1
+
+    def record_connect(self):
+        with self._lock:
+            self.connects += 1
+
+    def record_invalidation(self, soft: bool = False):
+        with self._lock:
+            if soft:
+                self.soft_invalidations += 1
+            else:
+                self.invalidations += 1
+
+    def stats(self) -> dict:
+        """
+        Returns the counters, with the wait times in milliseconds.
+
+        :return: A dictionary of checkouts, timeouts, connects, invalidations, soft_invalidations, wait_mean_ms,
+            wait_max_ms and wait_histogram_ms.
+        """
+        with self._lock:
+            bounds = [str(bound) for bound in CHECKOUT_WAIT_BUCKETS_MS] + ['+Inf']
+
+            return {
+                'checkouts': self.checkouts,
+                'timeouts': self.timeouts,
+                'connects': self.connects,
+                'invalidations': self.invalidations,
+                'soft_invalidations': self.soft_invalidations,
+                'wait_mean_ms': 1000.0 * self.wait_total / self.checkouts if self.checkouts else 0.0,
+                'wait_max_ms': 1000.0 * self.wait_max,
+                'wait_histogram_ms': [{'le': bound, 'count': count}
+                                      for bound, count in zip(bounds, self.wait_buckets)],
+            }
+
+
+class InstrumentedQueuePool(QueuePool):
+    """
+    A QueuePool that keeps PoolStats. The stats carry over when the engine recreates the pool.
+    """
+
+    # Log under the QueuePool logger, which SQLAlchemy keeps at WARN unless echo_pool is set
+    _sqla_logger_namespace = 'sqlalchemy.pool.impl.QueuePool'
+
+    def __init__(self, creator, **kw):
+        super().__init__(creator, **kw)
+        self.stats = PoolStats()
+
+        # A recreated pool is handed the listeners of the pool it replaces, and takes over its stats in recreate
+        if '_dispatch' not in kw:
+            event.listen(self, 'connect', lambda dbapi_connection, record: self.stats.record_connect())
+            event.listen(self, 'invalidate',
+                         lambda dbapi_connection, record, exception: self.stats.record_invalidation())
+            event.listen(self, 'soft_invalidate',
+                         lambda dbapi_connection, record, exception: self.stats.record_invalidation(soft=True))
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.stats = self.stats
+        return pool
+
+    def _do_get(self):
+        started = time.perf_counter()
+
+        try:
+            connection_record = super()._do_get()
+        except TimeoutError:
+            self.stats.record_timeout()
+            raise
+
+        self.stats.record_checkout(time.perf_counter() - started)
+        return connection_record
+
+
+def get_pool_stats(engine) -> dict:
+    """
+    Returns the live state and the counters of the connection pool of an engine.
+
+    :param engine: The SQLAlchemy engine.
+    :return: A dictionary of pool, size, checked_in, checked_out and overflow, plus the PoolStats counters when the
+        engine uses an InstrumentedQueuePool.
+    """
+    pool = engine.pool
+    result = {'pool': type(pool).__name__}
+
+    if isinstance(pool, QueuePool):
+        result.update({
+            'size': pool.size(),
+            'checked_in': pool.checkedin(),
+            'checked_out': pool.checkedout(),
+            'overflow': pool.overflow(),
+        })
+
+    if isinstance(pool, InstrumentedQueuePool):
+        result.update(pool.stats.stats())
+
+    return result
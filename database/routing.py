@@ -0,0 +1,237 @@
+"""
+@author:     Fyzel@users.noreply.github.com
+
+@copyright:  2017 Englesh.org. All rights reserved.
+
+@license:    https://github.com/Fyzel/geolocation-data-flaskapi/blob/master/LICENSE
+
+@contact:    Fyzel@users.noreply.github.com
+@deffield    updated: 2026-10-17
+"""
+
+import itertools
+import logging
+import time
+from contextlib import contextmanager
+from threading import Lock
+
+from flask import current_app, g, has_request_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import text
+from sqlalchemy.sql.dml import UpdateBase
+
+log = logging.getLogger(__name__)
+
+# Methods whose reads may be served by a replica
+READ_METHODS = ('GET', 'HEAD')
+
+# Cookie sending the reads of a client that just wrote to the primary
+PRIMARY_COOKIE = 'geolocation_primary'
+
+
+class ReplicaRouter(object):
+    """
+    Picks the replica bind serving the reads of a request, round-robin over the replicas that are up.
+
+    A replica is checked with SELECT 1 at most every check_interval seconds. A replica that fails the check is
+    skipped for retry_interval seconds.
+    """
+
+    def __init__(self, bind_keys, check_interval: float = 5.0, retry_interval: float = 30.0):
+        """
+        ReplicaRouter constructor.
+
+        :param bind_keys: The bind keys of the replicas.
+        :param check_interval: The number of seconds a successful check is trusted.
+        :type check_interval: float
+        :param retry_interval: The number of seconds a failed replica is skipped.
+        :type retry_interval: float
+        """
+        self._bind_keys = tuple(bind_keys)
+        self._check_interval = check_interval
+        self._retry_interval = retry_interval
+        self._counter = itertools.count()
+        self._lock = Lock()
+        self._checked = {}
+        self._down_until = {}
+
+    @property
+    def bind_keys(self) -> tuple:
+        """
+        The bind keys of the replicas.
+        """
+        return self._bind_keys
+
+    def is_up(self, bind_key: str, engine) -> bool:
+        """
+        Checks if a replica is up, querying it when its last check is too old.
+
+        :param bind_key: The bind key of the replica.
+        :type bind_key: str
+        :param engine: The engine of the replica.
+        :return: True if the replica is up, else False.
+        """
+        now = time.monotonic()
+
+        with self._lock:
+            if now < self._down_until.get(bind_key, 0.0):
+                return False
+
+            if now - self._checked.get(bind_key, float('-inf')) < self._check_interval:
+                return True
+
+        try:
+            with engine.connect() as connection:
+                connection.execute(text('SELECT 1'))
+        except Exception as exception:
+            log.warning('Replica {bind_key} is down, retrying in {seconds} seconds: {exception}'.format(
+                bind_key=bind_key, seconds=self._retry_interval, exception=exception))
+            self.mark_down(bind_key)
+            return False
+
+        with self._lock:
+            self._checked[bind_key] = now
+
+        return True
+
+    def mark_down(self, bind_key: str):
+        """
+        Skip a replica for the retry interval.
+
+        :param bind_key: The bind key of the replica.
+        :type bind_key: str
+        :return: None
+        """
+        with self._lock:
+            self._down_until[bind_key] = time.monotonic() + self._retry_interval
+            self._checked.pop(bind_key, None)
+
+    def choose(self, engines):
+        """
+        Returns the bind key of the next replica that is up.
+
+        :param engines: The engines of the application by bind key.
+        :return: The bind key, else None when every replica is down.
+        """
+        start = next(self._counter)
+
+        for offset in range(len(self._bind_keys)):
+            bind_key = self._bind_keys[(start + offset) % len(self._bind_keys)]
+
+            if self.is_up(bind_key, engines[bind_key]):
+                return bind_key
+
+        return None
+
+
+replica_router = None
+
+
+def get_read_bind():
+    """
+    Returns the replica bind serving the reads of the current request.
+
+    Reads go to a replica only for GET and HEAD requests from clients that did not write recently, outside
+    read_from_primary blocks. The replica is chosen once per request so every read of the request sees the same
+    replica.
+
+    :return: The bind key of the replica, else None for the primary.
+    """
+    if replica_router is None or not has_request_context() or g.get('read_from_primary_depth'):
+        return None
+
+    if 'database_read_bind' not in g:
+        g.database_read_bind = None
+
+        if request.method in READ_METHODS and PRIMARY_COOKIE not in request.cookies:
+            g.database_read_bind = replica_router.choose(current_app.extensions['sqlalchemy'].engines)
+
+    return g.database_read_bind
+
+
+def used_replica() -> bool:
+    """
+    Checks if the current request read from a replica.
+
+    :return: True if a replica served a read of the current request, else False.
+    """
+    return has_request_context() and g.get('database_used_replica', False)
+
+
+@contextmanager
+def read_from_primary():
+    """
+    Send the enclosed reads to the primary, e.g. reads that fill caches invalidated by writes to the primary.
+
+    :return: A context manager.
+    """
+    if not has_request_context():
+        yield
+        return
+
+    g.read_from_primary_depth = g.get('read_from_primary_depth', 0) + 1
+
+    try:
+        yield
+    finally:
+        g.read_from_primary_depth -= 1
+
+
+class RoutingSession(Session):
+    """
+    A session sending the reads of GET requests to a replica and everything else to the primary.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None:
+            if self._flushing or isinstance(clause, UpdateBase):
+                if has_request_context():
+                    g.database_wrote = True
+            else:
+                bind_key = get_read_bind()
+
+                if bind_key is not None:
+                    g.database_used_replica = True
+                    return self._db.engines[bind_key]
+
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def init_replica_routing(app):
+    """
+    Add the replicas in SQLALCHEMY_REPLICA_URIS as binds and route reads to them. Call before db.init_app.
+
+    A response to a request that wrote to the primary sets a cookie sending the reads of that client to the
+    primary for REPLICA_STICKY_SECONDS, so a client reads its own writes while the replicas catch up.
+
+    :param app: The Flask application.
+    :return: None
+    """
+    global replica_router
+
+    uris = app.config.get('SQLALCHEMY_REPLICA_URIS') or []
+
+    if not uris:
+        replica_router = None
+        return
+
+    binds = dict(app.config.get('SQLALCHEMY_BINDS') or {})
+    bind_keys = []
+
+    for index, uri in enumerate(uris):
+        bind_key = 'replica_{index}'.format(index=index)
+        binds[bind_key] = uri
+        bind_keys.append(bind_key)
+
+    app.config['SQLALCHEMY_BINDS'] = binds
+    replica_router = ReplicaRouter(bind_keys,
+                                   check_interval=app.config['REPLICA_CHECK_INTERVAL'],
+                                   retry_interval=app.config['REPLICA_RETRY_INTERVAL'])
+    sticky_seconds = app.config['REPLICA_STICKY_SECONDS']
+
+    @app.after_request
+    def stick_to_primary(response):
+        if g.get('database_wrote') and response.status_code < 400:
+            response.set_cookie(PRIMARY_COOKIE, '1', max_age=sticky_seconds, httponly=True)
+
+        return response
@@ -0,0 +1,120 @@
+"""
+@author:     Fyzel@users.noreply.github.com
+
+@copyright:  2017 Englesh.org. All rights reserved.
+
+@license:    https://github.com/Fyzel/geolocation-data-flaskapi/blob/master/LICENSE
+
+@contact:    Fyzel@users.noreply.github.com
+@deffield    updated: 2026-10-17
+"""
+
+from flask import jsonify, request
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+# Methods still served when the database is immutable
+READ_ONLY_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# Pragmas that write to the database file, skipped when it is opened immutable
+SQLITE_WRITE_PRAGMAS = ('journal_mode', 'synchronous')
+
+
+def is_sqlite_uri(uri: str) -> bool:
+    """
+    Checks if a database URI names a SQLite database.
+
+    :param uri: The SQLAlchemy database URI.
+    :type uri: str
+    :return: True for a SQLite URI, else False.
+    """
+    return make_url(uri).get_backend_name() == 'sqlite'
+
+
+def sqlite_immutable_uri(uri: str) -> str:
+    """
+    Returns the URI opening a SQLite database file read-only and immutable.
+
+    An immutable database is never locked or checked for changes, so any number of worker processes read it
+    concurrently without contention. The file must not change while it is open.
+
+    :param uri: The SQLAlchemy URI of the SQLite database file (e.g. sqlite:////var/lib/geolocation.db).
+    :type uri: str
+    :return: The SQLAlchemy URI of the same file opened with mode=ro and immutable=1.
+    """
+    database = make_url(uri).database
+
+    if database.startswith('file:'):
+        return uri
+
+    return 'sqlite:///file:{database}?mode=ro&immutable=1&uri=true'.format(database=database)
+
+
+def set_sqlite_pragmas(engine, pragmas: dict, immutable: bool = False):
+    """
+    Apply pragmas to every new connection of a SQLite engine.
+
+    :param engine: The SQLAlchemy engine.
+    :param pragmas: The pragma values by name (e.g. {'journal_mode': 'WAL'}).
+    :type pragmas: dict
+    :param immutable: True when the database is opened immutable, to skip the pragmas that write to the file and
+        refuse writes on the connection.
+    :type immutable: bool
+    :return: None
+    """
+    statements = ['PRAGMA {name}={value}'.format(name=name, value=value)
+                  for name, value in pragmas.items()
+                  if not (immutable and name in SQLITE_WRITE_PRAGMAS)]
+
+    if immutable:
+        statements.append('PRAGMA query_only=ON')
+
+    @event.listens_for(engine, 'connect')
+    def apply_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+
+        try:
+            for statement in statements:
+                cursor.execute(statement)
+        finally:
+            cursor.close()
+
+
+def configure_sqlite(app):
+    """
+    Open the SQLite primary database immutable when SQLITE_IMMUTABLE is set, and answer every request that would
+    write with 405 Method Not Allowed, logins excepted. Call before db.init_app.
+
+    :param app: The Flask application.
+    :return: None
+    """
+    uri = app.config['SQLALCHEMY_DATABASE_URI']
+
+    if not (app.config.get('SQLITE_IMMUTABLE') and is_sqlite_uri(uri)):
+        return
+
+    app.config['SQLALCHEMY_DATABASE_URI'] = sqlite_immutable_uri(uri)
+
+    @app.before_request
+    def refuse_writes():
+        if request.method in READ_ONLY_METHODS or request.path == app.config.get('JWT_AUTH_URL_RULE', '/auth'):
+            return None
+
+        response = jsonify(message='This node serves a read-only database.')
+        response.status_code = 405
+        response.headers['Allow'] = ', '.join(READ_ONLY_METHODS)
+        return response
+
+
+def init_sqlite_engines(app, engines):
+    """
+    Apply SQLITE_PRAGMAS to every connection of the SQLite engines of the application.
+
+    :param app: The Flask application.
+    :param engines: The engines of the application by bind key.
+    :return: None
+    """
+    for bind_key, engine in engines.items():
+        if engine.dialect.name == 'sqlite':
+            set_sqlite_pragmas(engine, app.config['SQLITE_PRAGMAS'],
+                               immutable=bind_key is None and app.config.get('SQLITE_IMMUTABLE', False))
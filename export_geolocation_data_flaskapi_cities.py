@@ -0,0 +1,220 @@
+#!/usr/bin/python3
+
+"""
+export_geolocation_data_flaskapi_cities -- stream the geolocation data api city records to a file
+
+export_geolocation_data_flaskapi_cities is a command line utility to export the application's city table.
+
+It reads the city table, or the cities of one country, through a server-side cursor in primary key order and writes
+them as NDJSON or CSV without holding the table in memory.
+
+@author:     Fyzel@users.noreply.github.com
+
+@copyright:  2017 Englesh.org. All rights reserved.
+
+@license:    https://github.com/Fyzel/geolocation-data-flaskapi/blob/master/LICENSE
+
+@contact:    Fyzel@users.noreply.github.com
+@deffield    updated: 2026-10-17
+"""
+
+import os
+import sys
+from argparse import ArgumentParser
+from argparse import RawDescriptionHelpFormatter
+
+from sqlalchemy import create_engine
+
+import config
+from api.geolocation_data_flaskapi.business.city_stream import EXPORT_FORMATS, iter_city_rows, select_city_export
+from api.geolocation_data_flaskapi.business.reference_data import get_subdivision_index
+
+__all__ = []
+__version__ = 1.0
+__date__ = '2026-10-17'
+__updated__ = '2026-10-17'
+__short_description__ = 'stream the geolocation data api city records to a file'
+__longer_description__ = 'a command line utility to export the application''s city table'
+__org_name__ = 'Englesh.org'
+__email__ = 'Fyzel@users.noreply.github.com'
+__license__ = 'https://github.com/Fyzel/geolocation-data-flaskapi/blob/master/LICENSE'
+
+DEBUG = False
+TEST_RUN = False
+
+
+class CLIError(Exception):
+    """Generic exception to raise and log different fatal errors."""
+
+    def __init__(self, message):
+        super(CLIError).__init__(type(self))
+        self.message = 'E: {message}'.format(message=message)
+
+    def __str__(self):
+        return self.message
+
+    def __unicode__(self):
+        return self.message
+
+
+def export(engine, output, export_format: str, subdivision_codes, batch_size: int) -> None:
+    """
+    Write the city records to a binary stream.
+
+    :param engine: The SQLAlchemy engine.
+    :param output: The binary output stream.
+    :param export_format: The export format.
+    :param subdivision_codes: The subdivision codes to export, or None for the whole table.
+    :param batch_size: The number of rows fetched per round trip.
+    :return None:
+    """
+    encode, mimetype = EXPORT_FORMATS[export_format]
+
+    with engine.connect() as connection:
+        rows = iter_city_rows(select_city_export(subdivision_codes), batch_size, connection=connection)
+
+        for chunk in encode(rows, batch_size):
+            output.write(chunk)
+
+
+def check_arguments(args):
+    """
+    Validate the command line arguments.
+
+    :param args: The parsed command line arguments.
+    :return: The subdivision codes of the country to export, or None for all countries.
+    """
+    if args.batch_size < 1:
+        raise CLIError('batch size must be one or more')
+
+    if not hasattr(config, args.config):
+        raise CLIError('unknown config class {name}'.format(name=args.config))
+
+    if args.country is None:
+        return None
+
+    subdivision_codes = get_subdivision_index().get_codes(args.country)
+
+    if subdivision_codes is None:
+        raise CLIError('unknown country {country}'.format(country=args.country))
+
+    return subdivision_codes
+
+
+def run(args, subdivision_codes) -> None:
+    """
+    Export the city table of the database of the config class.
+
+    :param args: The parsed command line arguments.
+    :param subdivision_codes: The subdivision codes of the country to export, or None for all countries.
+    :return: None
+    """
+    engine = create_engine(getattr(config, args.config).SQLALCHEMY_DATABASE_URI)
+
+    if args.output == '-':
+        export(engine, sys.stdout.buffer, args.format, subdivision_codes, args.batch_size)
+        sys.stdout.buffer.flush()
+    else:
+        with open(args.output, 'wb') as output:
+            export(engine, output, args.format, subdivision_codes, args.batch_size)
+
+    engine.dispose()
+
+
+def main(argv=None):
+    """Command line options."""
+
+    if argv is None:
+        argv = sys.argv
+    else:
+        sys.argv.extend(argv)
+
+    program_name = os.path.basename(sys.argv[0])
+    program_version = 'v{}'.format(__version__)
+    program_build_date = str(__updated__)
+    program_version_message = '%(prog)s {program_version} ({program_build_date})'.format(
+        program_version=program_version,
+        program_build_date=program_build_date)
+    program_shortdesc = __import__('__main__').__doc__.split("\n")[1]
+    program_license = '''{program_name}
+
+  Created by {user_name} on {created_date}.
+  Copyright 2017 {organization_name}. All rights reserved.
+
+  Licensed under {license}
+
+  Distributed on an "AS IS" basis without warranties
+  or conditions of any kind, either express or implied.
+
+USAGE
+'''.format(program_name=program_shortdesc,
+           user_name=__email__,
+           created_date=str(__date__),
+           organization_name=__org_name__,
+           license=__license__)
+
+    try:
+        # Setup argument parser
+        parser = ArgumentParser(description=program_license, formatter_class=RawDescriptionHelpFormatter)
+        parser.add_argument('-o',
+                            '--output',
+                            dest='output',
+                            default='-',
+                            type=str,
+                            help='the file to write, - for standard output (default: -)')
+        parser.add_argument('-t',
+                            '--format',
+                            dest='format',
+                            default='ndjson',
+                            choices=sorted(EXPORT_FORMATS),
+                            help='the export format (default: ndjson)')
+        parser.add_argument('--country',
+                            dest='country',
+                            required=False,
+                            type=str,
+                            help='the alpha-2 code of the country to export, all countries by default')
+        parser.add_argument('-b',
+                            '--batch-size',
+                            dest='batch_size',
+                            default=10000,
+                            type=int,
+                            help='the number of rows fetched per round trip (default: 10000)')
+        parser.add_argument('-c',
+                            '--config',
+                            dest='config',
+                            default='DevelopmentConfig',
+                            type=str,
+                            help='the config class holding the database URI (default: DevelopmentConfig)')
+        parser.add_argument('-V',
+                            '--version',
+                            action='version',
+                            version=program_version_message)
+
+        # Process arguments
+        args = parser.parse_args()
+
+        subdivision_codes = check_arguments(args)
+
+        run(args, subdivision_codes)
+
+        return 0
+    except KeyboardInterrupt:
+        # handle keyboard interrupt ###
+        return 0
+    except Exception as e:
+        if DEBUG or TEST_RUN:
+            raise e
+        indent = len(program_name) * " "
+        sys.stderr.write(program_name + ": " + repr(e) + "\n")
+        sys.stderr.write(indent + "  for help use --help")
+        return 2
+
+
+if __name__ == "__main__":
+    if DEBUG:
+        pass
+    if TEST_RUN:
+        import doctest
+
+        doctest.testmod()
+    sys.exit(main())
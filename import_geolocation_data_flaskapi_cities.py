@@ -0,0 +1,676 @@
+#!/usr/bin/python3
+
+"""
+import_geolocation_data_flaskapi_cities -- bulk load city records into the geolocation data api database
+
+import_geolocation_data_flaskapi_cities is a command line utility to load city dumps into the application's database.
+
+It streams a CSV, NDJSON or GeoNames dump, validates every subdivision code against the ISO 3166-2 codes and the
+coordinates when a record has them (the admin1 codes of a GeoNames dump are mapped to ISO 3166-2 codes by the names
+in the GeoNames admin1CodesASCII.txt file), and inserts the records with their geohash in large batches. Records already in
+the city table are skipped using the unique (subdivision, name) index. Progress is written to a checkpoint file after
+every batch so an interrupted load can be resumed. Once the records are committed, the city generations of the
+subdivisions loaded are advanced in the shared cache store, so the running API drops its cached pages and entity tags
+of them and reads them into its city indexes again.
+
+@author:     Fyzel@users.noreply.github.com
+
+@copyright:  2017 Englesh.org. All rights reserved.
+
+@license:    https://github.com/Fyzel/geolocation-data-flaskapi/blob/master/LICENSE
+
+@contact:    Fyzel@users.noreply.github.com
+@deffield    updated: 2026-10-17
+"""
+
+import csv
+import io
+import json
+import os
+import sys
+import time
+from argparse import ArgumentParser
+from argparse import RawDescriptionHelpFormatter
+
+from sqlalchemy import create_engine, insert
+
+import config
+from pycountry import subdivisions as iso_subdivisions
+
+from api.geolocation_data_flaskapi.business.cache import get_cache_store
+from api.geolocation_data_flaskapi.business.city_search import normalize_name
+from api.geolocation_data_flaskapi.business.generations import bump_city_generation, init_city_generations
+from api.geolocation_data_flaskapi.business.location_data import CITY_NAME_MAX_LENGTH, get_coordinates, get_geohash
+from api.geolocation_data_flaskapi.business.reference_data import get_subdivision_index
+from database import CITY_SECONDARY_INDEXES, create_city_indexes_with_engine, drop_city_indexes_with_engine
+from database.model_exceptions import CoordinateError
+from database.models import City
+
+__all__ = []
+__version__ = 1.0
+__date__ = '2026-10-17'
+__updated__ = '2026-10-17'
+__short_description__ = 'bulk load city records into the geolocation data api database'
+__longer_description__ = 'a command line utility to load city dumps into the application''s database'
+__org_name__ = 'Englesh.org'
+__email__ = 'Fyzel@users.noreply.github.com'
+__license__ = 'https://github.com/Fyzel/geolocation-data-flaskapi/blob/master/LICENSE'
+
+DEBUG = False
+TEST_RUN = False
+
+FORMAT_CSV = 'csv'
+FORMAT_NDJSON = 'ndjson'
+FORMAT_GEONAMES = 'geonames'
+
+# GeoNames dump columns (http://download.geonames.org/export/dump/readme.txt)
+GEONAMES_NAME_COLUMN = 1
+GEONAMES_LATITUDE_COLUMN = 4
+GEONAMES_LONGITUDE_COLUMN = 5
+GEONAMES_COUNTRY_CODE_COLUMN = 8
+GEONAMES_ADMIN1_CODE_COLUMN = 10
+
+# GeoNames admin1CodesASCII.txt columns
+ADMIN1_CODE_COLUMN = 0
+ADMIN1_NAME_COLUMN = 1
+ADMIN1_ASCII_NAME_COLUMN = 2
+
+
+class CLIError(Exception):
+    """Generic exception to raise and log different fatal errors."""
+
+    def __init__(self, message):
+        super(CLIError).__init__(type(self))
+        self.message = 'E: {message}'.format(message=message)
+
+    def __str__(self):
+        return self.message
+
+    def __unicode__(self):
+        return self.message
+
+
+def guess_format(path: str) -> str:
+    """
+    Guess the dump format from the file extension.
+
+    :param path: The dump file path.
+    :return: The dump format.
+    """
+    extension = os.path.splitext(path)[1].lower()
+
+    if extension == '.csv':
+        return FORMAT_CSV
+
+    if extension in ('.ndjson', '.jsonl'):
+        return FORMAT_NDJSON
+
+    if extension == '.txt':
+        return FORMAT_GEONAMES
+
+    raise CLIError('cannot guess the format of {path}, use --format'.format(path=path))
+
+
+def get_subdivision_codes_by_name(country_code: str) -> dict:
+    """
+    Returns the ISO 3166-2 codes of the subdivisions of a country by their normalized name.
+
+    :param country_code: The ISO 3166-1 alpha-2 code of the country.
+    :return: The subdivision codes by normalized name; None for a name shared by several subdivisions.
+    """
+    codes = {}
+
+    for subdivision in iso_subdivisions.get(country_code=country_code) or ():
+        name = normalize_name(subdivision.name)
+        codes[name] = None if name in codes else subdivision.code
+
+    return codes
+
+
+def read_admin1_codes(stream) -> dict:
+    """
+    Map the GeoNames admin1 codes to ISO 3166-2 codes by matching the names of admin1CodesASCII.txt to the names of
+    the subdivisions of their country.
+
+    :param stream: The text stream of admin1CodesASCII.txt.
+    :return: The ISO 3166-2 codes by GeoNames admin1 code, as in CA.01; admin1 codes without a match are left out.
+    """
+    admin1_codes = {}
+    codes_by_country = {}
+
+    for line in stream:
+        columns = line.rstrip('\n').split('\t')
+
+        if len(columns) <= ADMIN1_ASCII_NAME_COLUMN or '.' not in columns[ADMIN1_CODE_COLUMN]:
+            continue
+
+        country_code = columns[ADMIN1_CODE_COLUMN].split('.', 1)[0]
+        if country_code not in codes_by_country:
+            codes_by_country[country_code] = get_subdivision_codes_by_name(country_code)
+
+        for name in (columns[ADMIN1_NAME_COLUMN], columns[ADMIN1_ASCII_NAME_COLUMN]):
+            code = codes_by_country[country_code].get(normalize_name(name))
+
+            if code is not None:
+                admin1_codes[columns[ADMIN1_CODE_COLUMN]] = code
+                break
+
+    return admin1_codes
+
+
+def read_csv_records(stream, fields: tuple):
+    """
+    Stream records from a CSV dump.
+
+    :param stream: The text stream of the dump.
+    :param fields: The (subdivision, name, latitude, longitude) columns.
+    :return: A generator of (subdivision, name, latitude, longitude) tuples.
+    """
+    for row in csv.DictReader(stream):
+        yield tuple(row.get(field) for field in fields)
+
+
+def read_ndjson_records(stream, fields: tuple):
+    """
+    Stream records from an NDJSON dump.
+
+    :param stream: The text stream of the dump.
+    :param fields: The (subdivision, name, latitude, longitude) keys.
+    :return: A generator of (subdivision, name, latitude, longitude) tuples.
+    """
+    for line in stream:
+        if not line.strip():
+            continue
+
+        try:
+            data = json.loads(line)
+        except ValueError:
+            data = None
+
+        if isinstance(data, dict):
+            yield tuple(data.get(field) for field in fields)
+        else:
+            yield None, None, None, None
+
+
+def read_geonames_records(stream, admin1_codes: dict):
+    """
+    Stream records from a GeoNames dump.
+
+    :param stream: The text stream of the dump.
+    :param admin1_codes: The ISO 3166-2 codes by GeoNames admin1 code; an admin1 code missing from it is used as the
+        subdivision code of its country, as in US-AL.
+    :return: A generator of (subdivision, name, latitude, longitude) tuples.
+    """
+    for line in stream:
+        columns = line.rstrip('\n').split('\t')
+
+        if len(columns) <= GEONAMES_ADMIN1_CODE_COLUMN:
+            yield None, None, None, None
+            continue
+
+        admin1_code = '{country_code}.{admin1_code}'.format(country_code=columns[GEONAMES_COUNTRY_CODE_COLUMN],
+                                                            admin1_code=columns[GEONAMES_ADMIN1_CODE_COLUMN])
+        subdivision = admin1_codes.get(admin1_code, admin1_code.replace('.', '-', 1))
+
+        yield subdivision, columns[GEONAMES_NAME_COLUMN], columns[GEONAMES_LATITUDE_COLUMN], \
+            columns[GEONAMES_LONGITUDE_COLUMN]
+
+
+def read_records(stream, dump_format: str, fields: tuple, admin1_codes: dict = None):
+    """
+    Stream (subdivision, name, latitude, longitude) records from a dump.
+
+    :param stream: The text stream of the dump.
+    :param dump_format: The dump format.
+    :param fields: The (subdivision, name, latitude, longitude) CSV columns or NDJSON keys.
+    :param admin1_codes: The ISO 3166-2 codes by GeoNames admin1 code of a GeoNames dump.
+    :return: A generator of (subdivision, name, latitude, longitude) tuples; any value is None when it is missing,
+        and the coordinates of CSV and GeoNames dumps are strings.
+    """
+    if dump_format == FORMAT_CSV:
+        return read_csv_records(stream, fields)
+
+    if dump_format == FORMAT_NDJSON:
+        return read_ndjson_records(stream, fields)
+
+    if dump_format == FORMAT_GEONAMES:
+        return read_geonames_records(stream, admin1_codes or {})
+
+    raise CLIError('unknown format {dump_format}'.format(dump_format=dump_format))
+
+
+def parse_coordinates(latitude, longitude) -> tuple:
+    """
+    Returns the validated coordinates of a dump record.
+
+    :param latitude: The latitude in degrees, as a number or a string; None or an empty string when missing.
+    :param longitude: The longitude in degrees, as a number or a string; None or an empty string when missing.
+    :return: The (latitude, longitude) in degrees, or (None, None) when the record has no coordinates.
+    :raises CoordinateError: When the coordinates are not numbers, out of range or only one is given.
+    """
+    values = []
+
+    for value in (latitude, longitude):
+        if isinstance(value, str):
+            value = value.strip()
+
+            try:
+                value = float(value) if value else None
+            except ValueError:
+                raise CoordinateError('City latitude and longitude must be numbers')
+
+        values.append(value)
+
+    return get_coordinates({'latitude': values[0], 'longitude': values[1]})
+
+
+def read_checkpoint(path: str) -> int:
+    """
+    Returns the number of dump records already loaded.
+
+    :param path: The checkpoint file path.
+    :return: The number of records to skip.
+    """
+    if not os.path.exists(path):
+        return 0
+
+    with open(path, 'r') as checkpoint_file:
+        return int(json.load(checkpoint_file).get('records', 0))
+
+
+def write_checkpoint(path: str, records: int, inserted: int):
+    """
+    Atomically record the number of dump records loaded so far.
+
+    :param path: The checkpoint file path.
+    :param records: The number of dump records read and committed.
+    :param inserted: The number of city records inserted.
+    :return: None
+    """
+    temporary_path = '{path}.tmp'.format(path=path)
+
+    with open(temporary_path, 'w') as checkpoint_file:
+        json.dump({'records': records, 'inserted': inserted, 'updated': time.time()}, checkpoint_file)
+
+    os.replace(temporary_path, path)
+
+
+def get_city_row(record: tuple, valid_codes) -> dict:
+    """
+    Returns the city record of a dump record.
+
+    :param record: The (subdivision, name, latitude, longitude) record.
+    :param valid_codes: The valid subdivision codes.
+    :return: The city record, or None when the dump record is not valid.
+    """
+    subdivision, name, latitude, longitude = record
+
+    if not isinstance(subdivision, str) or not isinstance(name, str):
+        return None
+
+    if subdivision.upper() not in valid_codes or len(name) < 1 or len(name) > CITY_NAME_MAX_LENGTH:
+        return None
+
+    try:
+        latitude, longitude = parse_coordinates(latitude, longitude)
+    except CoordinateError:
+        return None
+
+    return {'subdivision': subdivision.upper(),
+            'name': name,
+            'latitude': latitude,
+            'longitude': longitude,
+            'geohash': get_geohash(latitude, longitude)}
+
+
+def insert_batch(engine, statement, batch, subdivisions: set = None) -> int:
+    """
+    Insert a batch of city records in one transaction.
+
+    :param engine: The SQLAlchemy engine.
+    :param statement: The INSERT statement that skips existing records.
+    :param batch: The city records.
+    :param subdivisions: The set the codes of the subdivisions of the batch are added to once committed, or None.
+    :return: The number of records inserted.
+    """
+    with engine.begin() as connection:
+        result = connection.execute(statement, batch)
+
+    if subdivisions is not None:
+        subdivisions.update(row['subdivision'] for row in batch)
+
+    return max(result.rowcount, 0)
+
+
+def write_progress(prefix: str, read: int, inserted: int, rejected: int, rate: float):
+    """
+    Write a progress report to standard error.
+
+    :param prefix: The prefix of the report.
+    :param read: The number of dump records read.
+    :param inserted: The number of city records inserted.
+    :param rejected: The number of dump records rejected.
+    :param rate: The number of dump records read per second.
+    :return: None
+    """
+    sys.stderr.write('{prefix}read {read} inserted {inserted} rejected {rejected} ({rate:.0f} rows/sec)\n'.format(
+        prefix=prefix,
+        read=read,
+        inserted=inserted,
+        rejected=rejected,
+        rate=rate))
+
+
+def load(engine, records, valid_codes, batch_size: int, skip: int, checkpoint_path, progress_interval: float,
+         subdivisions: set = None):
+    """
+    Load city records into the city table.
+
+    :param engine: The SQLAlchemy engine.
+    :param records: The (subdivision, name, latitude, longitude) records.
+    :param valid_codes: The valid subdivision codes.
+    :param batch_size: The number of records per INSERT.
+    :param skip: The number of records loaded by a previous run.
+    :param checkpoint_path: The checkpoint file path, or None.
+    :param progress_interval: The number of seconds between progress reports.
+    :param subdivisions: The set the codes of the subdivisions of the committed batches are added to, or None.
+    :return: A (read, inserted, rejected) tuple.
+    """
+    statement = insert(City.__table__) \
+        .prefix_with('IGNORE', dialect='mysql') \
+        .prefix_with('OR IGNORE', dialect='sqlite')
+
+    read = skip
+    inserted = 0
+    rejected = 0
+    batch = []
+    started = time.monotonic()
+    reported = started
+
+    for position, record in enumerate(records):
+        if position < skip:
+            continue
+
+        read += 1
+        row = get_city_row(record, valid_codes)
+
+        if row is None:
+            rejected += 1
+        else:
+            batch.append(row)
+
+        if len(batch) >= batch_size:
+            inserted += insert_batch(engine, statement, batch, subdivisions)
+            batch = []
+
+            if checkpoint_path is not None:
+                write_checkpoint(checkpoint_path, read, inserted)
+
+        now = time.monotonic()
+        if now - reported >= progress_interval:
+            reported = now
+            write_progress('', read, inserted, rejected, (read - skip) / (now - started))
+
+    if batch:
+        inserted += insert_batch(engine, statement, batch, subdivisions)
+
+    if checkpoint_path is not None:
+        write_checkpoint(checkpoint_path, read, inserted)
+
+    elapsed = max(time.monotonic() - started, 1e-9)
+    write_progress('done: ', read, inserted, rejected, (read - skip) / elapsed)
+
+    return read, inserted, rejected
+
+
+def bump_generations(app_config: dict, subdivisions: set):
+    """
+    Advance the city generations of the loaded subdivisions, their countries and all countries in the cache store
+    shared by the API workers.
+
+    :param app_config: The application config.
+    :param subdivisions: The codes of the loaded subdivisions.
+    :return: None
+    """
+    if not subdivisions:
+        return
+
+    if get_cache_store(app_config) is None:
+        sys.stderr.write('note: CACHE_BACKEND is memory, restart the API so its workers read the new records\n')
+        return
+
+    init_city_generations(app_config)
+    bump_city_generation(*subdivisions)
+
+
+def check_arguments(args) -> str:
+    """
+    Validate the command line arguments.
+
+    :param args: The parsed command line arguments.
+    :return: The dump format.
+    """
+    if args.batch_size < 1:
+        raise CLIError('batch size must be one or more')
+
+    if args.resume and args.checkpoint is None:
+        raise CLIError('--resume requires --checkpoint')
+
+    if not hasattr(config, args.config):
+        raise CLIError('unknown config class {name}'.format(name=args.config))
+
+    dump_format = args.format
+    if dump_format is None:
+        dump_format = guess_format(args.file)
+
+    if dump_format == FORMAT_GEONAMES and args.admin1_codes is None:
+        raise CLIError('the geonames format requires --admin1-codes')
+
+    return dump_format
+
+
+def open_dump(path: str):
+    """
+    Open a dump file.
+
+    :param path: The dump file path, - for standard input.
+    :return: The text stream of the dump.
+    """
+    if path == '-':
+        return io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8', newline='')
+
+    return open(path, 'r', encoding='utf-8', newline='')
+
+
+def run(args, dump_format: str):
+    """
+    Load a dump into the database of the config class.
+
+    :param args: The parsed command line arguments.
+    :param dump_format: The dump format.
+    :return: None
+    """
+    skip = read_checkpoint(args.checkpoint) if args.resume else 0
+    valid_codes = get_subdivision_index().codes
+
+    admin1_codes = None
+    if args.admin1_codes is not None:
+        with open(args.admin1_codes, 'r', encoding='utf-8') as admin1_codes_file:
+            admin1_codes = read_admin1_codes(admin1_codes_file)
+
+    config_class = getattr(config, args.config)
+    app_config = dict((key, getattr(config_class, key)) for key in dir(config_class) if key.isupper())
+    subdivisions = set()
+
+    engine = create_engine(app_config['SQLALCHEMY_DATABASE_URI'])
+    stream = open_dump(args.file)
+
+    if args.rebuild_indexes:
+        drop_city_indexes_with_engine(engine, CITY_SECONDARY_INDEXES)
+
+    try:
+        load(engine=engine,
+             records=read_records(stream,
+                                  dump_format,
+                                  (args.subdivision_field, args.name_field, args.latitude_field, args.longitude_field),
+                                  admin1_codes),
+             valid_codes=valid_codes,
+             batch_size=args.batch_size,
+             skip=skip,
+             checkpoint_path=args.checkpoint,
+             progress_interval=args.progress_interval,
+             subdivisions=subdivisions)
+    finally:
+        stream.close()
+
+        if args.rebuild_indexes:
+            create_city_indexes_with_engine(engine, CITY_SECONDARY_INDEXES)
+
+        bump_generations(app_config, subdivisions)
+
+    engine.dispose()
+
+
+def main(argv=None):
+    """Command line options."""
+
+    if argv is None:
+        argv = sys.argv
+    else:
+        sys.argv.extend(argv)
+
+    program_name = os.path.basename(sys.argv[0])
+    program_version = 'v{}'.format(__version__)
+    program_build_date = str(__updated__)
+    program_version_message = '%(prog)s {program_version} ({program_build_date})'.format(
+        program_version=program_version,
+        program_build_date=program_build_date)
+    program_shortdesc = __import__('__main__').__doc__.split("\n")[1]
+    program_license = '''{program_name}
+
+  Created by {user_name} on {created_date}.
+  Copyright 2017 {organization_name}. All rights reserved.
+
+  Licensed under {license}
+
+  Distributed on an "AS IS" basis without warranties
+  or conditions of any kind, either express or implied.
+
+USAGE
+'''.format(program_name=program_shortdesc,
+           user_name=__email__,
+           created_date=str(__date__),
+           organization_name=__org_name__,
+           license=__license__)
+
+    try:
+        # Setup argument parser
+        parser = ArgumentParser(description=program_license, formatter_class=RawDescriptionHelpFormatter)
+        parser.add_argument('-f',
+                            '--file',
+                            dest='file',
+                            required=True,
+                            type=str,
+                            help='the dump file to load, - for standard input')
+        parser.add_argument('-t',
+                            '--format',
+                            dest='format',
+                            required=False,
+                            choices=[FORMAT_CSV, FORMAT_NDJSON, FORMAT_GEONAMES],
+                            help='the dump format, guessed from the file extension by default')
+        parser.add_argument('--admin1-codes',
+                            dest='admin1_codes',
+                            required=False,
+                            type=str,
+                            help='the GeoNames admin1CodesASCII.txt file mapping the admin1 codes of a geonames dump '
+                                 'to ISO 3166-2 codes, required by the geonames format')
+        parser.add_argument('--name-field',
+                            dest='name_field',
+                            default='name',
+                            type=str,
+                            help='the CSV column or NDJSON key of the city name (default: name)')
+        parser.add_argument('--subdivision-field',
+                            dest='subdivision_field',
+                            default='subdivision',
+                            type=str,
+                            help='the CSV column or NDJSON key of the subdivision code (default: subdivision)')
+        parser.add_argument('--latitude-field',
+                            dest='latitude_field',
+                            default='latitude',
+                            type=str,
+                            help='the CSV column or NDJSON key of the latitude in degrees, optional in each record '
+                                 '(default: latitude)')
+        parser.add_argument('--longitude-field',
+                            dest='longitude_field',
+                            default='longitude',
+                            type=str,
+                            help='the CSV column or NDJSON key of the longitude in degrees, optional in each record '
+                                 '(default: longitude)')
+        parser.add_argument('-b',
+                            '--batch-size',
+                            dest='batch_size',
+                            default=5000,
+                            type=int,
+                            help='the number of records per INSERT (default: 5000)')
+        parser.add_argument('-k',
+                            '--checkpoint',
+                            dest='checkpoint',
+                            required=False,
+                            type=str,
+                            help='the checkpoint file written after every batch')
+        parser.add_argument('-r',
+                            '--resume',
+                            dest='resume',
+                            default=False,
+                            action='store_true',
+                            help='skip the records loaded by the run that wrote the checkpoint')
+        parser.add_argument('--rebuild-indexes',
+                            dest='rebuild_indexes',
+                            default=False,
+                            action='store_true',
+                            help='drop the secondary city indexes before the load and rebuild them after')
+        parser.add_argument('--progress-interval',
+                            dest='progress_interval',
+                            default=10.0,
+                            type=float,
+                            help='the number of seconds between progress reports (default: 10)')
+        parser.add_argument('-c',
+                            '--config',
+                            dest='config',
+                            default='DevelopmentConfig',
+                            type=str,
+                            help='the config class holding the database URI (default: DevelopmentConfig)')
+        parser.add_argument('-V',
+                            '--version',
+                            action='version',
+                            version=program_version_message)
+
+        # Process arguments
+        args = parser.parse_args()
+
+        dump_format = check_arguments(args)
+
+        run(args, dump_format)
+
+        return 0
+    except KeyboardInterrupt:
+        # handle keyboard interrupt ###
+        return 0
+    except Exception as e:
+        if DEBUG or TEST_RUN:
+            raise e
+        indent = len(program_name) * " "
+        sys.stderr.write(program_name + ": " + repr(e) + "\n")
+        sys.stderr.write(indent + "  for help use --help")
+        return 2
+
+
+if __name__ == "__main__":
+    if DEBUG:
+        pass
+    if TEST_RUN:
+        import doctest
+
+        doctest.testmod()
+    sys.exit(main())